@@ -0,0 +1,76 @@
+"""
+Render time of a `{%tr for %}` table: docxtpl vs lxml row expansion.
+Usage (from the bot directory): python -m benchmarks.large_table [rows ...]
+"""
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from docx import Document
+from docxtpl import DocxTemplate
+
+from includes.docx_tables import FastTableTemplate
+from includes.jinja2 import get_jinja_env
+
+
+def make_template(path: Path):
+	document = Document()
+	document.add_paragraph('{{ title }}')
+	table = document.add_table(rows=4, cols=4)
+	for cell, text in zip(table.rows[0].cells, ('№', 'ФИО', 'Должность', 'Телефон')):
+		cell.text = text
+	table.rows[1].cells[0].text = '{%tr for member in members %}'
+	for cell, text in zip(table.rows[2].cells, ('{{ loop.index }}', '{{ member.name }}', '{{ member.position|upper }}', '{{ member.phone }}')):
+		cell.text = text
+	table.rows[3].cells[0].text = '{%tr endfor %}'
+	document.add_paragraph('Всего: {{ members|length }}')
+	document.save(path)
+
+
+def make_data(rows: int) -> dict:
+	return {
+		'title': 'Приказ',
+		'members': [
+			{'name': f'Участник {i}', 'position': f'должность {i % 7}', 'phone': f'+7 900 {i:07}'}
+			for i in range(rows)
+		],
+	}
+
+
+def render(cls, path: Path, data: dict) -> tuple[float, bytes]:
+	start = time.perf_counter()
+	doc = cls(path)
+	doc.render(data, get_jinja_env())
+	elapsed = time.perf_counter() - start
+	buffer = BytesIO()
+	doc.save(buffer)
+	return elapsed, buffer.getvalue()
+
+
+def get_text(content: bytes) -> list[str]:
+	document = Document(BytesIO(content))
+	return [cell.text for table in document.tables for row in table.rows for cell in row.cells]
+
+
+def main():
+	sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000, 10000]
+
+	with tempfile.TemporaryDirectory() as tmp:
+		path = Path(tmp) / 'table.docx'
+		make_template(path)
+		render(DocxTemplate, path, make_data(10))  # Warm up imports and jinja cache
+
+		print(f'{"rows":>6} {"docxtpl, s":>11} {"us/row":>7} {"lxml, s":>8} {"us/row":>7} {"speedup":>8}')
+		for rows in sizes:
+			data = make_data(rows)
+			slow, slow_doc = render(DocxTemplate, path, data)
+			fast, fast_doc = render(FastTableTemplate, path, data)
+			if get_text(slow_doc) != get_text(fast_doc):
+				print(f'{rows}: documents differ')
+			print(f'{rows:>6} {slow:>11.3f} {slow / rows * 1e6:>7.0f} {fast:>8.3f} {fast / rows * 1e6:>7.0f} {slow / fast:>7.1f}x')
+
+
+if __name__ == '__main__':
+	main()
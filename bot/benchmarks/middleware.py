@@ -0,0 +1,72 @@
+"""
+Per-update overhead of LoggingMw with debug logs off and on (records go to a NullHandler).
+Usage (from the bot directory): python -m benchmarks.middleware [updates]
+"""
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime
+
+import structlog
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.middlewares.user_context import EVENT_FROM_USER_KEY
+from aiogram.types import Chat, Message, User
+
+from middlewares.logging import LoggingMw
+
+
+async def echo(message: Message, **kwargs):
+	return message.text
+
+
+def setup_null_logging():
+	""" Same logger classes as setup_logging, but nothing is printed """
+	structlog.configure(
+		processors=[structlog.stdlib.add_log_level, structlog.processors.KeyValueRenderer()],
+		logger_factory=structlog.stdlib.LoggerFactory(),
+		wrapper_class=structlog.stdlib.BoundLogger,
+		cache_logger_on_first_use=True,
+	)
+	root_logger = logging.getLogger()
+	root_logger.handlers.clear()
+	root_logger.addHandler(logging.NullHandler())
+
+
+async def measure(middleware, updates: int) -> float:
+	""" Microseconds per update """
+	user = User(id=1, is_bot=False, first_name='Иван', last_name='Иванов', username='ivan')
+	message = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type='private'), from_user=user, text='/start')
+	handler_obj = HandlerObject(echo)
+
+	async def handler(event, data):
+		return await handler_obj.call(event, **data)
+
+	start = time.perf_counter()
+	for _ in range(updates):
+		data = {EVENT_FROM_USER_KEY: user, 'handler': handler_obj}
+		if middleware is None:
+			await handler(message, data)
+		else:
+			await middleware(handler, message, data)
+	return (time.perf_counter() - start) / updates * 1e6
+
+
+async def main():
+	updates = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	setup_null_logging()
+
+	cases = [('no middleware', None, logging.INFO)]
+	for level in (logging.INFO, logging.DEBUG):
+		logging.getLogger().setLevel(level)
+		cases.append((f'LoggingMw, {logging.getLevelName(level)}', LoggingMw(patch_fsm=False), level))
+
+	print(f'{"case":<20} {"us/update":>10}')
+	for name, middleware, level in cases:
+		logging.getLogger().setLevel(level)
+		await measure(middleware, updates // 10)  # Warm up
+		print(f'{name:<20} {await measure(middleware, updates):>10.1f}')
+
+
+if __name__ == '__main__':
+	asyncio.run(main())
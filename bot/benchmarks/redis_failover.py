@@ -0,0 +1,57 @@
+"""
+Latency of FSM writes and reads while Redis fails over (see docker-compose.sentinel.yaml).
+Writes and reads a key every interval, prints requests slower than 100 ms and the longest outage.
+Usage (from the bot directory): python -m benchmarks.redis_failover [seconds] [interval]
+"""
+import asyncio
+import sys
+import time
+
+from redis.exceptions import RedisError
+
+from includes.storage import get_redis
+
+
+async def main():
+	duration = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+	interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+
+	redis = get_redis()
+	latencies: list[float] = []
+	errors = 0
+	outage_started: float | None = None
+	longest_outage = 0.0
+
+	deadline = time.monotonic() + duration
+	while time.monotonic() < deadline:
+		start = time.monotonic()
+		try:
+			await redis.set('benchmark:failover', start)
+			await redis.get('benchmark:failover')
+		except RedisError as e:  # Retries are exhausted
+			errors += 1
+			outage_started = outage_started or start
+			print(f'{time.strftime("%H:%M:%S")} error: {e!r}')
+		else:
+			latency = time.monotonic() - start
+			latencies.append(latency)
+			if latency > 0.1:
+				print(f'{time.strftime("%H:%M:%S")} slow: {latency:.3f} s')
+			if outage_started is not None:
+				longest_outage = max(longest_outage, time.monotonic() - outage_started)
+				outage_started = None
+		await asyncio.sleep(interval)
+
+	await redis.delete('benchmark:failover')
+	await redis.aclose()
+
+	latencies.sort()
+	if latencies:
+		print(f'requests={len(latencies)} errors={errors} '
+		      f'p50={latencies[len(latencies) // 2] * 1000:.1f} ms '
+		      f'p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms '
+		      f'max={latencies[-1]:.3f} s longest_outage={longest_outage:.3f} s')
+
+
+if __name__ == '__main__':
+	asyncio.run(main())
@@ -0,0 +1,47 @@
+"""
+Peak memory of one render + preparing it for upload.
+Usage (from the bot directory): python -m benchmarks.render_memory <template_name> <data.json>
+"""
+import json
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from includes.delivery import save_document
+from includes.jsonschema import generate_document
+
+
+def measure(name: str, func):
+	tracemalloc.start()
+	start = time.perf_counter()
+	func()
+	elapsed = time.perf_counter() - start
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f'{name:<10} peak={peak / 1024 / 1024:8.2f} MiB  time={elapsed:6.3f} s')
+
+
+def bytes_copy(template_name: str, data: dict):
+	""" Old path: BytesIO + getvalue() copy """
+	buffer = BytesIO()
+	generate_document(template_name, data).save(buffer)
+	buffer.getvalue()
+
+
+def spooled(template_name: str, data: dict):
+	save_document(generate_document(template_name, data)).close()
+
+
+def main():
+	template_name, data_path = sys.argv[1:3]
+	with open(data_path, encoding='utf-8') as f:
+		data = json.load(f)
+
+	generate_document(template_name, data)  # Warm up imports and jinja cache
+	measure('bytes', lambda: bytes_copy(template_name, data))
+	measure('spooled', lambda: spooled(template_name, data))
+
+
+if __name__ == '__main__':
+	main()
@@ -1,6 +1,5 @@
 from aiogram import Dispatcher, Router
 from aiogram_dialog import setup_dialogs
-from aiogram_dialog.tools import render_transitions
 
 from dialogs.user import user_dialog_router
 from env import ProjectKeys
@@ -13,6 +12,7 @@ def register_dialogs(dp: Dispatcher, router: Router):
 
 	# Render dialogs preview
 	if ProjectKeys.DEBUG:
+		from aiogram_dialog.tools import render_transitions  # heavy import, only for debug
 		render_transitions(router)
 
 	setup_dialogs(dp)  # Register on dispatcher for using anywhere
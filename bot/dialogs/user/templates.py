@@ -1,63 +1,155 @@
-from io import BytesIO
+import asyncio
+import math
+import time
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
 from typing import Any
 
+import structlog
 from aiogram import F
-from aiogram.exceptions import TelegramNetworkError
-from aiogram.types import CallbackQuery, BufferedInputFile, Message
+from aiogram.enums import ContentType
+from aiogram.exceptions import TelegramNetworkError, TelegramBadRequest
+from aiogram.types import CallbackQuery, Message, FSInputFile
 from aiogram_dialog import Dialog, Window, DialogManager
-from aiogram_dialog.widgets.input import TextInput
-from aiogram_dialog.widgets.kbd import ScrollingGroup, Select, Row, Url, Button, Next, Back, SwitchTo
+from aiogram_dialog.widgets.input import TextInput, MessageInput
+from aiogram_dialog.widgets.kbd import (
+	ScrollingGroup, Select, Row, Url, Button, Next, Back, SwitchTo, Column, Group,
+	StubScroll, FirstPage, PrevPage, CurrentPage, NextPage, LastPage,
+)
 from aiogram_dialog.widgets.text import Format, Multi, Const
 from fluent.runtime import FluentLocalization
 
-from env import TelegramKeys
-from includes import get_available_templates, load_schema, validate_data, generate_document
+from env import TelegramKeys, BatchKeys, AutofillKeys
+from includes import load_schema, collect_errors, generate_document
+from includes.archive import ARCHIVE_KEY, Archive
+from includes.autofill import AUTOFILL_KEY, Autofill, Suggestions, get_suggestions, prefill
+from includes.batch import read_table, generate_batch, get_schema_paths
+from includes.delivery import FileIdCache, SpooledInputFile, get_render_key, save_document
+from includes.search import get_template_index
+from includes.stats import STATS_KEY, UsageStats
+from includes.storage import READ_REDIS_KEY
+from includes.images import IMAGES_KEY, ImageStore, ImageError
+from includes.generation_queue import GENERATION_QUEUE_KEY, GenerationQueue, QueueFullError, AlreadyQueuedError
+from includes.pdf import PDF_POOL_KEY, PdfPool, PdfError, get_pdf
 from includes.templates import create_context
-from includes.templates.contexts import BaseContext, PrimitiveContext
+from includes.templates.contexts import BaseContext, PrimitiveContext, ObjectContext, ImageContext
+from includes.templates.history import History
+from includes.tenants import get_president_id
 from middlewares import L10N_FORMAT_KEY
 from state_machines.templates import CreateByTemplate
-from utils import L10nFormat, escape_mdv2
+from utils import L10nFormat, escape_mdv2, format_error
 
 
 # ========== Окно выбора шаблона ==========
-async def get_template_list(**_kwargs) -> dict[str, Any]:
-	return {'templates': get_available_templates()}
+TEMPLATES_PAGE_WIDTH = 2
+TEMPLATES_PAGE_SIZE = TEMPLATES_PAGE_WIDTH * 5
 
 
-async def on_template_selected(clb: CallbackQuery, _select: Select, dialog_manager: DialogManager, template_name: str):
-	""" Try to load schema. If success - save in fsm and continue, else show alert """
+async def get_template_list(dialog_manager: DialogManager, **_kwargs) -> dict[str, Any]:
+	""" Only the buttons of the current page are rendered (ScrollingGroup renders all of them on each flip) """
+	query: str = dialog_manager.dialog_data.get('query', '')
+	index = get_template_index()
+	names = index.search_names(query) if query else index.names  # A new index when templates change
+
+	pages = math.ceil(len(names) / TEMPLATES_PAGE_SIZE)
+	page = min(await dialog_manager.find('templates_scroll').get_page(), max(pages - 1, 0))
+	return {
+		'templates': names[page * TEMPLATES_PAGE_SIZE:(page + 1) * TEMPLATES_PAGE_SIZE],
+		'pages': pages,
+		'query': escape_mdv2(query),
+		'has_query': bool(query),
+	}
+
+
+async def on_search(_msg: Message, _: TextInput, dialog_manager: DialogManager, query: str):
+	dialog_manager.dialog_data.update(query=query)
+	await dialog_manager.find('templates_scroll').set_page(0)
+
+
+async def on_search_reset(_clb: CallbackQuery, _button: Button, dialog_manager: DialogManager):
+	dialog_manager.dialog_data.pop('query', None)
+
+
+async def select_template(dialog_manager: DialogManager, template_name: str) -> bool:
+	""" Try to load schema. If success - save in fsm and continue """
 	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
 
+	# The name is typed by the user (/create_document <name>): only the bot's templates
+	if template_name not in get_template_index().names:
+		return False
+
 	try:
 		schema = load_schema(template_name)
-		context = create_context(schema)
+		context = create_context(schema, template_name=template_name)
 	except FileNotFoundError:
-		await clb.answer(l10n.format_value('schema-not-found'), show_alert=True)
-		return
+		return False
+	except ValueError as e:  # Broken JSON or unknown type in the schema
+		await structlog.get_logger().aerror('schema-broken', template_name=template_name, error=str(e))
+		return False
+
+	user = dialog_manager.event.from_user
+	autofill: Autofill = dialog_manager.middleware_data[AUTOFILL_KEY]
+	suggestions = await autofill.load(user.id, schema)
+	if AutofillKeys.PREFILL:
+		prefill(context, suggestions)
+
+	stats: UsageStats = dialog_manager.middleware_data[STATS_KEY]
+	stats.template_chosen(template_name, user.id)
 
 	# Send notification to president if exists
-	if TelegramKeys.PRESIDENT_ID:
-		await clb.bot.send_message(
-			TelegramKeys.PRESIDENT_ID,
+	if get_president_id() and TelegramKeys.NOTIFY_PRESIDENT:
+		await dialog_manager.event.bot.send_message(
+			get_president_id(),
 			l10n.format_value('template-chosen', args={
 				'template_name': escape_mdv2(template_name),
-				'by_username': escape_mdv2(clb.from_user.username)
+				'by_username': escape_mdv2(user.username)
 			})
 		)
 
-	dialog_manager.dialog_data.update(template_name=template_name, context=context)
+	dialog_manager.dialog_data.update(
+		template_name=template_name,
+		context=context,
+		history=History(),
+		started_at=time.time(),
+		suggestions=suggestions,
+	)
 	await dialog_manager.switch_to(CreateByTemplate.ADD if isinstance(context, PrimitiveContext) else CreateByTemplate.VIEW)
+	return True
+
+
+async def on_template_selected(clb: CallbackQuery, _select: Select, dialog_manager: DialogManager, template_name: str):
+	""" Select template or show alert """
+	if not await select_template(dialog_manager, template_name):
+		l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+		await clb.answer(l10n.format_value('schema-not-found'), show_alert=True)
+
+
+async def on_dialog_start(start_data: dict | None, dialog_manager: DialogManager):
+	""" Template can be passed on start: /create_document <name> (from inline search) """
+	template_name = (start_data or {}).get('template_name')
+	if template_name and not await select_template(dialog_manager, template_name):
+		dialog_manager.dialog_data.update(query=template_name)
 
 
 # ========== Окно просмотра ==========
+def get_history(dialog_manager: DialogManager) -> History:
+	""" Sessions started before undo was added have no history """
+	return dialog_manager.dialog_data.setdefault('history', History())
+
+
 async def get_template_context(dialog_manager: DialogManager, **_kwargs) -> dict[str, Any]:
 	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
 	context: BaseContext = dialog_manager.dialog_data.get('context')
+	history = get_history(dialog_manager)
 	return {
 		'view': context.render_view(l10n),
 		'data_kb': context.render_data_kb(l10n),
 		'action_kb': context.render_action_kb(l10n),
 		'can_generate': context.can_generate(),
+		'is_root': context.is_root,
+		'can_export_pdf': context.can_generate() and dialog_manager.middleware_data[PDF_POOL_KEY].enabled,
+		'can_undo': history.can_undo,
+		'can_redo': history.can_redo,
 	}
 
 
@@ -71,69 +163,271 @@ async def on_data_selected(_clb: CallbackQuery, _select: Select, dialog_manager:
 
 async def on_action_selected(_clb: CallbackQuery, _select: Select, dialog_manager: DialogManager, action: str):
 	context: BaseContext = dialog_manager.dialog_data.get('context')
-	context = context.do(action)
+	if action == ObjectContext.BULK_ACTION:
+		await dialog_manager.switch_to(CreateByTemplate.BULK)
+		return
+
+	context = get_history(dialog_manager).do(context, action)
 
 	dialog_manager.dialog_data.update(context=context)
 	await dialog_manager.switch_to(CreateByTemplate.VIEW)
 
 
-async def response_document(clb: CallbackQuery, _select: Select, dialog_manager: DialogManager):
+async def on_history_clicked(_clb: CallbackQuery, button: Button, dialog_manager: DialogManager):
+	""" Undo or redo one change and show the changed place """
+	history = get_history(dialog_manager)
+	context = history.undo() if button.widget_id == 'undo' else history.redo()
+	if context is None:
+		return
+
+	dialog_manager.dialog_data.update(context=context)
+	await dialog_manager.switch_to(CreateByTemplate.ADD if isinstance(context, PrimitiveContext) else CreateByTemplate.VIEW)
+
+
+def get_file_id_cache(dialog_manager: DialogManager) -> FileIdCache:
+	middleware_data = dialog_manager.middleware_data
+	return FileIdCache(middleware_data['fsm_storage'].redis, middleware_data[READ_REDIS_KEY])
+
+
+async def remember_values(dialog_manager: DialogManager, user_id: int):
+	""" Values of the sent document are suggested in the next ones """
+	autofill: Autofill = dialog_manager.middleware_data[AUTOFILL_KEY]
+	context: BaseContext = dialog_manager.dialog_data.get('context')
+	suggestions: Suggestions | None = dialog_manager.dialog_data.get('suggestions')
+	if suggestions is None:  # Sessions started before autofill was added
+		suggestions = await autofill.load(user_id, load_schema(dialog_manager.dialog_data.get('template_name')))
+
+	suggestions = autofill.remember(user_id, context.get_root(), suggestions)
+	dialog_manager.dialog_data.update(suggestions=suggestions)
+
+
+async def archive_document(clb: CallbackQuery, dialog_manager: DialogManager, sent_doc: Message, filename: str,
+                           render_key: str, data: dict, file: SpooledTemporaryFile | Path | None = None):
+	""" Keep the sent document for /history (file - if it was rendered now, not sent by file_id) """
+	archive: Archive = dialog_manager.middleware_data[ARCHIVE_KEY]
+	await archive.add(
+		clb.bot.id, clb.from_user.id, clb.from_user.username,
+		dialog_manager.dialog_data.get('template_name'), filename,
+		render_key, data, sent_doc.document.file_id, file,
+	)
+
+
+def render_document(template_name: str, data: dict) -> SpooledTemporaryFile:
+	""" Blocking, run in a thread """
+	return save_document(generate_document(template_name, data))
+
+
+async def get_valid_data(clb: CallbackQuery, dialog_manager: DialogManager) -> dict | None:
+	""" Data of the draft or None (errors are marked and shown) """
 	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
 	template_name: str = dialog_manager.dialog_data.get('template_name')
 	context: BaseContext = dialog_manager.dialog_data.get('context')
 
 	data = context.generate_context()
 	schema = load_schema(template_name)
-	success, error_msg = validate_data(schema, data)
-	if not success:
-		await clb.answer(error_msg, show_alert=True)
+	errors = collect_errors(schema, data)
+	if context.mark_errors(errors):
+		# Errors are shown in the view, so the user can fix all of them at once
+		dialog_manager.dialog_data.update(context=context)
+		await clb.answer(l10n.format_value('validation-errors', args={'count': len(errors)}), show_alert=True)
+		return None
+	return data
+
+
+class QueuedNotice:
+	""" Tells the user the position in the generation queue (on_queued callback) """
+
+	def __init__(self, message: Message, l10n: FluentLocalization):
+		self.message = message
+		self.l10n = l10n
+		self.sent: Message | None = None
+
+	async def __call__(self, position: int):
+		self.sent = await self.message.answer(self.l10n.format_value('generation-queued', args={'position': position}))
+
+	async def ready(self):
+		if self.sent is not None:
+			await self.sent.edit_text(self.l10n.format_value('generation-ready'))
+
+
+async def response_document(clb: CallbackQuery, _select: Select, dialog_manager: DialogManager):
+	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+	template_name: str = dialog_manager.dialog_data.get('template_name')
+
+	data = await get_valid_data(clb, dialog_manager)
+	if data is None:
 		return
 
-	doc = generate_document(template_name, data)
-	buffer = BytesIO()
-	doc.save(buffer)
-	file = BufferedInputFile(buffer.getvalue(), filename=f'{template_name}.docx')
+	file_id_cache = get_file_id_cache(dialog_manager)
+	render_key = get_render_key(template_name, data)
+	file = None
+	render_time: float | None = None
+	queued_notice = QueuedNotice(clb.message, l10n)
 
 	try:
-		sent_doc = await clb.message.answer_document(file)
+		# The same document was already uploaded - send it by file_id without rendering
+		document: str | SpooledInputFile | None = await file_id_cache.get(render_key)
+		if document is None:
+			queue: GenerationQueue = dialog_manager.middleware_data[GENERATION_QUEUE_KEY]
+			try:
+				async with queue.enqueue(clb.from_user.id, queued_notice):
+					render_started = time.perf_counter()
+					file = await asyncio.to_thread(render_document, template_name, data)
+					render_time = time.perf_counter() - render_started
+			except (QueueFullError, AlreadyQueuedError) as e:
+				await clb.answer(l10n.format_value(str(e)), show_alert=True)
+				return
+			document = SpooledInputFile(file, filename=f'{template_name}.docx')
+
+		sent_doc = await clb.message.answer_document(document)
+		await queued_notice.ready()
+		await file_id_cache.set(render_key, sent_doc.document.file_id)
+		await archive_document(clb, dialog_manager, sent_doc, f'{template_name}.docx', render_key, data, file)
+		await remember_values(dialog_manager, clb.from_user.id)
+
+		started_at: float | None = dialog_manager.dialog_data.get('started_at')
+		stats: UsageStats = dialog_manager.middleware_data[STATS_KEY]
+		stats.document_generated(
+			template_name,
+			clb.from_user.id,
+			complete_time=time.time() - started_at if started_at else None,
+			render_time=render_time,
+		)
 
 		# Send it to president if exist
-		if TelegramKeys.PRESIDENT_ID:
-			await clb.bot.send_message(
-				TelegramKeys.PRESIDENT_ID,
-				l10n.format_value('document-generated', args={
+		if get_president_id() and TelegramKeys.NOTIFY_PRESIDENT:
+			await clb.bot.send_document(
+				get_president_id(),
+				sent_doc.document.file_id,
+				caption=l10n.format_value('document-generated', args={
 					'template_name': escape_mdv2(template_name),
 					'by_username': escape_mdv2(clb.from_user.username)
 				})
 			)
-			await sent_doc.forward(TelegramKeys.PRESIDENT_ID)
 
 	except TelegramNetworkError as e:
 		await clb.answer(l10n.format_value('telegram-network-error'), show_alert=True)
 		raise e
+	finally:
+		if file is not None:
+			file.close()
+
+
+async def response_pdf(clb: CallbackQuery, _button: Button, dialog_manager: DialogManager):
+	""" The same document converted to PDF """
+	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+	template_name: str = dialog_manager.dialog_data.get('template_name')
+
+	data = await get_valid_data(clb, dialog_manager)
+	if data is None:
+		return
+
+	file_id_cache = get_file_id_cache(dialog_manager)
+	render_key = get_render_key(template_name, data)
+	pdf_key = f'{render_key}.pdf'  # file_id of the PDF
+	queued_notice = QueuedNotice(clb.message, l10n)
+	pdf_path: Path | None = None
+
+	document: str | FSInputFile | None = await file_id_cache.get(pdf_key)
+	if document is None:
+		queue: GenerationQueue = dialog_manager.middleware_data[GENERATION_QUEUE_KEY]
+		pdf_pool: PdfPool = dialog_manager.middleware_data[PDF_POOL_KEY]
+		try:
+			async with queue.enqueue(clb.from_user.id, queued_notice):
+				pdf_path = await get_pdf(pdf_pool, template_name, data, render_key)
+		except (QueueFullError, AlreadyQueuedError, PdfError) as e:
+			await clb.answer(l10n.format_value(str(e)), show_alert=True)
+			return
+		document = FSInputFile(pdf_path, filename=f'{template_name}.pdf')
+
+	try:
+		sent_doc = await clb.message.answer_document(document)
+	except TelegramNetworkError as e:
+		await clb.answer(l10n.format_value('telegram-network-error'), show_alert=True)
+		raise e
+	await queued_notice.ready()
+	await file_id_cache.set(pdf_key, sent_doc.document.file_id)
+	await archive_document(clb, dialog_manager, sent_doc, f'{template_name}.pdf', render_key, data, pdf_path)
+	await remember_values(dialog_manager, clb.from_user.id)
 
 
 # ========== Окно редактирования ==========
 async def get_property_context(dialog_manager: DialogManager, **_kwargs) -> dict[str, Any]:
 	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
 	context: PrimitiveContext = dialog_manager.dialog_data.get('context')
+	# Options are buttons already, the previous values are suggested for free input only
+	suggestions = [] if context.has_choices or not context.TEXT_INPUT else get_suggestions(context, dialog_manager.dialog_data.get('suggestions', {}))
 	return {
 		'question': context.ask_question(),
 		'action_kb': context.render_action_kb(l10n),
+		'choice_kb': context.render_choice_kb(l10n),
 		'can_generate': context.can_generate(),
+		'suggestions': [(format_suggestion(value), i) for i, value in enumerate(suggestions)],
 	}
 
 
+def format_suggestion(value: Any, max_length: int = 60) -> str:
+	text = str(value)
+	return text if len(text) <= max_length else f'{text[:max_length - 1]}…'
+
+
 async def set_property(msg: Message, _: TextInput, dialog_manager: DialogManager, value: str):
 	context: PrimitiveContext = dialog_manager.dialog_data.get('context')
 	try:
 		parsed_value = context.parse(value)
 	except ValueError as e:
 		l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+		await msg.answer(format_error(l10n, e))
+		return
+
+	await apply_value(dialog_manager, context, parsed_value)
+
+
+async def set_image(msg: Message, _: MessageInput, dialog_manager: DialogManager):
+	""" Photo or image file for an image field (downloaded and resized once per image and size) """
+	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+	context: PrimitiveContext = dialog_manager.dialog_data.get('context')
+	if not isinstance(context, ImageContext):
+		await msg.answer(l10n.format_value('image-not-expected'))
+		return
+
+	file = msg.photo[-1] if msg.photo else msg.document  # The largest size of the photo
+	if msg.document is not None and not (msg.document.mime_type or '').startswith('image/'):
+		await msg.answer(l10n.format_value('image-unsupported'))
+		return
+
+	images: ImageStore = dialog_manager.middleware_data[IMAGES_KEY]
+	try:
+		value = await images.fetch(msg.bot, file, context.size)
+	except ImageError as e:
 		await msg.answer(l10n.format_value(str(e)))
 		return
 
-	context.set_value(parsed_value)
+	await apply_value(dialog_manager, context, value)
+
+
+async def on_choice_selected(_clb: CallbackQuery, _select: Select, dialog_manager: DialogManager, item_id: str):
+	""" Option of enum / boolean field: the value is taken by index, without parsing """
+	context: PrimitiveContext = dialog_manager.dialog_data.get('context')
+	try:
+		value = context.get_choice(int(item_id))
+	except (TypeError, IndexError):  # A button of an old message
+		return
+	await apply_value(dialog_manager, context, value)
+
+
+async def on_suggestion_selected(_clb: CallbackQuery, _select: Select, dialog_manager: DialogManager, item_id: str):
+	""" One tap instead of typing a value from the previous documents """
+	context: PrimitiveContext = dialog_manager.dialog_data.get('context')
+	suggestions = get_suggestions(context, dialog_manager.dialog_data.get('suggestions', {}))
+	i = int(item_id)
+	if i < len(suggestions):
+		await apply_value(dialog_manager, context, suggestions[i])
+
+
+async def apply_value(dialog_manager: DialogManager, context: PrimitiveContext, parsed_value: Any):
+	""" Set the value and return to the parent """
+	get_history(dialog_manager).set_value(context, parsed_value)
 	try:  # try to go back
 		context = context.do('back')
 	except ValueError:
@@ -144,10 +438,94 @@ async def set_property(msg: Message, _: TextInput, dialog_manager: DialogManager
 	await dialog_manager.switch_to(CreateByTemplate.VIEW)
 
 
+# ========== Окно заполнения нескольких полей ==========
+async def get_bulk_context(dialog_manager: DialogManager, **_kwargs) -> dict[str, Any]:
+	context: ObjectContext = dialog_manager.dialog_data.get('context')
+	return {
+		'title': context.title,
+		'fields': context.render_bulk_hint(),
+	}
+
+
+async def set_bulk_properties(msg: Message, _: TextInput, dialog_manager: DialogManager, value: str):
+	""" Parse all lines at once, report all errors, save only if there are no errors """
+	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+	context: ObjectContext = dialog_manager.dialog_data.get('context')
+
+	values, errors = context.parse_bulk(value)
+	if errors:
+		await msg.answer('\n'.join(
+			fr'• {escape_mdv2(name)}: {format_error(l10n, error)}'
+			for name, error in errors
+		))
+		return
+
+	get_history(dialog_manager).set_bulk(context, values)
+	dialog_manager.dialog_data.update(context=context)
+	await dialog_manager.switch_to(CreateByTemplate.VIEW)
+
+
+# ========== Окно генерации по таблице ==========
+async def get_batch_context(dialog_manager: DialogManager, **_kwargs) -> dict[str, Any]:
+	schema = load_schema(dialog_manager.dialog_data.get('template_name'))
+	return {
+		'columns': escape_mdv2(', '.join(get_schema_paths(schema))),
+	}
+
+
+async def on_batch_file(msg: Message, _: MessageInput, dialog_manager: DialogManager):
+	""" Render a document for each row of the table and send them in one ZIP """
+	l10n: FluentLocalization = dialog_manager.middleware_data.get(L10N_FORMAT_KEY)
+	template_name: str = dialog_manager.dialog_data.get('template_name')
+
+	if msg.document.file_size and msg.document.file_size > BatchKeys.MAX_FILE_SIZE:
+		await msg.answer(l10n.format_value('batch-file-too-large'))
+		return
+
+	try:
+		buffer = await msg.bot.download(msg.document)
+		headers, rows = await asyncio.to_thread(read_table, msg.document.file_name or '', buffer.getvalue())
+	except ValueError as e:
+		await msg.answer(format_error(l10n, e))
+		return
+
+	async def on_progress(done: int, total: int):
+		try:
+			await progress_msg.edit_text(l10n.format_value('batch-progress', args={'done': done, 'total': total}))
+		except TelegramBadRequest:  # Not modified
+			pass
+
+	# The whole batch takes one slot of the queue (its documents are rendered by the batch pool)
+	queue: GenerationQueue = dialog_manager.middleware_data[GENERATION_QUEUE_KEY]
+	try:
+		async with queue.enqueue(msg.from_user.id, QueuedNotice(msg, l10n)):
+			progress_msg = await msg.answer(l10n.format_value('batch-progress', args={'done': 0, 'total': len(rows)}))
+			archive_path, errors = await generate_batch(template_name, load_schema(template_name), headers, rows, on_progress)
+	except (QueueFullError, AlreadyQueuedError) as e:
+		await msg.answer(l10n.format_value(str(e)))
+		return
+
+	try:
+		if archive_path is not None:
+			await msg.answer_document(FSInputFile(archive_path, filename=f'{template_name}.zip'))
+	finally:
+		if archive_path is not None:
+			archive_path.unlink(missing_ok=True)
+
+	if errors:
+		shown = errors[:BatchKeys.MAX_ERRORS_SHOWN]
+		await msg.answer('\n'.join([
+			l10n.format_value('batch-errors', args={'count': len(errors)}),
+			*(fr'{escape_mdv2(location)}: {format_error(l10n, error)}' for location, error in shown),
+		]))
+
+
 template_dialog = Dialog(
 	Window(  # Окно с выбором шаблона
 		L10nFormat('choose-template'),
-		ScrollingGroup(
+		L10nFormat('search-hint', when=~F['has_query']),
+		Format(r'🔎 `{query}`', when=F['has_query']),
+		Group(
 			Select(
 				Format('{item}'),
 				id='templates_select',
@@ -155,12 +533,20 @@ template_dialog = Dialog(
 				items='templates',
 				on_click=on_template_selected
 			),
-			id='templates_scroll',
-			width=2,
-			height=5,
-			hide_on_single_page=True
+			StubScroll(id='templates_scroll', pages='pages'),  # The page of the getter, no buttons
+			width=TEMPLATES_PAGE_WIDTH,
+		),
+		Row(
+			FirstPage(scroll='templates_scroll'),
+			PrevPage(scroll='templates_scroll'),
+			CurrentPage(scroll='templates_scroll', text=Format('{current_page1}/{pages}')),
+			NextPage(scroll='templates_scroll'),
+			LastPage(scroll='templates_scroll'),
+			when=F['pages'] > 1,
 		),
+		Row(Button(L10nFormat('search-reset'), id='search_reset', on_click=on_search_reset, when=F['has_query'])),
 		Row(Url(L10nFormat('templates-link-text'), url=L10nFormat('templates-link'))),
+		TextInput('template_search', on_success=on_search),
 		getter=get_template_list,
 		state=CreateByTemplate.CHOOSE_TEMPLATE,
 		preview_add_transitions=[
@@ -197,12 +583,28 @@ template_dialog = Dialog(
 			items='action_kb',
 			on_click=on_action_selected
 		),
+		Row(
+			Button(L10nFormat('undo'), id='undo', on_click=on_history_clicked, when=F['can_undo']),
+			Button(L10nFormat('redo'), id='redo', on_click=on_history_clicked, when=F['can_redo']),
+		),
 		Row(Button(
 			L10nFormat('generate-document'),
 			id='generate_document',
 			on_click=response_document,
 			when=F['can_generate']
 		)),
+		Row(Button(
+			L10nFormat('generate-pdf'),
+			id='generate_pdf',
+			on_click=response_pdf,
+			when=F['can_export_pdf']
+		)),
+		Row(SwitchTo(
+			L10nFormat('batch-generate'),
+			id='batch_generate',
+			state=CreateByTemplate.BATCH,
+			when=F['is_root']
+		)),
 		getter=get_template_context,
 		state=CreateByTemplate.VIEW,
 		preview_add_transitions=[
@@ -213,6 +615,27 @@ template_dialog = Dialog(
 	Window(  # Окно редактирования
 		Format('{question}'),
 		TextInput('input_property', on_success=set_property),
+		MessageInput(set_image, content_types=[ContentType.PHOTO, ContentType.DOCUMENT]),
+		ScrollingGroup(
+			Select(
+				Format('{item[0]}'),
+				id='choices',
+				item_id_getter=lambda x: x[1],
+				items='choice_kb',
+				on_click=on_choice_selected
+			),
+			id='choices_scroll',
+			width=2,
+			height=5,
+			hide_on_single_page=True
+		),
+		Column(Select(
+			Format('{item[0]}'),
+			id='suggestions',
+			item_id_getter=lambda x: x[1],
+			items='suggestions',
+			on_click=on_suggestion_selected
+		)),
 		Select(
 			Format('{item[0]}'),
 			id='template_action',
@@ -223,5 +646,23 @@ template_dialog = Dialog(
 		getter=get_property_context,
 		state=CreateByTemplate.ADD,
 		preview_add_transitions=[Back()]
-	)
+	),
+	Window(  # Окно заполнения нескольких полей
+		Format('*{title}*\n'),
+		L10nFormat('bulk-question'),
+		Format('\n{fields}'),
+		TextInput('input_bulk', on_success=set_bulk_properties),
+		SwitchTo(L10nFormat('back'), id='bulk_back', state=CreateByTemplate.VIEW),
+		getter=get_bulk_context,
+		state=CreateByTemplate.BULK,
+	),
+	Window(  # Окно генерации по таблице
+		L10nFormat('batch-question'),
+		Format('`{columns}`'),
+		MessageInput(on_batch_file, content_types=ContentType.DOCUMENT),
+		SwitchTo(L10nFormat('back'), id='batch_back', state=CreateByTemplate.VIEW),
+		getter=get_batch_context,
+		state=CreateByTemplate.BATCH,
+	),
+	on_start=on_dialog_start,
 )
@@ -12,8 +12,11 @@ env = environ.Env(
 
 
 class TelegramKeys:
-	API_TOKEN: Final[str] = env('TG_API_TOKEN')
+	API_TOKEN: Final[str] = env.str('TG_API_TOKEN', default='')
+	BOTS_CONFIG: Final[str] = env.str('BOTS_CONFIG', default='')  # JSON with many bots (then TG_API_TOKEN is not used)
 	PRESIDENT_ID: Final[int] = env.int('PRESIDENT_ID', 0)
+	NOTIFY_PRESIDENT: Final[bool] = env.bool('NOTIFY_PRESIDENT', default=True)  # Message on each chosen template / document
+	ADMIN_IDS: Final[list[int]] = env.list('ADMIN_IDS', cast=int, default=[])  # President is always an admin
 
 
 class RedisKeys:
@@ -21,17 +24,132 @@ class RedisKeys:
 	PORT: Final[str] = env.str('REDIS_PORT', default='6379')
 	DATABASE: Final[str] = env.str('REDIS_DB', default='0')
 	URL: Final[str] = env.str('REDIS_URL', default=f'redis://{HOST}:{PORT}/{DATABASE}')
+	REPLICA_URL: Final[str] = env.str('REDIS_REPLICA_URL', default='')  # For reads without Sentinel
+
+	# Sentinel: the master is discovered by name (REDIS_URL is not used then)
+	SENTINELS: Final[list[str]] = env.list('REDIS_SENTINELS', default=[])  # host:port,host:port
+	SENTINEL_MASTER: Final[str] = env.str('REDIS_SENTINEL_MASTER', default='mymaster')
+	SENTINEL_PASSWORD: Final[str] = env.str('REDIS_SENTINEL_PASSWORD', default='')
+	PASSWORD: Final[str] = env.str('REDIS_PASSWORD', default='')  # Of master and replicas with Sentinel
+
+	# Send read-only requests (stats, reports, file_id cache) to replicas
+	READ_FROM_REPLICAS: Final[bool] = env.bool('REDIS_READ_FROM_REPLICAS', default=False)
+
+	# Reconnection: retries with exponential backoff (seconds) and timeouts
+	RETRIES: Final[int] = env.int('REDIS_RETRIES', default=5)
+	BACKOFF_BASE: Final[float] = env.float('REDIS_BACKOFF_BASE', default=0.05)
+	BACKOFF_CAP: Final[float] = env.float('REDIS_BACKOFF_CAP', default=2)
+	SOCKET_TIMEOUT: Final[float] = env.float('REDIS_SOCKET_TIMEOUT', default=5)
+	CONNECT_TIMEOUT: Final[float] = env.float('REDIS_CONNECT_TIMEOUT', default=2)
+	HEALTH_CHECK_INTERVAL: Final[int] = env.int('REDIS_HEALTH_CHECK_INTERVAL', default=30)
+
+
+class SessionKeys:
+	# Idle timeouts of FSM state and data (seconds), refreshed on each access. 0 - keep forever
+	STATE_TTL: Final[int] = env.int('SESSION_STATE_TTL', default=0)
+	DATA_TTL: Final[int] = env.int('SESSION_DATA_TTL', default=0)
+
+	# Drafts idle longer than IDLE_AFTER seconds are archived (compressed) or deleted. 0 - disabled
+	IDLE_AFTER: Final[int] = env.int('SESSION_IDLE_AFTER', default=0)
+	IDLE_ACTION: Final[str] = env.str('SESSION_IDLE_ACTION', default='archive')  # archive / delete
+	SWEEP_INTERVAL: Final[int] = env.int('SESSION_SWEEP_INTERVAL', default=60 * 60)
+
+
+class CompressionKeys:
+	# FSM data compression: zstd / lz4 (optional packages) / zlib / none
+	CODEC: Final[str] = env.str('COMPRESSION_CODEC', default='none')
+	THRESHOLD: Final[int] = env.int('COMPRESSION_THRESHOLD', default=1024)  # bytes
+	LEVEL: Final[int] = env.int('COMPRESSION_LEVEL', default=3)  # zstd level
+	DICT_DIR: Final[str] = env.str('COMPRESSION_DICT_DIR', default='resources/zstd_dicts/')
 
 
 class ProjectKeys:
 	DEBUG: Final[bool] = env.bool('DEBUG')
 
+	# Number of processes handling updates (1 - handle in the polling process)
+	WORKERS: Final[int] = env.int('WORKERS', default=1)
+
+	# Warn if importing modules on start takes longer (seconds)
+	IMPORT_TIME_BUDGET: Final[float] = env.float('IMPORT_TIME_BUDGET', default=1.5)
+
 	TEMPLATES_DIR: Final[Path] = env('TEMPLATES_DIR', default=Path('resources/templates/'))
+	SEARCH_MIN_SIMILARITY: Final[float] = env.float('SEARCH_MIN_SIMILARITY', default=0.3)  # Share of common trigrams
+	SPOOL_MAX_SIZE: Final[int] = env.int('SPOOL_MAX_SIZE', default=1024 * 1024)  # Rendered documents above it go to disk
+	FILE_ID_TTL: Final[int] = env.int('FILE_ID_TTL', default=30 * 24 * 60 * 60)  # Reuse uploaded documents (seconds)
+	DOCUMENTS_DIR: Final[str] = env.str('DOCUMENTS_DIR', default='resources/documents/')  # Rendered .docx and .pdf by render key
+	DOCUMENTS_TTL_DAYS: Final[float] = env.float('DOCUMENTS_TTL_DAYS', default=7)  # Since the last use (0 - kept forever)
+	CLEANUP_INTERVAL: Final[int] = env.int('CLEANUP_INTERVAL', default=3600)  # seconds between removing expired files
+	JINJA_CACHE_DIR: Final[str] = env.str('JINJA_CACHE_DIR', default='resources/jinja_cache/')  # '' - no disk cache
+	HISTORY_LENGTH: Final[int] = env.int('HISTORY_LENGTH', default=20)  # Undo steps kept per draft
+	FAST_TABLE_MIN_ROWS: Final[int] = env.int('FAST_TABLE_MIN_ROWS', default=100)  # Table loops expanded by lxml (0 - off)
 
 	LOCALE_DIR: Final[Path] = env('LOCALE_DIR', default=Path('l10n/'))
 	AVAILABLE_LOCALES: Final[list[str]] = env.list('AVAILABLE_LOCALES', default=['ru'])
 
 
+class GenerationKeys:
+	CONCURRENCY: Final[int] = env.int('GENERATION_CONCURRENCY', default=2)  # Documents rendered at once (per worker)
+	MAX_QUEUE: Final[int] = env.int('GENERATION_MAX_QUEUE', default=50)  # Waiting requests, others are rejected
+
+
+class BatchKeys:
+	WORKERS: Final[int] = env.int('BATCH_WORKERS', default=2)  # Render processes
+	MAX_ROWS: Final[int] = env.int('BATCH_MAX_ROWS', default=500)
+	MAX_FILE_SIZE: Final[int] = env.int('BATCH_MAX_FILE_SIZE', default=5 * 1024 * 1024)  # bytes
+	MAX_ERRORS_SHOWN: Final[int] = env.int('BATCH_MAX_ERRORS_SHOWN', default=20)
+	PROGRESS_INTERVAL: Final[float] = env.float('BATCH_PROGRESS_INTERVAL', default=2)  # seconds between edits
+
+
+class PdfKeys:
+	POOL_SIZE: Final[int] = env.int('PDF_POOL_SIZE', default=0)  # Resident soffice processes (0 - PDF export is off)
+	UNOSERVER: Final[str] = env.str('PDF_UNOSERVER', default='unoserver')  # Command starting a converter
+	MAX_JOBS: Final[int] = env.int('PDF_MAX_JOBS', default=100)  # Restart a converter after so many documents
+	TIMEOUT: Final[float] = env.float('PDF_TIMEOUT', default=60)  # seconds per document
+	START_TIMEOUT: Final[float] = env.float('PDF_START_TIMEOUT', default=60)
+	HEALTH_INTERVAL: Final[float] = env.float('PDF_HEALTH_INTERVAL', default=60)
+
+
+class ImageKeys:
+	DIR: Final[str] = env.str('IMAGES_DIR', default='resources/images/')  # Processed images of image fields
+	WORKERS: Final[int] = env.int('IMAGES_WORKERS', default=1)  # Resize processes (Pillow)
+	DPI: Final[int] = env.int('IMAGES_DPI', default=200)  # Pixels per inch of the field's size in the template
+	MAX_SIDE: Final[int] = env.int('IMAGES_MAX_SIDE', default=2000)  # pixels, for fields without a size
+	QUALITY: Final[int] = env.int('IMAGES_QUALITY', default=85)  # JPEG
+	MAX_FILE_SIZE: Final[int] = env.int('IMAGES_MAX_FILE_SIZE', default=20 * 1024 * 1024)  # bytes (Bot API limit)
+	TTL_DAYS: Final[float] = env.float('IMAGES_TTL_DAYS', default=30)  # Since the last use, longer than SESSION_DATA_TTL (0 - forever)
+
+
+class StatsKeys:
+	TTL_DAYS: Final[int] = env.int('STATS_TTL_DAYS', default=90)  # Daily counters are kept so long
+
+
+class AutofillKeys:
+	MAX_VALUES: Final[int] = env.int('AUTOFILL_MAX_VALUES', default=5)  # Remembered values per field (0 - off)
+	PREFILL: Final[bool] = env.bool('AUTOFILL_PREFILL', default=True)  # Fill empty fields with the last values
+	TTL_DAYS: Final[int] = env.int('AUTOFILL_TTL_DAYS', default=180)  # Since the user's last document
+
+
+class ArchiveKeys:
+	DIR: Final[str] = env.str('ARCHIVE_DIR', default='resources/archive/')  # Sent documents and their index ('' - off)
+	SEARCH_LIMIT: Final[int] = env.int('ARCHIVE_SEARCH_LIMIT', default=10)  # Documents shown by /history
+	TTL_DAYS: Final[float] = env.float('ARCHIVE_TTL_DAYS', default=365)  # Documents are removed after it (0 - kept forever)
+
+
+class ProfilingKeys:
+	REPORTS_DIR: Final[Path] = env('PROFILING_REPORTS_DIR', default=Path('logs/profiles/'))
+	MAX_SECONDS: Final[int] = env.int('PROFILING_MAX_SECONDS', default=300)
+	TRACEMALLOC_FRAMES: Final[int] = env.int('PROFILING_TRACEMALLOC_FRAMES', default=10)
+	REPORT_LINES: Final[int] = env.int('PROFILING_REPORT_LINES', default=50)
+
+
+class TracingKeys:
+	EXPORTER: Final[str] = env.str('TRACING_EXPORTER', default='')  # otlp / json ('' - tracing is off)
+	OTLP_ENDPOINT: Final[str] = env.str('TRACING_OTLP_ENDPOINT', default='http://localhost:4318/v1/traces')
+	JSON_PATH: Final[Path] = env('TRACING_JSON_PATH', default=Path('logs/traces.jsonl'))  # One span per line
+	SAMPLE_RATE: Final[float] = env.float('TRACING_SAMPLE_RATE', default=0.1)  # Share of traced updates
+	SERVICE_NAME: Final[str] = env.str('TRACING_SERVICE_NAME', default='best-bot')
+
+
 class LoggerKeys:
 	SHOW_DEBUG_LOGS: Final[bool] = env.bool('SHOW_DEBUG_LOGS', default=False)
 
@@ -0,0 +1,121 @@
+from pathlib import Path
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.types import Message
+from fluent.runtime import FluentLocalization
+from redis.asyncio import Redis
+
+from includes.generation_queue import GenerationQueue
+from includes.profiling import Profiler, collect_sessions
+from includes.stats import UsageStats
+from includes.tenants import is_admin
+from utils import escape_mdv2
+
+router = Router()
+router.message.filter(F.from_user.id.func(is_admin))  # The bot's president or ADMIN_IDS
+
+
+def as_code_block(lines: list[str]) -> str:
+	text = '\n'.join(lines).replace('\\', '\\\\').replace('`', '\\`')
+	return f'```\n{text}\n```'
+
+
+def format_seconds(value: float | None) -> str:
+	return '-' if value is None else f'{value:.1f}'
+
+
+def format_queue(queue: GenerationQueue, l10n: FluentLocalization) -> str:
+	""" Generation queue of this process since start """
+	metrics = queue.metrics.as_dict()
+	return l10n.format_value('stats-queue', args={
+		'rendering': queue.rendering,
+		'concurrency': queue.concurrency,
+		'waiting': len(queue.waiting),
+		**{key: escape_mdv2(str(value)) for key, value in metrics.items()},
+	})
+
+
+@router.message(Command('stats'))
+async def show_stats(msg: Message, command: CommandObject, stats: UsageStats, generation_queue: GenerationQueue,
+                     l10n: FluentLocalization):
+	""" /stats [days] - top templates, completion rate, time to complete and render times, the generation queue """
+	days = min(int(command.args), 365) if command.args and command.args.isdigit() and int(command.args) > 0 else 7
+	users, top = await stats.report(days)
+	if not top:
+		await msg.answer('\n'.join([
+			l10n.format_value('stats-empty', args={'days': days}),
+			format_queue(generation_queue, l10n),
+		]))
+		return
+
+	lines = [f'{"chosen":>6} {"done":>5} {"rate":>4} {"users":>5} {"fill,s":>7} {"render p50/p90,s":>16}  template']
+	for t in top:
+		render = f'{format_seconds(t.render_p50)}/{format_seconds(t.render_p90)}'
+		lines.append(
+			f'{t.chosen:>6} {t.generated:>5} {t.completion_rate:>4.0%} {t.users:>5} '
+			f'{format_seconds(t.complete_p50):>7} {render:>16}  {t.name}'
+		)
+
+	await msg.answer('\n'.join([
+		l10n.format_value('stats-header', args={'days': days, 'users': users}),
+		as_code_block(lines),
+		format_queue(generation_queue, l10n),
+	]))
+
+
+@router.message(Command('sessions'))
+async def sessions(msg: Message, command: CommandObject, fsm_storage: BaseStorage, read_redis: Redis,
+                   l10n: FluentLocalization):
+	""" /sessions [N] - the largest drafts: pickled dialog_data size and context nodes """
+	limit = int(command.args) if command.args and command.args.isdigit() else 10
+	infos = await collect_sessions(fsm_storage, read_redis, limit)
+	if not infos:
+		await msg.answer(l10n.format_value('sessions-empty'))
+		return
+
+	lines = [
+		f'{info.dialog_data_bytes:>8} {info.raw_bytes:>8} {info.nodes:>5}  {info.template_name}  {info.key}'
+		for info in infos
+	]
+	header = f'{"data, B":>8} {"redis, B":>8} {"nodes":>5}  template  key'
+	await msg.answer(as_code_block([header, *lines]))
+
+
+@router.message(Command('profile'))
+async def profile(msg: Message, command: CommandObject, profiler: Profiler, l10n: FluentLocalization):
+	"""
+	/profile cpu|memory <handler name or state> [seconds] - profile calls of the handler
+	/profile stop - finish now
+	"""
+	args = (command.args or '').split()
+
+	if args == ['stop']:
+		path = await profiler.stop()
+		if path is None:
+			await msg.answer(l10n.format_value('profiling-not-running'))
+		else:
+			await msg.answer(l10n.format_value('profiling-done', args={'path': escape_mdv2(str(path))}))
+		return
+
+	if len(args) not in (2, 3) or (len(args) == 3 and not args[2].isdigit()):
+		await msg.answer(l10n.format_value('profiling-usage'))
+		return
+
+	async def on_report(path: Path):
+		await msg.answer(l10n.format_value('profiling-done', args={'path': escape_mdv2(str(path))}))
+
+	kind, target = args[:2]
+	seconds = int(args[2]) if len(args) == 3 else 60
+	try:
+		session = profiler.start(kind, target, seconds, on_report)
+	except ValueError as e:
+		await msg.answer(l10n.format_value(str(e)))
+		return
+
+	await msg.answer(l10n.format_value('profiling-started', args={
+		'kind': kind,
+		'target': escape_mdv2(target),
+		'seconds': session.seconds,
+	}))
@@ -1,9 +1,14 @@
 from aiogram import Router
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram_dialog import DialogManager, StartMode, ShowMode
 from fluent.runtime import FluentLocalization
 
+from includes.archive import Archive
+from includes.tenants import is_admin
+from keyboards.callback_factories import HistoryFactory
+from keyboards.history import history_ikb
 from state_machines.templates import CreateByTemplate
 
 router = Router()
@@ -15,10 +20,58 @@ async def start(msg: Message, l10n: FluentLocalization):
 
 
 @router.message(Command('create_document'))
-async def choose_template(_: Message, dialog_manager: DialogManager):
-	""" Ask for a template for creation """
+async def choose_template(_: Message, command: CommandObject, dialog_manager: DialogManager):
+	""" Ask for a template for creation (or open it at once: /create_document <name>) """
 	await dialog_manager.start(
 		CreateByTemplate.CHOOSE_TEMPLATE,
+		data={'template_name': command.args.strip()} if command.args else None,
 		mode=StartMode.RESET_STACK,
 		show_mode=ShowMode.DELETE_AND_SEND
 	)
+
+
+@router.message(Command('history'))
+async def history(msg: Message, command: CommandObject, archive: Archive, l10n: FluentLocalization):
+	""" /history [words] - the user's sent documents by template, date (01.02.2025) or field values. Admins see all """
+	if not archive.enabled:
+		await msg.answer(l10n.format_value('history-disabled'))
+		return
+
+	query = command.args or ''
+	is_admin_user = is_admin(msg.from_user.id)
+	entries = await archive.search(msg.bot.id, None if is_admin_user else msg.from_user.id, query)
+	if not entries:
+		await msg.answer(l10n.format_value('history-empty'))
+		return
+
+	await msg.answer(
+		l10n.format_value('history-found', args={'count': len(entries)}),
+		reply_markup=history_ikb(entries, show_user=is_admin_user)
+	)
+
+
+@router.callback_query(HistoryFactory.filter())
+async def resend_document(clb: CallbackQuery, callback_data: HistoryFactory, archive: Archive, l10n: FluentLocalization):
+	""" Send the archived document again: by file_id, or upload it from the archive if file_id does not work """
+	user_id = None if is_admin(clb.from_user.id) else clb.from_user.id
+	entry = await archive.get(callback_data.entry_id, clb.bot.id, user_id)
+	if entry is None:
+		await clb.answer(l10n.format_value('history-not-found'), show_alert=True)
+		return
+
+	if entry.file_id is not None:
+		try:
+			await clb.message.answer_document(entry.file_id)
+			await clb.answer()
+			return
+		except TelegramBadRequest:
+			pass
+
+	path = archive.get_path(entry)
+	if path is None:
+		await clb.answer(l10n.format_value('history-file-missing'), show_alert=True)
+		return
+
+	sent_doc = await clb.message.answer_document(FSInputFile(path, filename=entry.filename))
+	await archive.set_file_id(entry.id, sent_doc.document.file_id)
+	await clb.answer()
@@ -0,0 +1,26 @@
+from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import ExceptionTypeFilter
+from aiogram.types import ErrorEvent
+from aiogram_dialog.api.exceptions import UnknownIntent, OutdatedIntent
+
+from includes.fluent import get_fluent_localization
+
+router = Router()
+
+
+@router.error(ExceptionTypeFilter(UnknownIntent, OutdatedIntent))
+async def session_expired(event: ErrorEvent):
+	""" Dialog was removed from storage (idle TTL) or is outdated """
+	l10n = get_fluent_localization()
+	text = l10n.format_value('session-expired')
+
+	if event.update.callback_query:
+		await event.update.callback_query.answer(text, show_alert=True)
+		if event.update.callback_query.message:
+			try:
+				await event.update.callback_query.message.delete_reply_markup()
+			except TelegramBadRequest:  # Too old to edit or already without the keyboard
+				pass
+	elif event.update.message:
+		await event.update.message.answer(text)
@@ -0,0 +1,30 @@
+import hashlib
+
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+
+from includes.search import get_template_index
+
+router = Router()
+
+
+@router.inline_query()
+async def search_templates(query: InlineQuery):
+	""" @bot <query> - search templates, the chosen one is opened by /create_document <name> """
+	entries = get_template_index().search(query.query, limit=50)  # Telegram allows up to 50 results
+	await query.answer(
+		[
+			InlineQueryResultArticle(
+				id=hashlib.md5(entry.name.encode()).hexdigest(),
+				title=entry.name,
+				description=entry.title or None,
+				input_message_content=InputTextMessageContent(
+					message_text=f'/create_document {entry.name}',
+					parse_mode=None,  # Names are not escaped
+				),
+			)
+			for entry in entries
+		],
+		cache_time=60,
+		is_personal=False,
+	)
@@ -1,7 +1,7 @@
 from aiogram import Dispatcher, Router
 
 from dialogs import register_dialogs
-from handlers import commands
+from handlers import admin, commands, errors, inline
 
 
 def register_handlers(dp: Dispatcher):
@@ -15,6 +15,9 @@ def register_handlers(dp: Dispatcher):
 	register_dialogs(dp, dialogs_router)
 
 	dp.include_routers(
+		errors.router,
+		admin.router,
 		commands.router,
+		inline.router,
 		dialogs_router  # needs to be last
 	)
@@ -1,4 +1,4 @@
 from .fluent import get_fluent_localization
-from .jsonschema import get_available_templates, load_schema, validate_data, generate_document
+from .jsonschema import get_available_templates, load_schema, validate_data, collect_errors, generate_document
 from .logging import setup_logging
 from .storage import PickleRedisStorage, get_storage, get_redis
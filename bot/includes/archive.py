@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import ArchiveKeys
+from .cleanup import DAY, touch
+from .search import normalize
+
+ARCHIVE_KEY = 'archive'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+	id INTEGER PRIMARY KEY,
+	bot_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	username TEXT,
+	template_name TEXT NOT NULL,
+	filename TEXT NOT NULL,
+	render_key TEXT NOT NULL,
+	sha256 TEXT,
+	file_id TEXT,
+	created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_user ON documents (bot_id, user_id, created_at);
+CREATE INDEX IF NOT EXISTS documents_render_key ON documents (render_key, filename);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+	template_name, username, date, fields,
+	tokenize='unicode61 remove_diacritics 2'
+);
+'''
+# Orphan blobs younger than it are kept: a document with the same file may be being added
+BLOB_GRACE_PERIOD = 60 * 60
+
+
+@dataclass(slots=True, frozen=True)
+class ArchiveEntry:
+	id: int
+	user_id: int
+	username: str | None
+	template_name: str
+	filename: str
+	sha256: str | None
+	file_id: str | None
+	created_at: float
+
+	@property
+	def date(self) -> str:
+		return datetime.fromtimestamp(self.created_at).strftime('%d.%m.%Y %H:%M')
+
+
+COLUMNS = ', '.join(f'documents.{name}' for name in ArchiveEntry.__slots__)
+
+
+def iter_values(data: Any):
+	""" All primitive values of the document's data """
+	if isinstance(data, dict):
+		for value in data.values():
+			yield from iter_values(value)
+	elif isinstance(data, list):
+		for value in data:
+			yield from iter_values(value)
+	elif data is not None:
+		yield str(data)
+
+
+def copy_hashed(src: BinaryIO, dst: BinaryIO, digest, chunk_size: int = 64 * 1024):
+	while chunk := src.read(chunk_size):
+		digest.update(chunk)
+		dst.write(chunk)
+
+
+def build_match(query: str) -> str:
+	""" Each word of the query is a prefix (all of them must match): `Ивано 2025` -> `"ивано"* "2025"*` """
+	return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in normalize(query).split())
+
+
+class Archive:
+	"""
+	Sent documents of all users.
+	Files are content-addressed: {directory}/blobs/ab/<sha256>.docx, the same file is kept once.
+	SQLite index (documents.sqlite3): a row per sent document with its Telegram file_id
+	and an FTS5 table over template name, username, date and field values.
+	Documents are removed after ARCHIVE_TTL_DAYS (purge is a cleanup job).
+	Blocking work runs in threads, writes never fail the handler (only logged).
+	"""
+
+	def __init__(self, directory: str = ArchiveKeys.DIR):
+		self.enabled = bool(directory)  # '' - documents are not archived
+		self.directory = Path(directory)
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._connection: sqlite3.Connection | None = None
+		self._lock = threading.Lock()  # One connection for all threads
+
+	def _connect(self) -> sqlite3.Connection:
+		if self._connection is None:
+			self.directory.mkdir(parents=True, exist_ok=True)
+			connection = sqlite3.connect(self.directory / 'documents.sqlite3', timeout=10, check_same_thread=False)
+			connection.execute('PRAGMA journal_mode=WAL')  # Workers write, readers are not blocked
+			connection.executescript(SCHEMA)
+			self._connection = connection
+		return self._connection
+
+	def close(self):
+		with self._lock:
+			if self._connection is not None:
+				self._connection.close()
+				self._connection = None
+
+	def get_path(self, entry: ArchiveEntry) -> Path | None:
+		""" The file on disk (None if it was not stored) """
+		if entry.sha256 is None:
+			return None
+		path = self.directory / 'blobs' / entry.sha256[:2] / f'{entry.sha256}{Path(entry.filename).suffix}'
+		return path if path.exists() else None
+
+	def _store_blob(self, file: BinaryIO | Path, suffix: str) -> str:
+		""" Copy the file under its hash, return the hash """
+		blobs_dir = self.directory / 'blobs'
+		blobs_dir.mkdir(parents=True, exist_ok=True)
+		tmp_path = blobs_dir / f'{uuid.uuid4().hex}.tmp'
+		digest = hashlib.sha256()
+		try:
+			with open(tmp_path, 'wb') as dst:
+				if isinstance(file, Path):
+					with open(file, 'rb') as src:
+						copy_hashed(src, dst, digest)
+				else:
+					file.seek(0)
+					copy_hashed(file, dst, digest)
+
+			sha256 = digest.hexdigest()
+			path = blobs_dir / sha256[:2] / f'{sha256}{suffix}'
+			if path.exists():
+				touch(path)  # Not an orphan for purge
+			else:
+				path.parent.mkdir(exist_ok=True)
+				tmp_path.replace(path)
+			return sha256
+		finally:
+			tmp_path.unlink(missing_ok=True)
+
+	def _add(self, bot_id: int, user_id: int, username: str | None, template_name: str, filename: str,
+	         render_key: str, data: dict, file_id: str, file: BinaryIO | Path | None) -> int:
+		sha256 = self._store_blob(file, Path(filename).suffix) if file is not None else None
+		created_at = time.time()
+		date = datetime.fromtimestamp(created_at)
+
+		with self._lock, self._connect() as connection:
+			if sha256 is None:
+				# Sent by file_id without rendering: the file is the one of the same document
+				row = connection.execute(
+					'SELECT sha256 FROM documents WHERE render_key = ? AND filename = ? AND sha256 IS NOT NULL LIMIT 1',
+					(render_key, filename),
+				).fetchone()
+				sha256 = row[0] if row else None
+
+			entry_id = connection.execute(
+				'INSERT INTO documents (bot_id, user_id, username, template_name, filename, render_key, sha256, file_id, created_at)'
+				' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(bot_id, user_id, username, template_name, filename, render_key, sha256, file_id, created_at),
+			).lastrowid
+			connection.execute(
+				'INSERT INTO documents_fts (rowid, template_name, username, date, fields) VALUES (?, ?, ?, ?, ?)',
+				(entry_id, normalize(template_name), username, f'{date:%Y-%m-%d %d.%m.%Y}', normalize(' '.join(iter_values(data)))),
+			)
+		return entry_id
+
+	async def add(self, bot_id: int, user_id: int, username: str | None, template_name: str, filename: str,
+	              render_key: str, data: dict, file_id: str, file: BinaryIO | Path | None = None) -> int | None:
+		"""
+		Remember the sent document.
+		:param file: The rendered file (read from the start, not closed) or its path. None if it was sent by file_id.
+		"""
+		if not self.enabled:
+			return None
+		try:
+			return await asyncio.to_thread(
+				self._add, bot_id, user_id, username, template_name, filename, render_key, data, file_id, file
+			)
+		except Exception as e:  # The user already has the document
+			await self.logger.awarning('archive-add-failed', template_name=template_name, error=str(e))
+			return None
+
+	def _search(self, bot_id: int, user_id: int | None, query: str, limit: int) -> list[ArchiveEntry]:
+		where, params = ['documents.bot_id = ?'], [bot_id]
+		if user_id is not None:
+			where.append('documents.user_id = ?')
+			params.append(user_id)
+
+		match = build_match(query)
+		if match:
+			sql = (
+				f'SELECT {COLUMNS} FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid'
+				f' WHERE documents_fts MATCH ? AND {" AND ".join(where)} ORDER BY documents.created_at DESC LIMIT ?'
+			)
+			params = [match, *params]
+		else:
+			sql = f'SELECT {COLUMNS} FROM documents WHERE {" AND ".join(where)} ORDER BY created_at DESC LIMIT ?'
+
+		with self._lock:
+			rows = self._connect().execute(sql, (*params, limit)).fetchall()
+		return [ArchiveEntry(*row) for row in rows]
+
+	async def search(self, bot_id: int, user_id: int | None, query: str = '',
+	                 limit: int = ArchiveKeys.SEARCH_LIMIT) -> list[ArchiveEntry]:
+		"""
+		The newest documents matching all words of the query (each word is a prefix).
+		:param user_id: Only documents of the user (None - of all users).
+		"""
+		return await asyncio.to_thread(self._search, bot_id, user_id, query, limit)
+
+	def _get(self, entry_id: int, bot_id: int, user_id: int | None) -> ArchiveEntry | None:
+		sql = f'SELECT {COLUMNS} FROM documents WHERE id = ? AND bot_id = ?'
+		params = [entry_id, bot_id]
+		if user_id is not None:
+			sql += ' AND user_id = ?'
+			params.append(user_id)
+
+		with self._lock:
+			row = self._connect().execute(sql, params).fetchone()
+		return ArchiveEntry(*row) if row else None
+
+	async def get(self, entry_id: int, bot_id: int, user_id: int | None) -> ArchiveEntry | None:
+		return await asyncio.to_thread(self._get, entry_id, bot_id, user_id)
+
+	def _set_file_id(self, entry_id: int, file_id: str):
+		with self._lock, self._connect() as connection:
+			connection.execute('UPDATE documents SET file_id = ? WHERE id = ?', (file_id, entry_id))
+
+	async def set_file_id(self, entry_id: int, file_id: str):
+		""" The file was uploaded again (the old file_id stopped working) """
+		await asyncio.to_thread(self._set_file_id, entry_id, file_id)
+
+	def purge(self, max_age: float = ArchiveKeys.TTL_DAYS * DAY) -> int:
+		"""
+		Blocking (a cleanup job): remove documents older than max_age seconds and files no document refers to.
+		:return: Number of removed documents.
+		"""
+		if not self.enabled or max_age <= 0:
+			return 0
+
+		expire_before = time.time() - max_age
+		with self._lock, self._connect() as connection:
+			connection.execute(
+				'DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE created_at < ?)', (expire_before,)
+			)
+			removed = connection.execute('DELETE FROM documents WHERE created_at < ?', (expire_before,)).rowcount
+			used = {sha256 for sha256, in connection.execute('SELECT DISTINCT sha256 FROM documents WHERE sha256 IS NOT NULL')}
+
+		blob_expire_before = time.time() - BLOB_GRACE_PERIOD
+		for path in (self.directory / 'blobs').glob('*/*'):
+			try:
+				if path.stem not in used and path.stat().st_mtime < blob_expire_before:
+					path.unlink()
+			except FileNotFoundError:
+				pass
+		return removed
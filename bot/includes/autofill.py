@@ -0,0 +1,146 @@
+import asyncio
+import json
+from typing import Any, TYPE_CHECKING
+
+import structlog
+from redis.asyncio import Redis
+from structlog.typing import FilteringBoundLogger
+
+from env import AutofillKeys
+from .batch import get_schema_paths
+from .tenants import tenant_key
+
+if TYPE_CHECKING:
+	from .templates.contexts import BaseContext, PrimitiveContext
+
+AUTOFILL_KEY = 'autofill'
+
+# Field path -> the user's values, the most recent first
+Suggestions = dict[str, list[Any]]
+
+
+def get_field_key(context: 'BaseContext') -> str:
+	""" Path of the field in the schema: items of all arrays are the same field (`members.*.name`) """
+	return '.'.join(map(str, context.get_path()))
+
+
+def get_field_keys(schema: dict) -> list[str]:
+	return list(dict.fromkeys(get_schema_paths(schema, array_index='*')))
+
+
+def iter_filled(root: 'BaseContext'):
+	""" (field key, value) of all filled primitive fields """
+	from .templates.contexts import PrimitiveContext
+
+	for context in root.iter_nodes():
+		if isinstance(context, PrimitiveContext) and context.get_value() is not None:
+			yield get_field_key(context), context.get_value()
+
+
+class Autofill:
+	"""
+	Values the user entered in generated documents, to suggest them again.
+	One hash per user: {prefix}:{user_id} - field path -> JSON list of the last `max_values` values
+	(LRU: a used value moves to the front). Paths are shared by all templates,
+	so a name entered once is suggested in every template with the same field.
+	Read once when a template is chosen, written once per generated document.
+	"""
+
+	def __init__(self, redis: Redis, read_redis: Redis = None, prefix: str = 'autofill',
+	             max_values: int = AutofillKeys.MAX_VALUES, ttl_days: int = AutofillKeys.TTL_DAYS):
+		self.redis = redis
+		self.read_redis = read_redis or redis  # A lagging replica only misses the last document
+		self.prefix = prefix
+		self.max_values = max_values
+		self.ttl = ttl_days * 24 * 60 * 60
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._tasks: set[asyncio.Task] = set()
+
+	def _key(self, user_id: int) -> str:
+		return f'{tenant_key(self.prefix)}:{user_id}'
+
+	async def load(self, user_id: int, schema: dict) -> Suggestions:
+		""" The user's values for the template's fields """
+		field_keys = get_field_keys(schema)
+		if not field_keys or self.max_values <= 0:
+			return {}
+
+		try:
+			raw_values = await self.read_redis.hmget(self._key(user_id), field_keys)
+		except Exception as e:  # Suggestions are optional
+			await self.logger.awarning('autofill-load-failed', error=str(e))
+			return {}
+
+		return {
+			field_key: json.loads(raw)
+			for field_key, raw in zip(field_keys, raw_values)
+			if raw is not None
+		}
+
+	def remember(self, user_id: int, root: 'BaseContext', suggestions: Suggestions) -> Suggestions:
+		"""
+		Put the document's values to the front of the lists (written in background).
+		:param suggestions: Lists loaded for this draft, so no read is needed.
+		:return: Updated lists.
+		"""
+		updated: Suggestions = {}
+		for field_key, value in iter_filled(root):
+			values = updated.setdefault(field_key, list(suggestions.get(field_key, [])))
+			if value in values:
+				values.remove(value)
+			values.insert(0, value)
+
+		changed = {
+			field_key: values[:self.max_values]
+			for field_key, values in updated.items()
+			if values[:self.max_values] != suggestions.get(field_key)
+		}
+		if not changed or self.max_values <= 0:
+			return suggestions
+
+		key = self._key(user_id)
+		pipe = self.redis.pipeline(transaction=False)
+		pipe.hset(key, mapping={
+			field_key: json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+			for field_key, values in changed.items()
+		})
+		pipe.expire(key, self.ttl)
+		self._send(pipe)
+		return suggestions | changed
+
+	def _send(self, pipe):
+		task = asyncio.create_task(self._execute(pipe))
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	async def _execute(self, pipe):
+		try:
+			await pipe.execute()
+		except Exception as e:
+			await self.logger.awarning('autofill-write-failed', error=str(e))
+
+
+def prefill(root: 'BaseContext', suggestions: Suggestions) -> int:
+	"""
+	Set the last values to empty fields outside of arrays (they can be changed as usual).
+	:return: Number of filled fields.
+	"""
+	from .templates.contexts import PrimitiveContext
+
+	filled = 0
+	for context in root.iter_nodes():
+		if not isinstance(context, PrimitiveContext) or context.get_value() is not None:
+			continue
+		values = suggestions.get(get_field_key(context))
+		if values and context.accepts(values[0]):
+			context.set_value(values[0])
+			filled += 1
+	return filled
+
+
+def get_suggestions(context: 'PrimitiveContext', suggestions: Suggestions) -> list[Any]:
+	""" Values to offer for the field (valid for it and not the current one) """
+	return [
+		value for value in suggestions.get(get_field_key(context), [])
+		if value != context.get_value() and context.accepts(value)
+	]
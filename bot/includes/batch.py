@@ -0,0 +1,252 @@
+"""
+Batch generation: one document per row of a CSV/XLSX table, all packed into a ZIP.
+Columns are paths in the template's JSON schema: `name`, `person.position`, `members.0.name`.
+XLSX needs openpyxl (optional).
+"""
+import asyncio
+import csv
+import io
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Awaitable, Callable, Iterator
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import BatchKeys
+from .jsonschema import get_schema_validator, generate_document
+from .tenants import get_templates_dir
+
+ProgressCallback = Callable[[int, int], Awaitable[Any]]
+# (row number or `row: column`, error with l10n key as a message) - shown with format_error
+BatchError = tuple[str, Exception]
+
+
+def read_table(filename: str, content: bytes) -> tuple[list[str], list[list[str]]]:
+	""" Read headers and rows from CSV or XLSX """
+	if filename.lower().endswith('.xlsx'):
+		try:
+			import openpyxl
+		except ImportError:
+			raise ValueError('batch-xlsx-not-supported')
+
+		workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+		rows = [
+			['' if cell is None else str(cell) for cell in row]
+			for row in workbook.active.iter_rows(values_only=True)
+		]
+		workbook.close()
+	elif filename.lower().endswith('.csv'):
+		text = content.decode('utf-8-sig')
+		try:
+			dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+		except csv.Error:
+			dialect = csv.excel
+		rows = list(csv.reader(io.StringIO(text), dialect))
+	else:
+		raise ValueError('batch-unknown-format')
+
+	rows = [row for row in rows if any(cell.strip() for cell in row)]
+	if len(rows) < 2:
+		raise ValueError('batch-empty-table')
+	if len(rows) - 1 > BatchKeys.MAX_ROWS:
+		raise ValueError('batch-too-many-rows')
+
+	headers = [header.strip() for header in rows[0]]
+	return headers, rows[1:]
+
+
+def get_schema_paths(schema: dict, prefix: str = '', array_index: str = '0') -> Iterator[str]:
+	""" Column names for all primitive fields (arrays are shown with index 0) """
+	match schema.get('type'):
+		case 'object':
+			for key, prop_schema in schema.get('properties', {}).items():
+				yield from get_schema_paths(prop_schema, f'{prefix}{key}.', array_index)
+		case 'array':
+			yield from get_schema_paths(schema.get('items', {}), f'{prefix}{array_index}.', array_index)
+		case _:
+			yield prefix.removesuffix('.')
+
+
+def get_subschema(schema: dict, path: list[str]) -> dict | None:
+	for part in path:
+		match schema.get('type'):
+			case 'object':
+				schema = schema.get('properties', {}).get(part)
+			case 'array' if part.isdigit():
+				schema = schema.get('items')
+			case _:
+				return None
+		if schema is None:
+			return None
+	return schema
+
+
+def row_to_data(schema: dict, headers: list[str], row: list[str]) -> tuple[dict, list[tuple[str, ValueError]]]:
+	"""
+	Build nested data from a row, values are converted by the same formatters as for the manual input.
+	:return: Data and errors by column.
+	"""
+	from includes.templates import get_choices, get_formatter, get_validator, parse_choice
+	from includes.templates.validators import SchemaValidationError
+
+	data: dict = {}
+	errors: list[tuple[str, ValueError]] = []
+
+	for header, value in zip(headers, row):
+		value = value.strip()
+		if not header or not value:
+			continue
+
+		path = header.split('.')
+		subschema = get_subschema(schema, path)
+		if subschema is None:
+			errors.append((header, ValueError('batch-unknown-column')))
+			continue
+
+		try:
+			choices = get_choices(subschema)
+			if choices is not None and any(label is not None for label, _ in choices):
+				value = parse_choice(choices, value)
+			else:
+				value = get_formatter(subschema.get('type')).format(value)
+			if not get_validator(subschema.get('format')).validate(value):
+				raise ValueError('invalid-value')
+		except ValueError as e:
+			errors.append((header, e))
+			continue
+
+		# Create intermediate objects and arrays
+		node: dict | list = data
+		for part, next_part in zip(path, path[1:]):
+			container = [] if next_part.isdigit() else {}
+			if isinstance(node, list):
+				i = int(part)
+				node.extend({} for _ in range(i + 1 - len(node)))
+				if not node[i]:
+					node[i] = container
+				node = node[i]
+			else:
+				node = node.setdefault(part, container)
+
+		if isinstance(node, list):
+			i = int(path[-1])
+			node.extend(None for _ in range(i + 1 - len(node)))
+			node[i] = value
+		else:
+			node[path[-1]] = value
+
+	if not errors:
+		errors.extend(
+			('.'.join(map(str, error.absolute_path)) or '-', SchemaValidationError(error.message))
+			for error in get_schema_validator(schema).iter_errors(data)
+		)
+
+	return data, errors
+
+
+def validate_rows(schema: dict, headers: list[str], rows: list[list[str]]) -> tuple[list[tuple[int, dict]], list[BatchError]]:
+	""" Data of valid rows by row number and errors of the others """
+	jobs: list[tuple[int, dict]] = []
+	errors: list[BatchError] = []
+	for i, row in enumerate(rows, 2):  # Row 1 is headers
+		data, row_errors = row_to_data(schema, headers, row)
+		if row_errors:
+			errors.extend((f'{i}: {column}', error) for column, error in row_errors)
+		else:
+			jobs.append((i, data))
+	return jobs, errors
+
+
+def render_to_bytes(template_name: str, data: dict, templates_dir: Path) -> bytes:
+	""" Runs in a worker process """
+	buffer = io.BytesIO()
+	generate_document(template_name, data, templates_dir).save(buffer)
+	return buffer.getvalue()
+
+
+_render_pool: ProcessPoolExecutor | None = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+	""" Started on the first batch """
+	global _render_pool
+	if _render_pool is None:
+		_render_pool = ProcessPoolExecutor(max_workers=BatchKeys.WORKERS, mp_context=get_context('spawn'))
+	return _render_pool
+
+
+def shutdown_render_pool():
+	""" Dispatcher's shutdown hook """
+	global _render_pool
+	if _render_pool is not None:
+		_render_pool.shutdown(cancel_futures=True)
+		_render_pool = None
+
+
+async def generate_batch(template_name: str,
+                         schema: dict,
+                         headers: list[str],
+                         rows: list[list[str]],
+                         on_progress: ProgressCallback = None) -> tuple[Path | None, list[BatchError]]:
+	"""
+	Validate rows and render valid ones in parallel, streaming results into a ZIP on disk.
+	At most BatchKeys.WORKERS * 2 documents are in memory at once.
+	:return: Path to the ZIP (None if nothing was rendered; the caller deletes it) and errors by row.
+	"""
+	loop = asyncio.get_running_loop()
+	pool = get_render_pool()
+	templates_dir = get_templates_dir()  # The current bot is not known in worker processes
+	logger: FilteringBoundLogger = structlog.get_logger()
+
+	jobs, errors = await asyncio.to_thread(validate_rows, schema, headers, rows)
+
+	if not jobs:
+		return None, errors
+
+	with NamedTemporaryFile(suffix='.zip', delete=False) as file:
+		archive_path = Path(file.name)
+
+	in_flight = asyncio.Semaphore(BatchKeys.WORKERS * 2)
+	done = 0
+	last_progress = 0.0
+
+	async def render(row_number: int, data: dict) -> tuple[int, bytes | Exception]:
+		async with in_flight:
+			try:
+				return row_number, await loop.run_in_executor(pool, render_to_bytes, template_name, data, templates_dir)
+			except Exception as e:
+				return row_number, e
+
+	tasks = [asyncio.create_task(render(i, data)) for i, data in jobs]
+	written = 0
+	try:
+		with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+			for task in asyncio.as_completed(tasks):
+				row_number, result = await task
+				if isinstance(result, Exception):
+					await logger.awarning('batch-render-failed', template_name=template_name, row=row_number, error=str(result))
+					errors.append((str(row_number), ValueError('batch-render-failed')))
+				else:
+					# DEFLATE of a document takes milliseconds
+					await asyncio.to_thread(archive.writestr, f'{template_name}_{row_number:04}.docx', result)
+					written += 1
+
+				done += 1
+				if on_progress and (time.monotonic() - last_progress > BatchKeys.PROGRESS_INTERVAL or done == len(jobs)):
+					last_progress = time.monotonic()
+					await on_progress(done, len(jobs))
+	except BaseException:  # Progress message failed, cancelled on shutdown...
+		for task in tasks:
+			task.cancel()
+		archive_path.unlink(missing_ok=True)
+		raise
+
+	if not written:  # Every row failed: no empty archive
+		archive_path.unlink(missing_ok=True)
+		return None, errors
+	return archive_path, errors
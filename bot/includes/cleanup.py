@@ -0,0 +1,86 @@
+"""
+Files kept on disk for reuse (rendered documents, images, archive) are removed after a TTL.
+Reused files are touched, so the TTL counts from the last use.
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import ProjectKeys
+
+DAY = 24 * 60 * 60
+
+# Returns the number of removed files (or rows)
+CleanupJob = Callable[[], int]
+
+
+def touch(path: Path):
+	""" Mark the file as used now (it may be removed meanwhile - it will be created again) """
+	try:
+		os.utime(path)
+	except FileNotFoundError:
+		pass
+
+
+def remove_old_files(directory: Path, max_age: float, pattern: str = '*') -> int:
+	""" Remove files not modified for max_age seconds (recursively, directories are kept) """
+	if max_age <= 0 or not directory.is_dir():
+		return 0
+
+	expire_before = time.time() - max_age
+	removed = 0
+	for path in directory.rglob(pattern):
+		try:
+			if path.is_file() and path.stat().st_mtime < expire_before:
+				path.unlink()
+				removed += 1
+		except FileNotFoundError:  # Removed by another process
+			pass
+	return removed
+
+
+class Cleanup:
+	"""
+	Background task: runs the registered jobs in a thread every interval.
+	Runs in the main process only (the directories are shared by workers).
+	"""
+
+	def __init__(self, interval: int = ProjectKeys.CLEANUP_INTERVAL):
+		self.interval = interval
+		self.jobs: dict[str, CleanupJob] = {}
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._task: asyncio.Task | None = None
+
+	def register(self, name: str, job: CleanupJob):
+		self.jobs[name] = job
+
+	async def cleanup(self) -> dict[str, int]:
+		removed = {}
+		for name, job in self.jobs.items():
+			try:
+				removed[name] = await asyncio.to_thread(job)
+			except Exception as e:
+				await self.logger.aerror('cleanup-failed', job=name, error=str(e))
+		return removed
+
+	async def run(self):
+		while True:
+			removed = await self.cleanup()
+			if any(removed.values()):
+				await self.logger.ainfo('cleanup-done', removed=removed)
+			await asyncio.sleep(self.interval)
+
+	def start(self):
+		if self._task is None and self.jobs:
+			self._task = asyncio.create_task(self.run())
+
+	async def stop(self):
+		if self._task is not None:
+			self._task.cancel()
+			await asyncio.gather(self._task, return_exceptions=True)
+			self._task = None
@@ -0,0 +1,237 @@
+"""
+Compression of FSM data blobs.
+Blob format: first byte is a codec header, plain pickle (protocol 2+) always starts with 0x80,
+so old uncompressed values are read as is.
+zstd and lz4 are optional: pip install zstandard / lz4
+"""
+import pickle
+import time
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import structlog
+
+from env import CompressionKeys
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+try:
+	import lz4.frame
+except ImportError:
+	lz4 = None
+
+PICKLE_HEADER = b'\x80'
+ZLIB_HEADER = b'Z'
+ZSTD_HEADER = b'S'
+LZ4_HEADER = b'L'
+
+
+@dataclass(slots=True)
+class CompressionStats:
+	compressed: int = 0
+	raw_bytes: int = 0
+	stored_bytes: int = 0
+	compress_time: float = 0
+	decompress_time: float = 0
+
+	@property
+	def ratio(self) -> float:
+		return round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else 1.0
+
+	def merge(self, other: 'CompressionStats'):
+		self.compressed += other.compressed
+		self.raw_bytes += other.raw_bytes
+		self.stored_bytes += other.stored_bytes
+		self.compress_time += other.compress_time
+		self.decompress_time += other.decompress_time
+
+	def as_dict(self) -> dict:
+		return {
+			'compressed': self.compressed,
+			'raw_bytes': self.raw_bytes,
+			'stored_bytes': self.stored_bytes,
+			'ratio': self.ratio,
+			'compress_time': round(self.compress_time, 3),
+			'decompress_time': round(self.decompress_time, 3),
+		}
+
+
+stats = CompressionStats()  # Of this process since the last flush_stats
+
+# Redis hash with the counters of all processes (each adds its own by flush_stats)
+STATS_REDIS_KEY = 'compression:stats'
+STATS_FLUSH_INTERVAL = 60  # seconds
+
+
+async def flush_stats(redis) -> None:
+	""" Add the counters of this process to the shared ones and reset them (kept if it fails) """
+	global stats
+	delta, stats = stats, CompressionStats()
+	if not delta.compressed and not delta.decompress_time:
+		return
+
+	try:
+		async with redis.pipeline(transaction=False) as pipe:
+			pipe.hincrby(STATS_REDIS_KEY, 'compressed', delta.compressed)
+			pipe.hincrby(STATS_REDIS_KEY, 'raw_bytes', delta.raw_bytes)
+			pipe.hincrby(STATS_REDIS_KEY, 'stored_bytes', delta.stored_bytes)
+			pipe.hincrbyfloat(STATS_REDIS_KEY, 'compress_time', delta.compress_time)
+			pipe.hincrbyfloat(STATS_REDIS_KEY, 'decompress_time', delta.decompress_time)
+			await pipe.execute()
+	except BaseException:  # Added with the next flush (counted meanwhile are in the new stats)
+		stats.merge(delta)
+		raise
+
+
+async def get_stats(redis) -> CompressionStats:
+	""" Counters of all processes (flushed ones) """
+	values = {key.decode(): value for key, value in (await redis.hgetall(STATS_REDIS_KEY)).items()}
+	return CompressionStats(
+		compressed=int(values.get('compressed', 0)),
+		raw_bytes=int(values.get('raw_bytes', 0)),
+		stored_bytes=int(values.get('stored_bytes', 0)),
+		compress_time=float(values.get('compress_time', 0)),
+		decompress_time=float(values.get('decompress_time', 0)),
+	)
+
+
+@lru_cache
+def warn_fallback(codec: str):
+	""" Logged once per process: the codec's package is not installed """
+	structlog.get_logger().warning('compression-codec-not-installed', codec=codec, fallback='zlib')
+
+
+def is_compressed(raw: bytes) -> bool:
+	return raw[:1] != PICKLE_HEADER
+
+
+@lru_cache
+def get_zstd_dicts() -> dict[str, 'zstandard.ZstdCompressionDict']:
+	""" Pretrained dictionaries: {template_name}.zdict in DICT_DIR """
+	if zstandard is None or not CompressionKeys.DICT_DIR:
+		return {}
+	return {
+		path.stem: zstandard.ZstdCompressionDict(path.read_bytes())
+		for path in Path(CompressionKeys.DICT_DIR).glob('*.zdict')
+	}
+
+
+@lru_cache
+def _get_zstd_dicts_by_id() -> dict[int, 'zstandard.ZstdCompressionDict']:
+	return {d.dict_id(): d for d in get_zstd_dicts().values()}
+
+
+@lru_cache(maxsize=128)
+def _zstd_compressor(template_name: str | None, level: int) -> 'zstandard.ZstdCompressor':
+	return zstandard.ZstdCompressor(level=level, dict_data=get_zstd_dicts().get(template_name))
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+	dict_id = zstandard.get_frame_parameters(data).dict_id
+	dict_data = _get_zstd_dicts_by_id().get(dict_id) if dict_id else None
+	if dict_id and dict_data is None:
+		raise ValueError(f'zstd dictionary {dict_id} is not found')
+	return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+
+
+def compress(raw: bytes, template_name: str = None, *, codec: str = None, level: int = None) -> bytes:
+	""" Compress the pickle if it is large enough and a codec is configured """
+	codec = codec or CompressionKeys.CODEC
+	if codec == 'none' or len(raw) < CompressionKeys.THRESHOLD:
+		return raw
+
+	start = time.perf_counter()
+	if codec == 'zstd' and zstandard is not None:
+		data = ZSTD_HEADER + _zstd_compressor(template_name, CompressionKeys.LEVEL if level is None else level).compress(raw)
+	elif codec == 'lz4' and lz4 is not None:
+		data = LZ4_HEADER + lz4.frame.compress(raw, compression_level=0 if level is None else level)
+	else:  # zlib is always available
+		if codec != 'zlib':
+			warn_fallback(codec)
+		data = ZLIB_HEADER + zlib.compress(raw, 6 if level is None else level)
+
+	stats.compressed += 1
+	stats.raw_bytes += len(raw)
+	stats.stored_bytes += len(data)
+	stats.compress_time += time.perf_counter() - start
+	return data
+
+
+def decompress(data: bytes) -> bytes:
+	header = data[:1]
+	if header == PICKLE_HEADER:
+		return data
+
+	start = time.perf_counter()
+	if header == ZLIB_HEADER:
+		raw = zlib.decompress(data[1:])
+	elif header == ZSTD_HEADER:
+		if zstandard is None:
+			raise RuntimeError('zstandard is not installed, but the data is compressed with zstd')
+		raw = _zstd_decompress(data[1:])
+	elif header == LZ4_HEADER:
+		if lz4 is None:
+			raise RuntimeError('lz4 is not installed, but the data is compressed with lz4')
+		raw = lz4.frame.decompress(data[1:])
+	else:
+		raise ValueError(f'Unknown compression header: {header!r}')
+
+	stats.decompress_time += time.perf_counter() - start
+	return raw
+
+
+def train_dictionary(samples: list[bytes], size: int = 16 * 1024) -> bytes:
+	""" Train zstd dictionary on raw (uncompressed) pickles of one template """
+	if zstandard is None:
+		raise RuntimeError('zstandard is not installed')
+	return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+async def train_dictionaries(storage, min_samples: int = 20) -> list[str]:
+	"""
+	Train and save dictionaries per template from current sessions.
+	Restart the bot to use them; old entries stay readable only while their dictionaries are kept.
+	:return: Names of templates with new dictionaries.
+	"""
+	from .sessions import get_data_keys_pattern
+	from .storage import get_template_name
+
+	samples: dict[str, list[bytes]] = {}
+	async for redis_key in storage.redis.scan_iter(match=get_data_keys_pattern(storage), count=500):
+		raw = await storage.redis.get(redis_key)
+		if not raw:
+			continue
+		raw = decompress(raw)
+		template_name = get_template_name(pickle.loads(raw))
+		if template_name:
+			samples.setdefault(template_name, []).append(raw)
+
+	dict_dir = Path(CompressionKeys.DICT_DIR)
+	dict_dir.mkdir(parents=True, exist_ok=True)
+
+	trained = []
+	for template_name, template_samples in samples.items():
+		if len(template_samples) < min_samples:
+			continue
+		path = dict_dir / f'{template_name}.zdict'
+		if path.exists():  # Never overwrite: stored values depend on it
+			continue
+		path.write_bytes(train_dictionary(template_samples))
+		trained.append(template_name)
+
+	await structlog.get_logger().ainfo('zstd-dictionaries-trained', templates=trained)
+	return trained
+
+
+if __name__ == '__main__':
+	# Usage (from the bot directory): python -m includes.compression
+	import asyncio
+
+	from includes.storage import PickleRedisStorage, get_storage
+
+	asyncio.run(train_dictionaries(get_storage(cls=PickleRedisStorage, with_destiny=True)))
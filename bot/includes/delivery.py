@@ -0,0 +1,83 @@
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import AsyncGenerator, TYPE_CHECKING
+
+from aiogram.types import InputFile
+from redis.asyncio import Redis
+
+from env import ProjectKeys
+from .jsonschema import get_template_path
+from .tenants import tenant_key
+from .tracing import span
+
+if TYPE_CHECKING:
+	from aiogram import Bot
+	from docxtpl import DocxTemplate
+
+
+class SpooledInputFile(InputFile):
+	""" Uploads straight from the rendered file (in memory while small, on disk above the threshold) """
+
+	def __init__(self, file: SpooledTemporaryFile, filename: str, chunk_size: int = 64 * 1024):
+		super().__init__(filename=filename, chunk_size=chunk_size)
+		self.file = file
+
+	async def read(self, bot: 'Bot') -> AsyncGenerator[bytes, None]:
+		self.file.seek(0)
+		while chunk := self.file.read(self.chunk_size):
+			yield chunk
+
+
+def save_document(doc: 'DocxTemplate') -> SpooledTemporaryFile:
+	""" Save without copying the whole file into bytes. Close it after sending """
+	file = SpooledTemporaryFile(max_size=ProjectKeys.SPOOL_MAX_SIZE)
+	with span('save') as current_span:
+		doc.save(file)
+		current_span.set_attribute('bytes', file.tell())
+	return file
+
+
+def store_document(template_name: str, data: dict, path: Path):
+	""" Blocking. Render into a file on disk (written atomically: concurrent readers see it whole or not at all) """
+	from .jsonschema import generate_document
+
+	tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+	try:
+		doc = generate_document(template_name, data)
+		with span('save'):
+			doc.save(tmp_path)
+		tmp_path.replace(path)
+	finally:
+		tmp_path.unlink(missing_ok=True)
+
+
+def get_render_key(template_name: str, data: dict) -> str:
+	"""
+	The same template file with the same data gives the same document.
+	(Hash of the .docx itself differs every time: zip entries contain the current time)
+	"""
+	template_path = get_template_path(template_name, '.docx')
+	digest = hashlib.sha256()
+	digest.update(f'{template_path}:{template_path.stat().st_mtime_ns}:'.encode())
+	digest.update(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode())
+	return digest.hexdigest()
+
+
+class FileIdCache:
+	""" Telegram file_id of already uploaded documents by render key (file_id is valid only for its bot) """
+
+	def __init__(self, redis: Redis, read_redis: Redis = None, prefix: str = 'file_id', ttl: int = ProjectKeys.FILE_ID_TTL):
+		self.redis = redis
+		self.read_redis = read_redis or redis  # A miss on a lagging replica only costs a re-upload
+		self.prefix = tenant_key(prefix)
+		self.ttl = ttl or None
+
+	async def get(self, render_key: str) -> str | None:
+		file_id = await self.read_redis.get(f'{self.prefix}:{render_key}')
+		return file_id.decode() if file_id else None
+
+	async def set(self, render_key: str, file_id: str):
+		await self.redis.set(f'{self.prefix}:{render_key}', file_id, ex=self.ttl)
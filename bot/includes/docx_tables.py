@@ -0,0 +1,199 @@
+import copy
+import re
+from collections.abc import Sequence
+from typing import Any
+
+from docxtpl import DocxTemplate
+from jinja2 import Environment, meta, nodes
+from lxml import etree
+
+from env import ProjectKeys
+
+# {%tr for VAR in EXPR %} + one row + {%tr endfor %} after DocxTemplate.patch_xml
+TABLE_LOOP_RE = re.compile(
+	r'{%-?\s*for\s+(\w+)\s+in\s+((?:(?!%}).)+?)\s*-?%}'
+	r'(<w:tr[ >](?:(?!<w:tr[ >]).)*?</w:tr>)'
+	r'{%-?\s*endfor\s*-?%}',
+	re.DOTALL,
+)
+EXPRESSION_RE = re.compile(r'{{(?:(?!}}).)*}}', re.DOTALL)
+PLACEHOLDER_RE = re.compile(r'{{(\d+)}}')
+MARKER_RE = re.compile(r'fast-table:(\d+)')
+BODY_MARKER = 'fast-table:body'
+LISTING_CHARS_RE = re.compile('[\t\n\a\f]')
+MARKUP_RE = re.compile('[&<>]')
+ITEMS_VAR = '_fast_table_items'
+TEXT_SEPARATOR = '\0'
+ROW_SEPARATOR = '\1'
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W_T = f'{{{W_NS}}}t'
+
+
+class FallbackError(Exception):
+	""" The row can't be expanded without Jinja (rich text, images, ...) - render the usual way """
+
+
+class FastTableTemplate(DocxTemplate):
+	"""
+	DocxTemplate expanding large `{%tr for %}` loops with lxml.
+
+	docxtpl renders the whole body into one XML string (Jinja output of every row),
+	then parses it again. Here a loop over `min_rows` items and more with a single plain row
+	(only {{ }} inside text, no tags) is left to Jinja as one escaped row with a marker.
+	After the body is parsed the row element is deep-copied for each item and only
+	the texts with expressions are rendered, by one Jinja loop without any XML.
+	The row is rendered with the context only, so it must not use names set in the template
+	({% set %}, macros, outer loops).
+	Anything else (nested tags, rich text, images or `&<>` in values) is rendered by docxtpl as usual.
+	"""
+
+	def __init__(self, template_file, min_rows: int = ProjectKeys.FAST_TABLE_MIN_ROWS):
+		super().__init__(template_file)
+		self.min_rows = min_rows
+		self._fast_enabled = min_rows > 0
+		self._fast_tables: list[tuple[str, Sequence, list[str]]] = []
+		self._fast_context: dict = {}
+		self._fast_env: Environment | None = None
+		self._fast_xml = ''
+		self._template_names: set[str] | None = None  # Assigned anywhere in the template (on demand)
+
+	def render(self, context: dict[str, Any], jinja_env: Environment | None = None, autoescape: bool = False) -> None:
+		# Escaped values would be escaped again by lxml
+		self._fast_enabled = self.min_rows > 0 and not autoescape and not (jinja_env and jinja_env.autoescape)
+		try:
+			super().render(context, jinja_env, autoescape)
+		except FallbackError:
+			# Raised before the body is replaced, the document is untouched
+			self._fast_enabled = False
+			self._fast_tables = []
+			super().render(context, jinja_env, autoescape)
+		finally:
+			self._fast_tables = []
+			self._fast_context = {}
+			self._fast_env = None
+			self._fast_xml = ''
+			self._template_names = None
+
+	def build_xml(self, context, jinja_env=None):
+		xml = self.patch_xml(self.get_xml())
+		if self._fast_enabled:
+			self._fast_context = context
+			self._fast_env = jinja_env or Environment()
+			self._fast_xml = xml
+			xml = TABLE_LOOP_RE.sub(self._extract_loop, xml)
+		return self.render_xml_part(xml, self.docx._part, context, jinja_env)
+
+	def _extract_loop(self, match: re.Match) -> str:
+		var, items_expr, row = match.groups()
+		if re.search(r'{%|{#|{_|_}', row) or re.search(r'\bif\b|\brecursive\b', items_expr):
+			return match.group(0)
+		if not self._in_context(var, items_expr, EXPRESSION_RE.findall(row)):
+			return match.group(0)
+
+		try:
+			items = self._fast_env.compile_expression(items_expr, undefined_to_none=False)(**self._fast_context)
+		except Exception:
+			return match.group(0)  # Jinja will raise it properly
+		if not isinstance(items, Sequence) or isinstance(items, str) or len(items) < self.min_rows:
+			return match.group(0)
+
+		expressions = []
+
+		def to_placeholder(m: re.Match) -> str:
+			expressions.append(m.group(0))
+			return f'{{_{{{len(expressions) - 1}}}_}}'  # {{N}} after rendering
+
+		row = EXPRESSION_RE.sub(to_placeholder, row)
+		self._fast_tables.append((var, items, expressions))
+		# The row stays in the table, so fix_tables sees its cells
+		return re.sub(r'^(<w:tr[^>]*>)', rf'\1<!--fast-table:{len(self._fast_tables) - 1}-->', row)
+
+	def _in_context(self, var: str, items_expr: str, expressions: list[str]) -> bool:
+		""" Do the loop and the row use only names of the context (not set by the template) """
+		try:
+			used = meta.find_undeclared_variables(self._fast_env.parse(
+				f'{{% for {var} in {items_expr} %}}{"".join(expressions)}{{% endfor %}}'
+			))
+			if self._template_names is None:
+				ast = self._fast_env.parse(self._fast_xml)
+				self._template_names = {
+					*(node.name for node in ast.find_all(nodes.Name) if node.ctx in ('store', 'param')),
+					*(node.name for node in ast.find_all(nodes.Macro)),
+				}
+		except Exception:
+			return False  # Jinja will raise it properly
+
+		known = self._fast_context.keys() | self._fast_env.globals.keys()
+		return used <= known and not used & self._template_names
+
+	def fix_tables(self, xml):
+		tree = super().fix_tables(xml)
+		if not self._fast_tables:
+			return tree
+
+		markers = [
+			comment for comment in tree.iter(etree.Comment)
+			if comment.text and MARKER_RE.fullmatch(comment.text)
+		]
+		for comment in markers:
+			var, items, expressions = self._fast_tables[int(MARKER_RE.fullmatch(comment.text).group(1))]
+			row = comment.getparent()
+			row.remove(comment)
+			self._expand(row, var, items, expressions)
+		return tree
+
+	def map_tree(self, tree):
+		if not self._fast_tables:
+			return super().map_tree(tree)
+
+		# lxml moves a subtree into another document node by node in quadratic time,
+		# so the document element is parsed again with the new body instead of replace()
+		from docx.oxml.parser import parse_xml
+
+		root = self.docx._element
+		root.replace(root.body, etree.Comment(BODY_MARKER))
+		head, tail = etree.tostring(root, encoding='unicode').split(f'<!--{BODY_MARKER}-->')
+		root = parse_xml(head + etree.tostring(tree, encoding='unicode') + tail)
+
+		self.docx.part._element = root
+		self.docx._element = root
+		self.docx._Document__body = None
+
+	def _expand(self, row: etree._Element, var: str, items: Sequence, expressions: list[str]):
+		# Texts with expressions by position in the row
+		elements = list(row.iter())
+		positions = []
+		sources = []
+		found = 0
+		for i, element in enumerate(elements):
+			if element.tag != W_T or not element.text or '{{' not in element.text:
+				continue
+			source, count = PLACEHOLDER_RE.subn(lambda m: expressions[int(m.group(1))], element.text)
+			positions.append(i)
+			sources.append(source)
+			found += count
+		if found != len(expressions):
+			raise FallbackError('expression outside of text')
+
+		# One Jinja loop renders only the texts (\0 and \1 can't be in XML, so they separate them)
+		template = self._fast_env.from_string(
+			f'{{% for {var} in {ITEMS_VAR} %}}' + TEXT_SEPARATOR.join(sources) + f'{ROW_SEPARATOR}{{% endfor %}}'
+		)
+		rendered = template.render(dict(self._fast_context, **{ITEMS_VAR: items}))
+		if MARKUP_RE.search(rendered):
+			# Rich text, or `&<>` that docxtpl puts into XML as they are - the result must be the same
+			raise FallbackError('xml in value')
+
+		for texts in rendered.split(ROW_SEPARATOR)[:-1]:
+			clone = copy.deepcopy(row)
+			clone_elements = list(clone.iter())
+			for i, text in zip(positions, texts.split(TEXT_SEPARATOR)):
+				clone_elements[i].text = text
+
+			if LISTING_CHARS_RE.search(texts):
+				# \n, \t, \a, \f are turned into tags the same way as in the usual path
+				clone = etree.fromstring(self.resolve_listing(etree.tostring(clone, encoding='unicode')))
+			row.addprevious(clone)
+
+		row.getparent().remove(row)
@@ -1,11 +1,14 @@
+from functools import lru_cache
+
 from fluent.runtime import FluentLocalization, FluentResourceLoader
 
 from env import ProjectKeys
 
 
+@lru_cache
 def get_fluent_localization() -> FluentLocalization:
 	"""
-	Load locales
+	Load locales (once per process)
 	:return: FluentLocalization object
 	"""
 
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import GenerationKeys
+
+GENERATION_QUEUE_KEY = 'generation_queue'
+
+OnQueued = Callable[[int], Awaitable]
+
+
+class QueueFullError(Exception):
+	def __str__(self):
+		return 'generation-queue-full'
+
+
+class AlreadyQueuedError(Exception):
+	def __str__(self):
+		return 'generation-already-queued'
+
+
+@dataclass(slots=True)
+class GenerationMetrics:
+	done: int = 0
+	rejected: int = 0
+	wait_time: float = 0
+	service_time: float = 0
+	max_wait_time: float = 0
+	max_service_time: float = 0
+
+	def as_dict(self) -> dict:
+		return {
+			'done': self.done,
+			'rejected': self.rejected,
+			'avg_wait_time': round(self.wait_time / self.done, 3) if self.done else 0,
+			'avg_service_time': round(self.service_time / self.done, 3) if self.done else 0,
+			'max_wait_time': round(self.max_wait_time, 3),
+			'max_service_time': round(self.max_service_time, 3),
+		}
+
+
+class GenerationTicket:
+	""" async with ticket: ... - waits for a free slot and holds it """
+
+	def __init__(self, queue: 'GenerationQueue', user_id: int, on_queued: OnQueued | None):
+		self.queue = queue
+		self.user_id = user_id
+		self.on_queued = on_queued
+		self.enqueued_at = time.perf_counter()
+		self.started_at: float | None = None
+
+	@property
+	def wait_time(self) -> float:
+		return (self.started_at or time.perf_counter()) - self.enqueued_at
+
+	async def __aenter__(self) -> 'GenerationTicket':
+		queue = self.queue
+		try:
+			if queue.semaphore.locked() and self.on_queued is not None:
+				await self.on_queued(queue.waiting.index(self.user_id) + 1)
+			await queue.semaphore.acquire()
+		except BaseException:
+			queue.leave(self.user_id)
+			raise
+
+		queue.waiting.remove(self.user_id)
+		self.started_at = time.perf_counter()
+		return self
+
+	async def __aexit__(self, exc_type, exc_val, exc_tb):
+		self.queue.semaphore.release()
+		self.queue.leave(self.user_id)
+		if exc_type is None:
+			await self.queue.record(self.wait_time, time.perf_counter() - self.started_at)
+
+
+class GenerationQueue:
+	"""
+	Admission control for document rendering: at most `concurrency` renders at once,
+	one render per user, at most `max_size` waiting requests.
+	Limits and metrics are per process: with sharding up to WORKERS * concurrency documents are rendered at once.
+	"""
+
+	def __init__(self, concurrency: int = GenerationKeys.CONCURRENCY, max_size: int = GenerationKeys.MAX_QUEUE):
+		self.concurrency = concurrency
+		self.semaphore = asyncio.Semaphore(concurrency)
+		self.max_size = max_size
+		self.waiting: list[int] = []  # User ids in order
+		self.users: set[int] = set()  # Waiting or rendering
+		self.metrics = GenerationMetrics()
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+
+	@property
+	def rendering(self) -> int:
+		return len(self.users) - len(self.waiting)
+
+	def enqueue(self, user_id: int, on_queued: OnQueued = None) -> GenerationTicket:
+		"""
+		Take a place in the queue. Use the result with `async with` immediately.
+		:param on_queued: Called with a position if the request has to wait.
+		"""
+		if user_id in self.users:
+			self.metrics.rejected += 1
+			raise AlreadyQueuedError()
+		if len(self.waiting) >= self.max_size:
+			self.metrics.rejected += 1
+			raise QueueFullError()
+
+		self.users.add(user_id)
+		self.waiting.append(user_id)
+		return GenerationTicket(self, user_id, on_queued)
+
+	def leave(self, user_id: int):
+		self.users.discard(user_id)
+		if user_id in self.waiting:
+			self.waiting.remove(user_id)
+
+	async def record(self, wait_time: float, service_time: float):
+		metrics = self.metrics
+		metrics.done += 1
+		metrics.wait_time += wait_time
+		metrics.service_time += service_time
+		metrics.max_wait_time = max(metrics.max_wait_time, wait_time)
+		metrics.max_service_time = max(metrics.max_service_time, service_time)
+		await self.logger.ainfo(
+			'generation-done',
+			wait_time=round(wait_time, 3),
+			service_time=round(service_time, 3),
+			queue_size=len(self.waiting),
+		)
@@ -0,0 +1,232 @@
+"""
+Image fields: `{"type": "string", "format": "image", "width": 40, "height": 15}` (size in the document, mm).
+The value is the name of the processed image in IMAGES_DIR, it is inserted as docxtpl InlineImage on render.
+Resizing needs Pillow (optional): without it images are kept as sent and scaled by Word.
+Images not used for IMAGES_TTL_DAYS are removed (keep it longer than drafts live).
+"""
+import asyncio
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import ImageKeys
+from .cleanup import touch
+from .tracing import span
+
+if TYPE_CHECKING:
+	from aiogram import Bot
+	from aiogram.types import Document, PhotoSize
+	from docxtpl import DocxTemplate
+
+IMAGES_KEY = 'images'
+IMAGE_FORMAT = 'image'
+
+# {file_unique_id}_{width}x{height}.{ext} - nothing else is read from the disk (names come from users' data)
+IMAGE_NAME_RE = re.compile(r'[\w-]+_\d+x\d+\.(jpg|png)')
+SUFFIXES = {'image/jpeg': '.jpg', 'image/png': '.png'}
+
+
+class ImageError(Exception):
+	def __init__(self, key: str = 'image-failed'):
+		super().__init__(key)
+		self.key = key
+
+	def __str__(self):
+		return self.key
+
+
+def has_pillow() -> bool:
+	try:
+		import PIL  # noqa: F401
+	except ImportError:
+		return False
+	return True
+
+
+def get_target_size(schema: dict) -> tuple[int, int]:
+	""" Pixels for the field's size in the document (mm), MAX_SIDE if it is not set """
+	width, height = schema.get('width'), schema.get('height')
+	if width is None and height is None:
+		return ImageKeys.MAX_SIDE, ImageKeys.MAX_SIDE
+
+	def to_pixels(mm: float | None) -> int:
+		return ImageKeys.MAX_SIDE if mm is None else min(round(mm / 25.4 * ImageKeys.DPI), ImageKeys.MAX_SIDE)
+
+	return to_pixels(width), to_pixels(height)
+
+
+def process_image(src: Path, dst: Path, size: tuple[int, int], quality: int = ImageKeys.QUALITY) -> Path:
+	"""
+	Runs in a worker process. Fit into size, JPEG (PNG if it is transparent, e.g. a signature).
+	Saved under a temporary name and renamed: find() trusts any file with the final name.
+	:param dst: Path without suffix.
+	"""
+	from PIL import Image, ImageOps, UnidentifiedImageError
+
+	try:
+		image = Image.open(src)
+	except UnidentifiedImageError:
+		raise ImageError('image-unsupported')
+
+	with image:
+		image = ImageOps.exif_transpose(image)  # Photos from phones are rotated by EXIF
+		image.thumbnail(size, Image.Resampling.LANCZOS)
+
+		tmp_path = dst.with_name(f'{uuid.uuid4().hex}.tmp')
+		try:
+			if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+				path = dst.with_suffix('.png')
+				image.save(tmp_path, 'PNG', optimize=True)
+			else:
+				path = dst.with_suffix('.jpg')
+				image.convert('RGB').save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+			tmp_path.replace(path)
+		finally:
+			tmp_path.unlink(missing_ok=True)
+	return path
+
+
+def keep_image(src: Path, dst: Path) -> Path:
+	""" Without Pillow: only JPEG and PNG are accepted (docx can show them), stored as they are """
+	from docx.image.exceptions import UnrecognizedImageError
+	from docx.image.image import Image
+
+	try:
+		content_type = Image.from_file(str(src)).content_type
+	except UnrecognizedImageError:
+		raise ImageError('image-unsupported')
+	if content_type not in SUFFIXES:
+		raise ImageError('image-unsupported')
+
+	path = dst.with_suffix(SUFFIXES[content_type])
+	src.replace(path)  # The download is complete and in the same directory: atomic
+	return path
+
+
+class ImageStore:
+	"""
+	Processed images by Telegram file_unique_id and target size.
+	The same image for the same field is never downloaded or resized again.
+	Downloads are streamed to disk, resizing runs in a process pool.
+	"""
+
+	def __init__(self, directory: str = ImageKeys.DIR, workers: int = ImageKeys.WORKERS):
+		self.directory = Path(directory)
+		self.workers = workers
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._pool: ProcessPoolExecutor | None = None
+
+	def _get_pool(self) -> ProcessPoolExecutor:
+		if self._pool is None:
+			# Not forked: the event loop's threads and locks must not be copied
+			self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'))
+		return self._pool
+
+	def close(self):
+		if self._pool is not None:
+			self._pool.shutdown(cancel_futures=True)
+			self._pool = None
+
+	def find(self, file_unique_id: str, size: tuple[int, int]) -> str | None:
+		""" Name of the already processed image (touched: IMAGES_TTL_DAYS count from the last use) """
+		for suffix in ('.jpg', '.png'):
+			name = f'{file_unique_id}_{size[0]}x{size[1]}{suffix}'
+			if (self.directory / name).exists():
+				touch(self.directory / name)
+				return name
+		return None
+
+	async def fetch(self, bot: 'Bot', file: 'PhotoSize | Document', size: tuple[int, int]) -> str:
+		"""
+		Download and process the image (or take the cached one).
+		:return: Name of the image (the field's value).
+		"""
+		name = self.find(file.file_unique_id, size)
+		if name is not None:
+			return name
+
+		if file.file_size and file.file_size > ImageKeys.MAX_FILE_SIZE:
+			raise ImageError('image-too-large')
+
+		self.directory.mkdir(parents=True, exist_ok=True)
+		tmp_path = self.directory / f'{uuid.uuid4().hex}.tmp'
+		dst = self.directory / f'{file.file_unique_id}_{size[0]}x{size[1]}'
+		try:
+			with span('image.download', bytes=file.file_size):
+				await bot.download(file, destination=tmp_path)  # Streamed by chunks
+
+			with span('image.process'):
+				if has_pillow():
+					loop = asyncio.get_running_loop()
+					path = await loop.run_in_executor(self._get_pool(), process_image, tmp_path, dst, size)
+				else:
+					path = await asyncio.to_thread(keep_image, tmp_path, dst)
+		except ImageError:
+			raise
+		except Exception as e:
+			await self.logger.awarning('image-failed', file_unique_id=file.file_unique_id, error=str(e))
+			raise ImageError('image-failed') from e
+		finally:
+			tmp_path.unlink(missing_ok=True)
+		return path.name
+
+
+def image_exists(name: Any, directory: Path = Path(ImageKeys.DIR)) -> bool:
+	""" Is the value a processed image (e.g. a signature from the previous document) """
+	return isinstance(name, str) and IMAGE_NAME_RE.fullmatch(name) is not None and (directory / name).exists()
+
+
+def get_inline_size(path: Path, schema: dict) -> dict:
+	""" width or height of InlineImage: fits into the field's size keeping proportions """
+	from docx.image.image import Image
+	from docx.shared import Mm
+
+	width, height = schema.get('width'), schema.get('height')
+	if width is None or height is None:
+		return {'width': Mm(width)} if width is not None else {'height': Mm(height)} if height is not None else {}
+
+	image = Image.from_file(str(path))
+	if image.px_width / image.px_height > width / height:
+		return {'width': Mm(width)}
+	return {'height': Mm(height)}
+
+
+def inject_images(doc: 'DocxTemplate', schema: dict, value: Any, directory: Path = Path(ImageKeys.DIR)) -> Any:
+	""" Copy of the data with names of image fields replaced by InlineImage (the data itself is not changed) """
+	match schema.get('type'):
+		case 'object' if isinstance(value, dict):
+			properties = schema.get('properties', {})
+			return {
+				key: inject_images(doc, properties[key], item, directory) if key in properties else item
+				for key, item in value.items()
+			}
+		case 'array' if isinstance(value, list) and isinstance(schema.get('items'), dict):
+			return [inject_images(doc, schema['items'], item, directory) for item in value]
+		case 'string' if schema.get('format') == IMAGE_FORMAT and value is not None:
+			from docxtpl import InlineImage
+
+			if not isinstance(value, str) or IMAGE_NAME_RE.fullmatch(value) is None:
+				raise ValueError(f'Invalid image name: {value!r}')
+			path = directory / value
+			if not path.exists():
+				raise FileNotFoundError(f'Image {value} not found')
+			touch(path)
+			return InlineImage(doc, str(path), **get_inline_size(path, schema))
+	return value
+
+
+def has_images(schema: dict) -> bool:
+	match schema.get('type'):
+		case 'object':
+			return any(has_images(child) for child in schema.get('properties', {}).values())
+		case 'array':
+			return isinstance(schema.get('items'), dict) and has_images(schema['items'])
+		case 'string':
+			return schema.get('format') == IMAGE_FORMAT
+	return False
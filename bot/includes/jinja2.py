@@ -1 +1,210 @@
 # Тут можно писать дополнительные функции для шаблона
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+
+from env import ProjectKeys
+
+MONTHS_GENITIVE = (
+	'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+	'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря',
+)
+
+
+class CachingEnvironment(Environment):
+	"""
+	docxtpl compiles each document part with from_string, which Jinja never caches.
+	Cache compiled templates by source in memory and on disk (bytecode).
+	"""
+
+	def __init__(self, *args, memory_cache_size: int = 64, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._memory_cache: OrderedDict[str, Template] = OrderedDict()
+		self._memory_cache_size = memory_cache_size
+		self._memory_cache_lock = threading.Lock()  # Documents are rendered in threads
+
+	def from_string(self, source, globals=None, template_class=None) -> Template:
+		if globals or template_class or not isinstance(source, str):
+			return super().from_string(source, globals, template_class)
+
+		key = hashlib.sha1(source.encode()).hexdigest()
+		with self._memory_cache_lock:
+			template = self._memory_cache.get(key)
+			if template is not None:
+				self._memory_cache.move_to_end(key)
+				return template
+
+		code = None
+		bucket = None
+		if self.bytecode_cache is not None:
+			bucket = self.bytecode_cache.get_bucket(self, key, None, source)
+			code = bucket.code
+
+		if code is None:
+			code = self.compile(source)
+			if bucket is not None:
+				bucket.code = code
+				self.bytecode_cache.set_bucket(bucket)
+
+		template = self.template_class.from_code(self, code, self.make_globals(None), None)
+		with self._memory_cache_lock:
+			self._memory_cache[key] = template
+			if len(self._memory_cache) > self._memory_cache_size:
+				self._memory_cache.popitem(last=False)
+		return template
+
+
+def to_date(value) -> date:
+	if isinstance(value, datetime):
+		return value.date()
+	if isinstance(value, date):
+		return value
+	return datetime.strptime(str(value), '%d.%m.%Y').date()
+
+
+def format_date(value, fmt: str = '«%d» %B %Y г.') -> str:
+	""" {{ start_date | date }} -> «05» марта 2025 г. (%B is a russian month in genitive) """
+	if value in (None, ''):
+		return ''
+	value = to_date(value)
+	return value.strftime(fmt.replace('%B', MONTHS_GENITIVE[value.month - 1]))
+
+
+def plural(number, one: str, few: str, many: str) -> str:
+	""" {{ days | plural('день', 'дня', 'дней') }} """
+	n = abs(int(number))
+	if n % 10 == 1 and n % 100 != 11:
+		return one
+	if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+		return few
+	return many
+
+
+_UNITS = ('', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять')
+_UNITS_FEMININE = ('', 'одна', 'две') + _UNITS[3:]
+_TEENS = ('десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать',
+          'пятнадцать', 'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать')
+_TENS = ('', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто')
+_HUNDREDS = ('', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот')
+_ORDERS = (  # (one, few, many, feminine)
+	('тысяча', 'тысячи', 'тысяч', True),
+	('миллион', 'миллиона', 'миллионов', False),
+	('миллиард', 'миллиарда', 'миллиардов', False),
+)
+
+
+def _triad2words(n: int, feminine: bool) -> list[str]:
+	words = [_HUNDREDS[n // 100]]
+	if 10 <= n % 100 < 20:
+		words.append(_TEENS[n % 10])
+	else:
+		words.append(_TENS[n % 100 // 10])
+		words.append((_UNITS_FEMININE if feminine else _UNITS)[n % 10])
+	return [w for w in words if w]
+
+
+def num2words(number) -> str:
+	""" {{ amount | num2words }} -> сто двадцать три (integer part only) """
+	n = int(number)
+	if n == 0:
+		return 'ноль'
+
+	words = []
+	if n < 0:
+		words.append('минус')
+		n = -n
+
+	triads = []
+	while n:
+		triads.append(n % 1000)
+		n //= 1000
+
+	for order in reversed(range(len(triads))):
+		triad = triads[order]
+		if not triad:
+			continue
+		if order == 0:
+			words.extend(_triad2words(triad, False))
+			continue
+		one, few, many, feminine = _ORDERS[order - 1]
+		words.extend(_triad2words(triad, feminine))
+		words.append(plural(triad, one, few, many))
+
+	return ' '.join(words)
+
+
+@lru_cache
+def _get_morph():
+	try:
+		import pymorphy3
+	except ImportError:
+		return None
+	return pymorphy3.MorphAnalyzer()
+
+
+def inflect(text: str, case: str) -> str:
+	""" {{ full_name | inflect('datv') }} - declension by OpenCorpora case (needs optional pymorphy3) """
+	morph = _get_morph()
+	if morph is None or not text:
+		return text
+
+	words = []
+	for word in str(text).split():
+		parsed = morph.parse(word)[0].inflect({case})
+		if parsed is None:
+			words.append(word)
+			continue
+		words.append(parsed.word.capitalize() if word[:1].isupper() else parsed.word)
+	return ' '.join(words)
+
+
+@lru_cache
+def get_jinja_env() -> CachingEnvironment:
+	""" Process-wide environment for docxtpl rendering """
+	bytecode_cache = None
+	if ProjectKeys.JINJA_CACHE_DIR:
+		cache_dir = Path(ProjectKeys.JINJA_CACHE_DIR)
+		cache_dir.mkdir(parents=True, exist_ok=True)
+		bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+
+	env = CachingEnvironment(bytecode_cache=bytecode_cache)
+	env.filters.update({
+		'date': format_date,
+		'plural': plural,
+		'num2words': num2words,
+		'inflect': inflect,
+	})
+	return env
+
+
+class _CompileOnly:
+	""" jinja_env for docxtpl's own preparation of the parts: templates are compiled (and cached), nothing is rendered """
+
+	def __init__(self, env: Environment):
+		self.env = env
+
+	def from_string(self, source: str) -> '_CompileOnly':
+		self.env.from_string(source)
+		return self
+
+	@staticmethod
+	def render(*_args, **_kwargs) -> str:
+		return ''
+
+
+def precompile(template_path: Path):
+	""" Compile the body, headers and footers of the .docx template, so the first render does not pay for it """
+	from docxtpl import DocxTemplate
+
+	doc = DocxTemplate(template_path)
+	doc.init_docx()
+	env = _CompileOnly(get_jinja_env())
+	doc.build_xml({}, env)
+	for uri in (doc.HEADER_URI, doc.FOOTER_URI):
+		for _ in doc.build_headers_footers_xml({}, uri, env):
+			pass
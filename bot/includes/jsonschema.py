@@ -1,52 +1,169 @@
+import copy
 import json
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from docxtpl import DocxTemplate
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+from .tenants import get_templates_dir
+from .tracing import span
 
-from env import ProjectKeys
+# docxtpl (lxml, python-docx) and jsonschema are heavy, import them on first use
+if TYPE_CHECKING:
+	from docxtpl import DocxTemplate
+	from jsonschema.protocols import Validator
 
 
 def get_available_templates() -> list[str]:
 	""" Return available user """
 
+	templates_dir = get_templates_dir()
 	template_names = [
 		f.stem
-		for f in ProjectKeys.TEMPLATES_DIR.glob('*.docx')
-		if (ProjectKeys.TEMPLATES_DIR / f'{f.stem}.json').exists()
+		for f in templates_dir.glob('*.docx')
+		if (templates_dir / f'{f.stem}.json').exists()
 	]
 
 	return template_names
 
 
+def get_template_path(template_name: str, suffix: str, templates_dir: Path | None = None) -> Path:
+	"""
+	Path of the template's file. Names come from users (/create_document <name>),
+	so a path outside of the templates directory is not found.
+	"""
+	templates_dir = (templates_dir or get_templates_dir()).resolve()
+	path = (templates_dir / f'{template_name}{suffix}').resolve()
+	if path.parent != templates_dir:
+		raise FileNotFoundError(f'Template {template_name!r} is not in {templates_dir}')
+	return path
+
+
 def load_schema(template_name: str) -> dict:
-	""" Load schema from JSON file """
+	""" Load schema from JSON file (a copy: the cached one is shared by all users) """
+	return copy.deepcopy(_get_schema(template_name))
 
-	template_path = ProjectKeys.TEMPLATES_DIR / f'{template_name}.json'
+
+def _get_schema(template_name: str) -> dict:
+	""" The cached schema itself: must not be changed """
+	template_path = get_template_path(template_name, '.json')
 	if not template_path.exists():
 		raise FileNotFoundError(f'Schema file {template_path} not found')
 
-	with open(template_path, 'r', encoding='utf-8') as template:
+	# Cache is invalidated when the file is changed
+	return _load_schema(template_path, template_path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _load_schema(template_path: Path, _mtime: int) -> dict:
+	with span('schema.load', path=str(template_path)), open(template_path, 'r', encoding='utf-8') as template:
 		return json.load(template)
 
 
+def get_schema_validator(schema: dict) -> 'Validator':
+	"""
+	Return compiled validator for the schema. Cached by its content, so copies of a schema share it;
+	the content is serialized once per schema object (don't change a schema after validating by it).
+	"""
+	cached = _validators_by_id.get(id(schema))
+	if cached is not None and cached[0] is schema:
+		return cached[1]
+
+	key = json.dumps(schema, sort_keys=True, ensure_ascii=False)
+	validator = _validators.get(key)
+	if validator is None:
+		validator = _validators[key] = _compile_validator(key)
+		if len(_validators) > _VALIDATORS_CACHE_SIZE:
+			_validators.pop(next(iter(_validators)))
+
+	if len(_validators_by_id) >= _VALIDATORS_CACHE_SIZE:
+		_validators_by_id.pop(next(iter(_validators_by_id)))
+	_validators_by_id[id(schema)] = (schema, validator)
+	return validator
+
+
+def _compile_validator(key: str) -> 'Validator':
+	from jsonschema.validators import validator_for
+
+	schema = json.loads(key)  # Own copy of the caller's schema
+	with span('schema.validator'):
+		cls = validator_for(schema)
+		cls.check_schema(schema)
+		return cls(schema)
+
+
+_VALIDATORS_CACHE_SIZE = 256
+_validators: dict[str, 'Validator'] = {}  # By content
+_validators_by_id: dict[int, tuple[dict, 'Validator']] = {}  # The schema object is kept: its id is not reused
+
+
+def get_field_validator(template_name: str, path: tuple[str, ...]) -> 'Validator':
+	"""
+	Validator of the field's sub-schema at path in the template's schema.
+	$ref / $defs are resolved against the whole schema, as when the data is validated.
+	:raise FileNotFoundError: No such template.
+	:raise KeyError: No such field (the schema was changed).
+	"""
+	schema = _get_schema(template_name)  # Cached while the file is not changed
+	cached = _node_validators.get((id(schema), path))
+	if cached is not None and cached[0] is schema:
+		return cached[1]
+
+	node = schema
+	for key in path:
+		node = node[key]
+	validator = get_schema_validator(schema).evolve(schema=node)
+
+	if len(_node_validators) >= _NODE_VALIDATORS_CACHE_SIZE:
+		_node_validators.pop(next(iter(_node_validators)))
+	_node_validators[(id(schema), path)] = (schema, validator)
+	return validator
+
+
+_NODE_VALIDATORS_CACHE_SIZE = 1024
+_node_validators: dict[tuple[int, tuple[str, ...]], tuple[dict, 'Validator']] = {}
+
+
 def validate_data(schema: dict, data: dict) -> tuple[bool, str | None]:
 	""" Validate user data by a schema """
+	from jsonschema.exceptions import best_match
 
-	try:
-		validate(schema, data)
+	error = best_match(get_schema_validator(schema).iter_errors(data))
+	if error is None:
 		return True, None
-	except ValidationError as e:
-		return False, e.message
+	return False, error.message
 
 
-def generate_document(template_name: str, data: dict) -> DocxTemplate:
-	""" Render the document from template with data """
+def collect_errors(schema: dict, data: dict) -> list[tuple[list[str | int], str]]:
+	""" All validation errors as (path in data, message) """
+	return [
+		(list(error.absolute_path), error.message)
+		for error in sorted(get_schema_validator(schema).iter_errors(data), key=lambda e: list(map(str, e.absolute_path)))
+	]
+
+
+def generate_document(template_name: str, data: dict, templates_dir: Path | None = None) -> 'DocxTemplate':
+	"""
+	Render the document from template with data
+	:param templates_dir: The current bot's templates by default (pass it to other processes).
+	"""
+	from .docx_tables import FastTableTemplate
+	from .jinja2 import get_jinja_env
 
-	template_path = ProjectKeys.TEMPLATES_DIR / f'{template_name}.docx'
+	template_path = get_template_path(template_name, '.docx', templates_dir)
 	if not template_path.exists():
 		raise FileNotFoundError(f'Template file {template_path} not found')
 
-	doc = DocxTemplate(template_path)
-	doc.render(data)
+	with span('render', template=template_name):
+		doc = FastTableTemplate(template_path)
+		doc.render(with_images(doc, template_path.with_suffix('.json'), data), get_jinja_env())
 	return doc
+
+
+def with_images(doc: 'DocxTemplate', schema_path: Path, data: dict) -> dict:
+	""" Image fields are rendered as InlineImage (the data keeps names of the images) """
+	from .images import has_images, inject_images
+
+	if not schema_path.exists():
+		return data
+	schema = _load_schema(schema_path, schema_path.stat().st_mtime_ns)
+	return inject_images(doc, schema, data) if has_images(schema) else data
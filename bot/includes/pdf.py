@@ -0,0 +1,241 @@
+import asyncio
+import os
+import shlex
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import PdfKeys, ProjectKeys
+
+PDF_POOL_KEY = 'pdf_pool'
+
+
+class PdfError(Exception):
+	def __init__(self, key: str = 'pdf-failed'):
+		super().__init__(key)
+		self.key = key
+
+	def __str__(self):
+		return self.key
+
+
+def get_free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(('127.0.0.1', 0))
+		return sock.getsockname()[1]
+
+
+class PdfWorker:
+	""" Resident unoserver process (it keeps one headless soffice running) """
+
+	def __init__(self, worker_id: int):
+		self.worker_id = worker_id
+		self.port: int | None = None
+		self.process: asyncio.subprocess.Process | None = None
+		self.profile_dir: str | None = None
+		self.jobs = 0
+
+	async def start(self, timeout: float = PdfKeys.START_TIMEOUT):
+		# Each soffice needs its own profile, otherwise the second one joins the first
+		self.profile_dir = tempfile.mkdtemp(prefix='soffice-')
+		self.port = get_free_port()
+		self.jobs = 0
+		try:
+			self.process = await asyncio.create_subprocess_exec(
+				*shlex.split(PdfKeys.UNOSERVER),
+				'--interface', '127.0.0.1',
+				'--port', str(self.port),
+				'--uno-port', str(get_free_port()),
+				'--user-installation', Path(self.profile_dir).as_uri(),
+				stdout=asyncio.subprocess.DEVNULL,
+				stderr=asyncio.subprocess.DEVNULL,
+				start_new_session=True,  # To stop soffice together with unoserver
+			)
+		except OSError as e:
+			await self.stop()
+			raise PdfError('pdf-not-available') from e
+
+		deadline = time.monotonic() + timeout
+		while not await self.is_healthy():
+			if self.process.returncode is not None or time.monotonic() > deadline:
+				await self.stop()
+				raise PdfError('pdf-not-available')
+			await asyncio.sleep(0.5)
+
+	async def is_healthy(self) -> bool:
+		""" The process is alive and accepts connections """
+		if self.process is None or self.process.returncode is not None:
+			return False
+		try:
+			_, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', self.port), 1)
+		except (OSError, asyncio.TimeoutError):
+			return False
+		writer.close()
+		return True
+
+	async def stop(self):
+		if self.process is not None and self.process.returncode is None:
+			self._kill(signal.SIGTERM)
+			try:
+				await asyncio.wait_for(self.process.wait(), 10)
+			except asyncio.TimeoutError:
+				self._kill(signal.SIGKILL)
+				await self.process.wait()
+		self.process = None
+
+		if self.profile_dir is not None:
+			shutil.rmtree(self.profile_dir, ignore_errors=True)
+			self.profile_dir = None
+
+	def _kill(self, sig: int):
+		try:
+			os.killpg(self.process.pid, sig)
+		except ProcessLookupError:
+			pass
+
+	def convert(self, docx_path: Path, pdf_path: Path):
+		""" Blocking, run in a thread """
+		from unoserver.client import UnoClient
+
+		UnoClient(port=str(self.port)).convert(inpath=str(docx_path), outpath=str(pdf_path), convert_to='pdf')
+
+
+class PdfPool:
+	"""
+	Bounded pool of resident converters: soffice cold start takes seconds, so the workers are reused.
+	A worker is checked before each job and periodically, killed on a job timeout
+	and restarted after `max_jobs` jobs (soffice leaks memory).
+	"""
+
+	def __init__(self,
+	             size: int = PdfKeys.POOL_SIZE,
+	             *,
+	             max_jobs: int = PdfKeys.MAX_JOBS,
+	             timeout: float = PdfKeys.TIMEOUT,
+	             health_interval: float = PdfKeys.HEALTH_INTERVAL):
+		self.size = size
+		self.max_jobs = max_jobs
+		self.timeout = timeout
+		self.health_interval = health_interval
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+
+		self._workers = [PdfWorker(i) for i in range(size)]
+		self._idle: asyncio.Queue[PdfWorker] = asyncio.Queue()
+		for worker in self._workers:
+			self._idle.put_nowait(worker)
+		self._tasks: set[asyncio.Task] = set()
+
+	@property
+	def enabled(self) -> bool:
+		return self.size > 0
+
+	async def start(self):
+		""" Start all workers in background, so the first conversion does not wait for soffice """
+		if self.enabled:
+			self._create_task(self._start_idle())
+			self._create_task(self._check_health())
+
+	async def stop(self):
+		for task in self._tasks:
+			task.cancel()
+		await asyncio.gather(*self._tasks, return_exceptions=True)
+		await asyncio.gather(*(worker.stop() for worker in self._workers))
+
+	def _create_task(self, coro):
+		task = asyncio.create_task(coro)
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	async def _start_idle(self):
+		workers = [self._idle.get_nowait() for _ in range(self._idle.qsize())]
+		try:
+			await asyncio.gather(*(self._ensure_started(worker) for worker in workers), return_exceptions=True)
+		finally:
+			for worker in workers:
+				self._idle.put_nowait(worker)
+
+	async def _check_health(self):
+		while True:
+			await asyncio.sleep(self.health_interval)
+			await self._start_idle()
+
+	async def _ensure_started(self, worker: PdfWorker):
+		if await worker.is_healthy():
+			return
+		if worker.process is not None:
+			await self.logger.awarning('pdf-worker-unhealthy', worker_id=worker.worker_id, jobs=worker.jobs)
+			await worker.stop()
+		await worker.start()
+
+	async def _recycle(self, worker: PdfWorker):
+		try:
+			await worker.stop()
+			await worker.start()
+		except PdfError:
+			pass  # Will be started again on the next job
+		finally:
+			self._idle.put_nowait(worker)
+
+	async def convert(self, docx_path: Path, pdf_path: Path):
+		""" Convert to a temporary file and move it, so readers never see a partial PDF """
+		if not self.enabled:
+			raise PdfError('pdf-not-available')
+
+		worker = await self._idle.get()
+		try:
+			await self._ensure_started(worker)
+		except PdfError:
+			self._idle.put_nowait(worker)
+			raise
+
+		tmp_path = pdf_path.with_name(f'{pdf_path.stem}.{uuid.uuid4().hex}.tmp.pdf')
+		try:
+			await asyncio.wait_for(asyncio.to_thread(worker.convert, docx_path, tmp_path), self.timeout)
+			tmp_path.replace(pdf_path)
+		except asyncio.TimeoutError as e:
+			await self.logger.awarning('pdf-timeout', worker_id=worker.worker_id, path=str(docx_path))
+			await worker.stop()  # The conversion may hang forever
+			raise PdfError('pdf-timeout') from e
+		except Exception as e:
+			await self.logger.aerror('pdf-failed', worker_id=worker.worker_id, path=str(docx_path), error=str(e))
+			raise PdfError('pdf-failed') from e
+		finally:
+			tmp_path.unlink(missing_ok=True)
+			worker.jobs += 1
+			if worker.process is not None and worker.jobs >= self.max_jobs:
+				self._create_task(self._recycle(worker))
+			else:
+				self._idle.put_nowait(worker)
+
+
+def get_documents_dir() -> Path:
+	path = Path(ProjectKeys.DOCUMENTS_DIR)
+	path.mkdir(parents=True, exist_ok=True)
+	return path
+
+
+async def get_pdf(pool: PdfPool, template_name: str, data: dict, render_key: str) -> Path:
+	"""
+	PDF of the document. The .docx and .pdf are kept in DOCUMENTS_DIR by the render key
+	(DOCUMENTS_TTL_DAYS since the last use), so the same document is rendered and converted only once.
+	"""
+	from .cleanup import touch
+	from .delivery import store_document
+
+	docx_path = get_documents_dir() / f'{render_key}.docx'
+	pdf_path = docx_path.with_suffix('.pdf')
+	if pdf_path.exists():
+		touch(pdf_path)
+		return pdf_path
+
+	if not docx_path.exists():
+		await asyncio.to_thread(store_document, template_name, data, docx_path)
+	await pool.convert(docx_path, pdf_path)
+	return pdf_path
@@ -0,0 +1,215 @@
+import asyncio
+import cProfile
+import io
+import pickle
+import pstats
+import re
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import structlog
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import Redis
+from structlog.typing import FilteringBoundLogger
+
+from env import ProfilingKeys
+from .sessions import get_data_keys_pattern
+from .storage import get_template_name, loads_data
+from .tenants import get_tenant
+
+PROFILER_KEY = 'profiler'
+
+OnReport = Callable[[Path], Awaitable]
+
+
+@dataclass(slots=True)
+class SessionInfo:
+	key: str
+	template_name: str
+	raw_bytes: int  # Stored in Redis (maybe compressed)
+	dialog_data_bytes: int  # Pickled dialog_data
+	nodes: int  # Contexts in the draft
+
+
+async def collect_sessions(storage: RedisStorage, redis: Redis = None, limit: int = 10) -> list[SessionInfo]:
+	"""
+	The largest drafts of the current bot by pickled dialog_data. Reads all sessions - for admins only.
+	:param redis: Client to read with (a replica), the storage's one by default.
+	"""
+	from .templates.contexts import BaseContext
+
+	redis = redis or storage.redis
+	sessions = []
+	pattern = get_data_keys_pattern(storage, get_tenant().bot_id)
+	async for redis_key in redis.scan_iter(match=pattern, count=500):
+		raw = await redis.get(redis_key)
+		if not raw:
+			continue
+
+		try:
+			data = loads_data(raw)
+		except Exception:  # Outdated pickle
+			continue
+
+		dialog_data = data.get('dialog_data')
+		if not isinstance(dialog_data, dict):
+			continue
+
+		context = dialog_data.get('context')
+		sessions.append(SessionInfo(
+			key=redis_key.decode(),
+			template_name=get_template_name(data) or '-',
+			raw_bytes=len(raw),
+			dialog_data_bytes=len(pickle.dumps(dialog_data)),
+			nodes=context.get_root().count_nodes() if isinstance(context, BaseContext) else 0,
+		))
+
+	sessions.sort(key=lambda s: s.dialog_data_bytes, reverse=True)
+	return sessions[:limit]
+
+
+@dataclass(slots=True)
+class ProfilingSession:
+	kind: str  # cpu / memory
+	target: str  # Handler name or dialog state
+	seconds: int
+	on_report: OnReport | None = None
+	calls: int = 0
+	running: int = 0  # Calls of the target running now (coroutines interleave)
+	profile: cProfile.Profile | None = None
+	allocations: Counter = field(default_factory=Counter)  # Traceback line -> bytes
+	allocation_counts: Counter = field(default_factory=Counter)
+	started_tracemalloc: bool = False
+
+
+class Profiler:
+	"""
+	Profiles calls of one handler for N seconds and writes a report to REPORTS_DIR.
+	cpu - cProfile (pstats, the .prof file can be opened with snakeviz),
+	memory - tracemalloc difference of snapshots taken around each call.
+
+	Everything running while the target runs is measured too (other updates are handled
+	in the same event loop), so profile under the load you want to diagnose.
+	Only the process which received the command is profiled.
+	"""
+
+	CPU = 'cpu'
+	MEMORY = 'memory'
+
+	def __init__(self, reports_dir: Path = ProfilingKeys.REPORTS_DIR, max_seconds: int = ProfilingKeys.MAX_SECONDS):
+		self.reports_dir = Path(reports_dir)
+		self.max_seconds = max_seconds
+		self.session: ProfilingSession | None = None
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._task: asyncio.Task | None = None
+
+	def start(self, kind: str, target: str, seconds: int, on_report: OnReport = None) -> ProfilingSession:
+		if kind not in (self.CPU, self.MEMORY):
+			raise ValueError('profiling-unknown-kind')
+		if self.session is not None:
+			raise ValueError('profiling-busy')
+
+		session = ProfilingSession(kind, target, min(max(seconds, 1), self.max_seconds), on_report)
+		if kind == self.CPU:
+			session.profile = cProfile.Profile()
+		elif not tracemalloc.is_tracing():
+			tracemalloc.start(ProfilingKeys.TRACEMALLOC_FRAMES)
+			session.started_tracemalloc = True
+
+		self.session = session
+		self._task = asyncio.create_task(self._finish_later(session))
+		return session
+
+	def get_session(self, *names: str | None) -> ProfilingSession | None:
+		""" Session if one of the names (handler name, state) is profiled now """
+		session = self.session
+		if session is not None and session.target in names:
+			return session
+		return None
+
+	@contextmanager
+	def measure(self, session: ProfilingSession):
+		session.calls += 1
+		if session.kind == self.CPU:
+			# Only one profiler can be enabled at once - keep it enabled while any call runs
+			if not session.running:
+				session.profile.enable()
+			session.running += 1
+			try:
+				yield
+			finally:
+				session.running -= 1
+				if not session.running:
+					session.profile.disable()
+			return
+
+		before = self._take_snapshot()
+		try:
+			yield
+		finally:
+			if self.session is session:  # tracemalloc may be already stopped
+				after = self._take_snapshot()
+				for stat in after.compare_to(before, 'lineno'):
+					line = str(stat.traceback)
+					session.allocations[line] += stat.size_diff
+					session.allocation_counts[line] += stat.count_diff
+
+	@staticmethod
+	def _take_snapshot() -> tracemalloc.Snapshot:
+		return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+	async def stop(self) -> Path | None:
+		""" Finish the current session now """
+		if self._task is not None:
+			self._task.cancel()
+			await asyncio.gather(self._task, return_exceptions=True)
+			self._task = None
+		if self.session is None:
+			return None
+		return await self._finish(self.session)
+
+	async def _finish_later(self, session: ProfilingSession):
+		await asyncio.sleep(session.seconds)
+		self._task = None
+		path = await self._finish(session)
+		if session.on_report is not None:
+			await session.on_report(path)
+
+	async def _finish(self, session: ProfilingSession) -> Path:
+		self.session = None
+		if session.kind == self.CPU and session.running:
+			session.profile.disable()
+		if session.started_tracemalloc:
+			tracemalloc.stop()
+
+		path = await asyncio.to_thread(self._write_report, session)
+		await self.logger.ainfo('profiling-report', kind=session.kind, target=session.target, calls=session.calls, path=str(path))
+		return path
+
+	def _write_report(self, session: ProfilingSession) -> Path:
+		self.reports_dir.mkdir(parents=True, exist_ok=True)
+		name = re.sub(r'[^\w.-]+', '_', session.target)
+		path = self.reports_dir / f'{datetime.now():%Y%m%d-%H%M%S}-{session.kind}-{name}.txt'
+		header = f'{session.kind} profile of {session.target}: {session.calls} calls in {session.seconds} s\n\n'
+
+		if session.kind == self.CPU:
+			stream = io.StringIO()
+			if session.calls:
+				session.profile.dump_stats(path.with_suffix('.prof'))
+				stats = pstats.Stats(session.profile, stream=stream)
+				stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(ProfilingKeys.REPORT_LINES)
+			path.write_text(header + stream.getvalue())
+			return path
+
+		top = session.allocations.most_common(ProfilingKeys.REPORT_LINES)
+		lines = [
+			f'{size / 1024:10.1f} KiB {session.allocation_counts[line]:8} blocks  {line}'
+			for line, size in top if size > 0
+		]
+		path.write_text(header + '\n'.join(lines) + '\n')
+		return path
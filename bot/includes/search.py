@@ -0,0 +1,109 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from env import ProjectKeys
+from .jsonschema import get_available_templates, load_schema
+from .tenants import get_templates_dir
+
+WORD_RE = re.compile(r'\w+')
+FOUND_CACHE_SIZE = 256  # Queries of the index version whose results are kept
+
+
+def normalize(text: str) -> str:
+	return text.casefold().replace('ё', 'е').replace('_', ' ')
+
+
+def trigrams(text: str) -> set[str]:
+	text = f'  {text} '
+	return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass(slots=True, frozen=True)
+class TemplateEntry:
+	name: str
+	title: str
+
+
+class TemplateIndex:
+	""" In-memory prefix + trigram index over template names and schema titles """
+
+	def __init__(self, entries: list[TemplateEntry], version: int = 0):
+		self.version = version  # Changes when templates change
+		self.entries = sorted(entries, key=lambda e: e.name)
+		self.names = tuple(e.name for e in self.entries)
+		self._texts = [normalize(f'{e.name} {e.title}') for e in self.entries]
+		self._prefixes: dict[str, set[int]] = defaultdict(set)
+		self._trigrams: dict[str, set[int]] = defaultdict(set)
+		self._found: dict[str, tuple[str, ...]] = {}  # Query -> all matching names
+
+		for i, text in enumerate(self._texts):
+			for word in WORD_RE.findall(text):
+				for end in range(1, len(word) + 1):
+					self._prefixes[word[:end]].add(i)
+			for trigram in trigrams(text):
+				self._trigrams[trigram].add(i)
+
+	def search(self, query: str, limit: int | None = 50) -> list[TemplateEntry]:
+		""" Ranked by: all words are prefixes, then by share of common trigrams """
+		query = normalize(query).strip()
+		if not query:
+			return self.entries[:limit]
+
+		scores: dict[int, float] = defaultdict(float)
+
+		words = WORD_RE.findall(query)
+		if words:
+			matched = set.intersection(*(self._prefixes.get(word, set()) for word in words))
+			for i in matched:
+				scores[i] += 10
+
+		query_trigrams = trigrams(query)
+		for trigram in query_trigrams:
+			for i in self._trigrams.get(trigram, ()):
+				scores[i] += 1 / len(query_trigrams)
+
+		for i in list(scores):
+			if normalize(self.entries[i].name) == query:
+				scores[i] += 100
+			elif scores[i] < 10 and scores[i] < ProjectKeys.SEARCH_MIN_SIMILARITY:
+				del scores[i]  # Too fuzzy
+
+		ranked = sorted(scores, key=lambda i: (-scores[i], self.entries[i].name))
+		return [self.entries[i] for i in ranked[:limit]]
+
+	def search_names(self, query: str) -> tuple[str, ...]:
+		""" Names of all matching templates, cached by query: page flips only slice them """
+		names = self._found.get(query)
+		if names is None:
+			if len(self._found) >= FOUND_CACHE_SIZE:
+				self._found.pop(next(iter(self._found)))
+			names = self._found[query] = tuple(entry.name for entry in self.search(query, limit=None))
+		return names
+
+
+_indexes: dict[Path, TemplateIndex] = {}  # By templates directory (bots may share one)
+
+
+def get_template_index() -> TemplateIndex:
+	""" Index of the current bot's templates. It is rebuilt when templates are added or removed """
+	templates_dir = get_templates_dir()
+	if not templates_dir.is_dir():  # A new bot without templates yet
+		return TemplateIndex([], hash((templates_dir, None)))
+
+	# Directory is a part of the version (bots with other directories have other indexes)
+	version = hash((templates_dir, templates_dir.stat().st_mtime_ns))
+
+	index = _indexes.get(templates_dir)
+	if index is None or index.version != version:
+		entries = []
+		for name in get_available_templates():
+			try:
+				title = load_schema(name).get('title', '')
+			except (OSError, ValueError):
+				title = ''
+			entries.append(TemplateEntry(name, title))
+		index = _indexes[templates_dir] = TemplateIndex(entries, version)
+
+	return index
@@ -0,0 +1,203 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import structlog
+from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+from redis.exceptions import WatchError
+from structlog.typing import FilteringBoundLogger
+
+from env import SessionKeys
+from . import compression
+from .compression import is_compressed
+from .storage import get_template_name, loads_data, archive_data
+
+
+def get_data_keys_pattern(storage: RedisStorage, bot_id: int | None = None) -> str:
+	""" SCAN pattern of FSM data keys (of one bot if keys contain bot id) """
+	key_builder = storage.key_builder
+	if isinstance(key_builder, DefaultKeyBuilder):
+		sep = key_builder.separator
+		if bot_id is not None and key_builder.with_bot_id:
+			return f'{key_builder.prefix}{sep}{bot_id}{sep}*{sep}data'
+		return f'{key_builder.prefix}{sep}*{sep}data'
+	return '*:data'
+
+
+@dataclass(slots=True)
+class TemplateSessions:
+	count: int = 0
+	bytes: int = 0
+	archived: int = 0
+
+
+@dataclass(slots=True)
+class SessionsReport:
+	templates: dict[str, TemplateSessions] = field(default_factory=lambda: defaultdict(TemplateSessions))
+	archived: int = 0
+	deleted: int = 0
+
+	@property
+	def count(self) -> int:
+		return sum(t.count for t in self.templates.values())
+
+	@property
+	def bytes(self) -> int:
+		return sum(t.bytes for t in self.templates.values())
+
+
+class SessionSweeper:
+	"""
+	Background task: archives (compresses) or deletes drafts which are idle for a long time
+	and reports sessions count and bytes per template (per template only with data TTL).
+	"""
+
+	def __init__(self, storage: RedisStorage,
+	             *,
+	             idle_after: int = SessionKeys.IDLE_AFTER,
+	             action: str = SessionKeys.IDLE_ACTION,
+	             interval: int = SessionKeys.SWEEP_INTERVAL):
+		if action not in ('archive', 'delete'):
+			raise ValueError(f'Unknown idle session action: {action}')
+
+		self.storage = storage
+		self.redis = storage.redis
+		self.idle_after = idle_after
+		self.action = action
+		self.interval = interval
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._task: asyncio.Task | None = None
+
+	async def _get_idle_times(self, redis_keys: list[bytes]) -> list[int | None]:
+		"""
+		With data TTL it is refreshed on each access, so idle time is (TTL - remaining TTL).
+		Without it rely on OBJECT IDLETIME, which is reset by any read (so the report does not read values).
+		"""
+		data_ttl = self.storage.data_ttl
+		async with self.redis.pipeline(transaction=False) as pipe:
+			for redis_key in redis_keys:
+				if data_ttl:
+					pipe.ttl(redis_key)
+				else:
+					pipe.object('idletime', redis_key)
+			results = await pipe.execute()
+
+		if not data_ttl:
+			return results
+		data_ttl = data_ttl if isinstance(data_ttl, int) else int(data_ttl.total_seconds())
+		return [data_ttl - ttl if ttl >= 0 else None for ttl in results]
+
+	@staticmethod
+	def _read_templates(raws: list[bytes | None]) -> list[tuple[str, int, bool] | None]:
+		""" Runs in a thread: (template name, bytes, is archived) of each value """
+		result = []
+		for raw in raws:
+			if not raw:
+				result.append(None)
+				continue
+			try:
+				template_name = get_template_name(loads_data(raw)) or '-'
+			except Exception:  # Outdated pickle
+				template_name = '?'
+			result.append((template_name, len(raw), is_compressed(raw)))
+		return result
+
+	async def sweep(self, batch_size: int = 500) -> SessionsReport:
+		report = SessionsReport()
+		batch: list[bytes] = []
+
+		async for redis_key in self.redis.scan_iter(match=get_data_keys_pattern(self.storage), count=batch_size):
+			batch.append(redis_key)
+			if len(batch) >= batch_size:
+				await self._sweep_batch(batch, report)
+				batch = []
+		if batch:
+			await self._sweep_batch(batch, report)
+
+		return report
+
+	async def _sweep_batch(self, redis_keys: list[bytes], report: SessionsReport):
+		""" Values are read by one pipeline and decoded in a thread """
+		alive = []
+		for redis_key, idle in zip(redis_keys, await self._get_idle_times(redis_keys)):
+			if self.idle_after and idle is not None and idle >= self.idle_after:
+				if self.action == 'delete':
+					await self.redis.delete(redis_key)
+					report.deleted += 1
+					continue
+				if await self._archive(redis_key):
+					report.archived += 1
+			alive.append(redis_key)
+
+		if not alive:
+			return
+
+		async with self.redis.pipeline(transaction=False) as pipe:
+			for redis_key in alive:
+				if self.storage.data_ttl:
+					pipe.get(redis_key)
+				else:
+					pipe.memory_usage(redis_key)
+			results = await pipe.execute()
+
+		if not self.storage.data_ttl:
+			stats = report.templates['?']
+			stats.count += len(alive)
+			stats.bytes += sum(size or 0 for size in results)
+			return
+
+		for item in await asyncio.to_thread(self._read_templates, results):
+			if item is None:
+				continue
+			template_name, size, archived = item
+			stats = report.templates[template_name]
+			stats.count += 1
+			stats.bytes += size
+			stats.archived += archived
+
+	async def _archive(self, redis_key: bytes) -> bool:
+		""" Compress value in place keeping its TTL. Skip if the user changed it meanwhile """
+		async with self.redis.pipeline(transaction=True) as pipe:
+			try:
+				await pipe.watch(redis_key)
+				raw = await pipe.get(redis_key)
+				if not raw or is_compressed(raw):
+					return False
+
+				archived = archive_data(raw)
+				if archived is raw:  # Too small to compress
+					return False
+
+				pipe.multi()
+				pipe.set(redis_key, archived, keepttl=True)
+				await pipe.execute()
+				return True
+			except WatchError:
+				return False
+
+	async def run(self):
+		while True:
+			try:
+				report = await self.sweep()
+				await self.logger.ainfo(
+					'sessions-report',
+					sessions=report.count,
+					bytes=report.bytes,
+					archived=report.archived,
+					deleted=report.deleted,
+					templates={name: (t.count, t.bytes) for name, t in report.templates.items()},
+					compression=(await compression.get_stats(self.redis)).as_dict(),  # Of all processes
+				)
+			except Exception as e:
+				await self.logger.aerror('sessions-sweep-failed', error=str(e))
+			await asyncio.sleep(self.interval)
+
+	def start(self):
+		if self._task is None:
+			self._task = asyncio.create_task(self.run())
+
+	async def stop(self):
+		if self._task is not None:
+			self._task.cancel()
+			await asyncio.gather(self._task, return_exceptions=True)
+			self._task = None
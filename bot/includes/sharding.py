@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import multiprocessing as mp
+from bisect import bisect
+from typing import Any, Callable
+
+import structlog
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff
+from structlog.typing import FilteringBoundLogger
+
+# Factory which builds the same bot and dispatcher as in a single process mode
+AppFactory = Callable[[], tuple[Bot, Dispatcher]]
+
+
+class HashRing:
+	""" Consistent hashing ring: each user always lands on the same worker """
+
+	def __init__(self, nodes: int, replicas: int = 64):
+		self._ring: list[tuple[int, int]] = sorted(
+			(self._hash(f'{node}:{replica}'), node)
+			for node in range(nodes)
+			for replica in range(replicas)
+		)
+		self._keys = [h for h, _ in self._ring]
+
+	@staticmethod
+	def _hash(value: str) -> int:
+		# Builtin hash() is salted per process, so use a stable one
+		return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+	def get_node(self, key: Any) -> int:
+		i = bisect(self._keys, self._hash(str(key))) % len(self._keys)
+		return self._ring[i][1]
+
+
+def resolve_shard_key(update: Update) -> int:
+	""" User id (or chat id) of the update, 0 for updates without them """
+	context = UserContextMiddleware.resolve_event_context(update)
+	if context.user is not None:
+		return context.user.id
+	if context.chat is not None:
+		return context.chat.id
+	return 0
+
+
+async def run_ingress(bot: Bot, workers: 'Workers', allowed_updates: list[str], *, polling_timeout: int = 30):
+	"""
+	Poll Telegram and distribute raw updates between workers by user.
+	Errors are retried with a backoff like in aiogram's polling, the last offset is confirmed on stop.
+	"""
+	logger: FilteringBoundLogger = structlog.get_logger()
+	ring = HashRing(len(workers))
+	backoff = Backoff(config=DEFAULT_BACKOFF_CONFIG)
+	offset = None
+	# The request must wait longer than the long polling itself
+	request_timeout = int(bot.session.timeout + polling_timeout) if bot.session.timeout else None
+
+	await logger.ainfo('Ingress started', workers=len(workers))
+	try:
+		while True:
+			try:
+				updates = await bot.get_updates(
+					offset=offset, timeout=polling_timeout, allowed_updates=allowed_updates, request_timeout=request_timeout
+				)
+			except TelegramRetryAfter as e:
+				await logger.awarning('Flood control on getUpdates', retry_after=e.retry_after)
+				await asyncio.sleep(e.retry_after)
+				continue
+			except Exception as e:  # Network errors, 5xx: Telegram will be back
+				delay = next(backoff)
+				await logger.aerror('Failed to fetch updates', error_type=type(e).__name__, error=str(e),
+				                    retry_in=round(delay, 1), tryings=backoff.counter)
+				await asyncio.sleep(delay)
+				continue
+
+			backoff.reset()
+			if updates:
+				workers.restart_dead()  # Nobody would read the queue of a dead worker
+			for update in updates:
+				node = ring.get_node(resolve_shard_key(update))
+				workers.queues[node].put(update.model_dump(mode='json', exclude_unset=True))
+				offset = update.update_id + 1
+	finally:
+		if offset is not None:
+			# Without it the updates of the last batch come again after restart
+			try:
+				await bot.get_updates(offset=offset, timeout=0, allowed_updates=allowed_updates)
+			except Exception as e:
+				await logger.awarning('Failed to confirm the last updates', offset=offset, error=str(e))
+
+
+async def run_worker(factory: AppFactory, queue: mp.Queue, worker_id: int):
+	""" Feed updates from the queue to the dispatcher with regular handlers and middlewares """
+	logger: FilteringBoundLogger = structlog.get_logger().bind(worker_id=worker_id)
+	bot, dp = factory()
+	tasks: set[asyncio.Task] = set()
+
+	await dp.emit_startup(bot=bot, dispatcher=dp)
+	await logger.ainfo('Worker started')
+	try:
+		while True:
+			raw = await asyncio.to_thread(queue.get)
+			if raw is None:  # Stop signal
+				break
+
+			task = asyncio.create_task(dp.feed_raw_update(bot, raw))
+			tasks.add(task)
+			task.add_done_callback(tasks.discard)
+
+		if tasks:
+			await asyncio.gather(*tasks, return_exceptions=True)
+	finally:
+		await dp.emit_shutdown(bot=bot, dispatcher=dp)
+		await bot.session.close()
+		await logger.ainfo('Worker stopped')
+
+
+def _worker_entry(factory: AppFactory, setup: Callable[[], None], queue: mp.Queue, worker_id: int):
+	setup()
+	asyncio.run(run_worker(factory, queue, worker_id))
+
+
+class Workers:
+	"""
+	Worker processes and their queues (spawned: the event loop's state must not be copied).
+	A dead worker is started again on the same queue, so updates sent to it are not lost.
+	"""
+
+	def __init__(self, factory: AppFactory, setup: Callable[[], None], workers: int):
+		"""
+		:param factory: Picklable function returning (bot, dispatcher).
+		:param setup: Picklable function called in each worker before start (logging etc.).
+		:param workers: Number of processes.
+		"""
+		self.factory = factory
+		self.setup = setup
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._ctx = mp.get_context('spawn')
+		self.queues: list[mp.Queue] = [self._ctx.Queue() for _ in range(workers)]
+		self.processes: list[mp.Process] = []
+
+	def __len__(self) -> int:
+		return len(self.queues)
+
+	def _start_process(self, worker_id: int) -> mp.Process:
+		process = self._ctx.Process(
+			target=_worker_entry, args=(self.factory, self.setup, self.queues[worker_id], worker_id),
+			name=f'bot-worker-{worker_id}', daemon=True,
+		)
+		process.start()
+		return process
+
+	def start(self):
+		self.processes = [self._start_process(i) for i in range(len(self.queues))]
+
+	def restart_dead(self) -> int:
+		""" Start crashed workers again, return their number """
+		restarted = 0
+		for i, process in enumerate(self.processes):
+			if not process.is_alive():
+				self.logger.error('Worker died, restarting', worker_id=i, exitcode=process.exitcode)
+				process.close()
+				self.processes[i] = self._start_process(i)
+				restarted += 1
+		return restarted
+
+	def stop(self, timeout: float = 30):
+		for queue in self.queues:
+			queue.put(None)
+		for process in self.processes:
+			process.join(timeout)
+			if process.is_alive():
+				process.terminate()
@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import ProjectKeys
+
+
+class StartupTimer:
+	""" Measures duration of startup phases """
+
+	def __init__(self):
+		self.phases: dict[str, float] = {}
+
+	@contextmanager
+	def phase(self, name: str, suppress: bool = False) -> Iterator[None]:
+		"""
+		:param suppress: Log an error of the phase instead of raising it (prewarm must not stop the bot).
+		"""
+		start = time.perf_counter()
+		try:
+			yield
+		except Exception as e:
+			if not suppress:
+				raise
+			structlog.get_logger().error('startup-phase-failed', phase=name, error=str(e))
+		finally:
+			self.phases[name] = round(time.perf_counter() - start, 3)
+
+	async def report(self, logger: FilteringBoundLogger = None):
+		logger = logger or structlog.get_logger()
+		await logger.ainfo('startup-phases', **self.phases)
+
+		imports_time = self.phases.get('imports', 0)
+		if imports_time > ProjectKeys.IMPORT_TIME_BUDGET:
+			await logger.awarning('import-time-budget-exceeded', imports=imports_time, budget=ProjectKeys.IMPORT_TIME_BUDGET)
+
+
+def prewarm() -> dict[str, float]:
+	"""
+	Load everything that is lazy by default so the first user does not pay for it.
+	Blocking, run it in a thread.
+	:return: Duration of each step.
+	"""
+	from includes.fluent import get_fluent_localization
+	from includes.jinja2 import precompile
+	from includes.jsonschema import get_available_templates, load_schema, get_schema_validator
+	from includes.search import get_template_index
+	from includes.tenants import get_tenants, set_tenant
+
+	timer = StartupTimer()
+
+	with timer.phase('prewarm_imports', suppress=True):
+		import docxtpl  # noqa: F401 (lxml, python-docx, jinja2)
+		import jsonschema  # noqa: F401
+
+	# Bots with the same templates directory share the caches, so warm each directory once
+	tenants = {tenant.templates_dir: tenant for tenant in get_tenants()}.values()
+
+	with timer.phase('prewarm_schemas', suppress=True):
+		for tenant in tenants:
+			set_tenant(tenant)
+			for template_name in get_available_templates():
+				try:
+					get_schema_validator(load_schema(template_name))
+				except Exception as e:  # Broken schema must not stop the bot
+					structlog.get_logger().error('prewarm-schema-failed', template_name=template_name, error=str(e))
+
+	with timer.phase('prewarm_templates', suppress=True):
+		for tenant in tenants:
+			set_tenant(tenant)
+			for template_name in get_available_templates():
+				try:
+					precompile(tenant.templates_dir / f'{template_name}.docx')
+				except Exception as e:
+					structlog.get_logger().error('prewarm-template-failed', template_name=template_name, error=str(e))
+
+	with timer.phase('prewarm_search', suppress=True):
+		for tenant in tenants:
+			set_tenant(tenant)
+			try:
+				get_template_index()
+			except Exception as e:
+				structlog.get_logger().error('prewarm-search-failed', templates_dir=str(tenant.templates_dir), error=str(e))
+	set_tenant(None)
+
+	with timer.phase('prewarm_fluent', suppress=True):
+		l10n = get_fluent_localization()
+		l10n.format_value('start-msg')  # Bundles are built on the first format
+
+	return timer.phases
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+
+import structlog
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from structlog.typing import FilteringBoundLogger
+
+from env import StatsKeys
+from .tenants import tenant_key
+
+STATS_KEY = 'stats'
+
+
+def get_day(days_ago: int = 0) -> str:
+	return (datetime.now(UTC) - timedelta(days=days_ago)).strftime('%Y%m%d')
+
+
+def percentile(values: list[float], q: float) -> float | None:
+	""" values must be sorted """
+	if not values:
+		return None
+	return values[min(int(len(values) * q), len(values) - 1)]
+
+
+@dataclass(slots=True)
+class TemplateStats:
+	name: str
+	chosen: int = 0
+	generated: int = 0
+	users: int = 0
+	complete_p50: float | None = None  # From choosing the template to the document (seconds)
+	render_p50: float | None = None
+	render_p90: float | None = None
+
+	@property
+	def completion_rate(self) -> float:
+		return self.generated / self.chosen if self.chosen else 0
+
+
+class UsageStats:
+	"""
+	Daily counters in Redis:
+	  {prefix}:{day}:chosen / generated - hash template -> count (HINCRBY)
+	  {prefix}:{day}:users[:template] - unique users (HyperLogLog)
+	  {prefix}:{day}:complete:{template} / render:{template} - durations (sorted sets, score - seconds)
+	Writes are pipelined and not awaited by handlers.
+	"""
+
+	def __init__(self, redis: Redis, read_redis: Redis = None, prefix: str = 'stats', ttl_days: int = StatsKeys.TTL_DAYS):
+		self.redis = redis
+		self.read_redis = read_redis or redis  # For reports
+		self.prefix = prefix
+		self.ttl = ttl_days * 24 * 60 * 60
+		self.logger: FilteringBoundLogger = structlog.get_logger()
+		self._tasks: set[asyncio.Task] = set()
+
+	def _key(self, day: str, *parts: str) -> str:
+		return ':'.join((tenant_key(self.prefix), day, *parts))
+
+	def _send(self, pipe: Pipeline):
+		""" Execute in background: statistics must not slow down the user """
+		task = asyncio.create_task(self._execute(pipe))
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	async def _execute(self, pipe: Pipeline):
+		try:
+			await pipe.execute()
+		except Exception as e:
+			await self.logger.awarning('stats-write-failed', error=str(e))
+
+	def template_chosen(self, template_name: str, user_id: int):
+		day = get_day()
+		pipe = self.redis.pipeline(transaction=False)
+		pipe.hincrby(self._key(day, 'chosen'), template_name, 1)
+		pipe.pfadd(self._key(day, 'users'), user_id)
+		pipe.pfadd(self._key(day, 'users', template_name), user_id)
+		for key in (self._key(day, 'chosen'), self._key(day, 'users'), self._key(day, 'users', template_name)):
+			pipe.expire(key, self.ttl)
+		self._send(pipe)
+
+	def document_generated(self, template_name: str, user_id: int,
+	                       complete_time: float | None = None, render_time: float | None = None):
+		"""
+		:param complete_time: Seconds from choosing the template.
+		:param render_time: Seconds of rendering (None if sent from cache).
+		"""
+		day = get_day()
+		member = f'{user_id}:{time.time_ns()}'
+		keys = [self._key(day, 'generated')]
+
+		pipe = self.redis.pipeline(transaction=False)
+		pipe.hincrby(keys[0], template_name, 1)
+		if complete_time is not None:
+			keys.append(self._key(day, 'complete', template_name))
+			pipe.zadd(keys[-1], {member: complete_time})
+		if render_time is not None:
+			keys.append(self._key(day, 'render', template_name))
+			pipe.zadd(keys[-1], {member: render_time})
+		for key in keys:
+			pipe.expire(key, self.ttl)
+		self._send(pipe)
+
+	async def report(self, days: int = 7, limit: int = 10) -> tuple[int, list[TemplateStats]]:
+		"""
+		:return: Unique users and the most chosen templates for the last days.
+		"""
+		day_list = [get_day(i) for i in range(days)]
+
+		async with self.read_redis.pipeline(transaction=False) as pipe:
+			for day in day_list:
+				pipe.hgetall(self._key(day, 'chosen'))
+				pipe.hgetall(self._key(day, 'generated'))
+			pipe.pfcount(*(self._key(day, 'users') for day in day_list))
+			*hashes, users = await pipe.execute()
+
+		templates: dict[str, TemplateStats] = {}
+		for i, counters in enumerate(hashes):
+			for name, count in counters.items():
+				name = name.decode()
+				stats = templates.setdefault(name, TemplateStats(name))
+				if i % 2:
+					stats.generated += int(count)
+				else:
+					stats.chosen += int(count)
+
+		top = sorted(templates.values(), key=lambda t: (-t.chosen, -t.generated, t.name))[:limit]
+		if not top:
+			return users, top
+
+		async with self.read_redis.pipeline(transaction=False) as pipe:
+			for stats in top:
+				pipe.pfcount(*(self._key(day, 'users', stats.name) for day in day_list))
+				pipe.zunion([self._key(day, 'complete', stats.name) for day in day_list], withscores=True)
+				pipe.zunion([self._key(day, 'render', stats.name) for day in day_list], withscores=True)
+			results = await pipe.execute()
+
+		for i, stats in enumerate(top):
+			stats.users, complete, render = results[i * 3:i * 3 + 3]
+			complete = [score for _, score in complete]  # Sorted by score
+			render = [score for _, score in render]
+			stats.complete_p50 = percentile(complete, 0.5)
+			stats.render_p50 = percentile(render, 0.5)
+			stats.render_p90 = percentile(render, 0.9)
+
+		return users, top
@@ -1,40 +1,105 @@
 import pickle
+import time
 from datetime import timedelta
+from functools import lru_cache
 from typing import Any
 
+from aiogram.fsm.state import State
 from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
 from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
 from redis.asyncio import Redis
+from redis.asyncio.sentinel import Sentinel
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
 
 from env import RedisKeys
+from .compression import STATS_FLUSH_INTERVAL, compress, decompress, is_compressed, flush_stats
+from .tracing import span
+
+READ_REDIS_KEY = 'read_redis'
+
+
+def get_template_name(data: dict) -> str | None:
+	""" Template name of the draft from FSM data or aiogram-dialog context data """
+	dialog_data = data.get('dialog_data', data)
+	return dialog_data.get('template_name') if isinstance(dialog_data, dict) else None
+
+
+def dumps_data(data: dict[str, Any]) -> bytes:
+	return compress(pickle.dumps(data), get_template_name(data))
+
+
+def loads_data(raw: bytes) -> dict[str, Any]:
+	return pickle.loads(decompress(raw))
+
+
+def archive_data(raw: bytes) -> bytes:
+	""" Cheap compressed form for idle sessions, loads_data reads it transparently """
+	if is_compressed(raw):
+		return raw
+	return compress(raw, codec='zlib', level=9)
 
 
 class PickleRedisStorage(RedisStorage):
+	"""
+	Stores data pickled. TTLs are refreshed on each access, so they are idle timeouts.
+	Compression counters of the process are added to Redis once a STATS_FLUSH_INTERVAL (and on close).
+	"""
+
+	_stats_flushed_at: float = 0
+
+	async def _flush_stats(self, force: bool = False):
+		if not force and time.monotonic() - self._stats_flushed_at < STATS_FLUSH_INTERVAL:
+			return
+		self._stats_flushed_at = time.monotonic()
+		try:
+			await flush_stats(self.redis)
+		except Exception:  # Statistics must not break the session
+			pass
+
+	async def close(self) -> None:
+		await self._flush_stats(force=True)
+		await super().close()
+
+	async def _get(self, redis_key: str, ttl: int | timedelta | None) -> bytes | None:
+		if ttl:
+			return await self.redis.getex(redis_key, ex=ttl)
+		return await self.redis.get(redis_key)
+
 	async def set_state(self, key: StorageKey, state: StateType = None) -> None:
 		redis_key = self.key_builder.build(key, "state")
-		if state is None:
-			await self.redis.delete(redis_key)
-		else:
-			await self.redis.set(redis_key, state.state)
+		with span('storage.set_state'):
+			if state is None:
+				await self.redis.delete(redis_key)
+			else:
+				await self.redis.set(redis_key, state.state if isinstance(state, State) else state, ex=self.state_ttl)
 
 	async def get_state(self, key: StorageKey) -> str | None:
 		redis_key = self.key_builder.build(key, "state")
-		state = await self.redis.get(redis_key)
+		with span('storage.get_state'):
+			state = await self._get(redis_key, self.state_ttl)
 		return state.decode("utf-8") if state else None
 
 	async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
 		""" Сохраняет data как сериализованный """
 		redis_key = self.key_builder.build(key, "data")
-		if not data:
-			await self.redis.delete(redis_key)
-			return
-		await self.redis.set(redis_key, pickle.dumps(data), ex=self.data_ttl, )
+		with span('storage.set_data') as current_span:
+			if not data:
+				await self.redis.delete(redis_key)
+				return
+			raw = dumps_data(data)
+			current_span.set_attribute('bytes', len(raw))
+			await self.redis.set(redis_key, raw, ex=self.data_ttl)
+		await self._flush_stats()
 
 	async def get_data(self, key: StorageKey) -> dict[str, Any]:
 		""" Загружает и десериализует """
 		redis_key = self.key_builder.build(key, "data")
-		raw = await self.redis.get(redis_key)
-		return pickle.loads(raw) if raw else {}
+		with span('storage.get_data') as current_span:
+			raw = await self._get(redis_key, self.data_ttl)
+			current_span.set_attribute('bytes', len(raw) if raw else 0)
+			return loads_data(raw) if raw else {}
 
 
 def get_storage(
@@ -61,5 +126,54 @@ def get_storage(
 	)
 
 
+def get_redis_options() -> dict[str, Any]:
+	""" Reconnection and timeouts: a restart or failover of Redis is waited out instead of failing the update """
+	return dict(
+		retry=Retry(ExponentialBackoff(cap=RedisKeys.BACKOFF_CAP, base=RedisKeys.BACKOFF_BASE), RedisKeys.RETRIES),
+		retry_on_error=[ConnectionError, TimeoutError],
+		socket_timeout=RedisKeys.SOCKET_TIMEOUT,
+		socket_connect_timeout=RedisKeys.CONNECT_TIMEOUT,
+		health_check_interval=RedisKeys.HEALTH_CHECK_INTERVAL,
+	)
+
+
+@lru_cache
+def get_sentinel() -> Sentinel:
+	sentinels = []
+	for address in RedisKeys.SENTINELS:
+		host, _, port = address.rpartition(':')
+		sentinels.append((host, int(port)))
+
+	return Sentinel(
+		sentinels,
+		sentinel_kwargs=dict(
+			password=RedisKeys.SENTINEL_PASSWORD or None,
+			socket_timeout=RedisKeys.SOCKET_TIMEOUT,
+			socket_connect_timeout=RedisKeys.CONNECT_TIMEOUT,
+		),
+		db=int(RedisKeys.DATABASE),
+		password=RedisKeys.PASSWORD or None,
+	)
+
+
 def get_redis(**kwargs) -> Redis:
+	""" Client of the master (found by Sentinel if it is configured) """
+	kwargs = get_redis_options() | kwargs
+	if RedisKeys.SENTINELS:
+		return get_sentinel().master_for(RedisKeys.SENTINEL_MASTER, **kwargs)
 	return Redis.from_url(RedisKeys.URL, **kwargs)
+
+
+def get_read_redis(**kwargs) -> Redis:
+	"""
+	Client for reads which tolerate replication lag. A replica if REDIS_READ_FROM_REPLICAS,
+	Sentinel falls back to the master when there are no replicas.
+	Never use it for FSM state: a user must see own writes.
+	"""
+	if not RedisKeys.READ_FROM_REPLICAS:
+		return get_redis(**kwargs)
+
+	kwargs = get_redis_options() | kwargs
+	if RedisKeys.SENTINELS:
+		return get_sentinel().slave_for(RedisKeys.SENTINEL_MASTER, **kwargs)
+	return Redis.from_url(RedisKeys.REPLICA_URL or RedisKeys.URL, **kwargs)
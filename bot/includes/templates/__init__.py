@@ -1 +1 @@
-from .main import create_context, get_validator, get_formatter
+from .main import create_context, get_validator, get_formatter, validate_value, validate_constraints, get_choices, parse_choice, Choice
@@ -1,4 +1,5 @@
 from .array_context import ArrayContext
 from .base_context import BaseContext
+from .image_context import ImageContext
 from .object_context import ObjectContext
 from .primitive_context import PrimitiveContext
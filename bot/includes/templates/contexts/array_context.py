@@ -1,10 +1,12 @@
 from fluent.runtime import FluentLocalization
 
+from utils import escape_mdv2
 from .base_context import BaseContext
 
 
 class ArrayContext(BaseContext):
 	ADD_ITEM = 'add-item'
+	ANY_ITEM = '*'  # Key of all items in field paths
 
 	def __init__(self, schema: dict, parent: BaseContext = None, required: bool = False):
 		super().__init__(schema, parent, required)
@@ -23,6 +25,28 @@ class ArrayContext(BaseContext):
 	def delete_child(self, child: BaseContext):
 		self._children.remove(child)
 
+	def get_children(self) -> list[BaseContext]:
+		return list(self._children)
+
+	def empty_copy(self, parent: BaseContext = None) -> 'ArrayContext':
+		new = super().empty_copy(parent)
+		new._children = []
+		return new
+
+	def detach_child(self, child: BaseContext) -> tuple[int, None]:
+		i = next(i for i, c in enumerate(self._children) if c is child)
+		del self._children[i]
+		return i, None
+
+	def attach_child(self, key: int, child: BaseContext):
+		self._children.insert(key, child)
+
+	def child_key(self, child: BaseContext) -> str:
+		return self.ANY_ITEM
+
+	def child_schema_path(self, child: BaseContext) -> tuple[str]:
+		return 'items',
+
 	def get_property(self, prop: int) -> BaseContext:
 		i = int(prop)
 		return self._children[i] if 0 <= i < len(self._children) else None
@@ -34,6 +58,8 @@ class ArrayContext(BaseContext):
 
 	def render_view(self, l10n: FluentLocalization) -> str:
 		parts = [f'*{self.title}*\n_{self.description}_']
+		if self.error is not None:
+			parts.append(f'{self.ERROR_MARK} _{escape_mdv2(self.error)}_')
 		for i, child in enumerate(self._children, 1):
 			# В ArrayContext требуется следить за required
 			parts.append(fr'{i}\. {child.render_view(l10n)}')
@@ -47,7 +73,9 @@ class ArrayContext(BaseContext):
 		""" Адаптер для кнопок для TemplateContext с type: array """
 		i, child = prop
 		text = f'{i} - {child.btn_name}'
-		if child.filled_required() and child.get_value() is not None:
+		if child.has_errors():
+			text += child.ERROR_MARK
+		elif child.filled_required() and child.get_value() is not None:
 			text += ' ✅'
 		return text, i
 
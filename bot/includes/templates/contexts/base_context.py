@@ -1,3 +1,4 @@
+import copy
 from abc import ABC, abstractmethod
 from typing import Any
 
@@ -7,10 +8,15 @@ from utils import escape_mdv2
 
 
 class BaseContext(ABC):
-	__version__ = 1  # Версия контекста (для pickle) - изменить при изменении параметров
+	__version__ = 2  # Версия контекста (для pickle) - изменить при изменении параметров
 
 	BACK_ACTION = 'back'
 	DELETE_ACTION = 'delete'
+	ERROR_MARK = ' ❗'
+	NOT_PICKLED = ('_abc_impl',)  # Атрибуты, которые не нужно или нельзя сериализовать
+
+	error: str | None = None  # Ошибка валидации по схеме (class default - для старых pickle)
+	template_name: str | None = None  # Только у корня: схемы полей берутся из схемы шаблона
 
 	def __init__(self, schema: dict[str, str], parent: 'BaseContext' = None, required: bool = False):
 		self._type = schema.get('type')
@@ -35,10 +41,32 @@ class BaseContext(ABC):
 		""" Clear all values """
 		pass
 
+	def get_children(self) -> list['BaseContext']:
+		""" Внутренние контексты """
+		return []
+
 	def delete_child(self, child: 'BaseContext'):
 		""" Очистить значение ребенка """
 		child.clear()
 
+	def empty_copy(self, parent: 'BaseContext' = None) -> 'BaseContext':
+		""" Такой же контекст без значений. Исходный не изменяется (остается в истории) """
+		new = copy.copy(self)
+		new._parent = parent
+		new.error = None
+		return new
+
+	def detach_child(self, child: 'BaseContext') -> tuple[Any, 'BaseContext | None']:
+		"""
+		Удалить ребенка, не изменяя его самого (для undo).
+		:return: Ключ ребенка и контекст, поставленный на его место (или None).
+		"""
+		raise NotImplementedError('No inner context to detach')
+
+	def attach_child(self, key: Any, child: 'BaseContext'):
+		""" Вернуть ребенка, удаленного detach_child """
+		raise NotImplementedError('No inner context to attach')
+
 	@abstractmethod
 	def get_property(self, prop: Any) -> 'BaseContext':
 		"""
@@ -52,6 +80,78 @@ class BaseContext(ABC):
 		""" Заполнены ли все обязательные поля """
 		pass
 
+	def find(self, path: list[str | int]) -> 'BaseContext | None':
+		""" Найти контекст по пути в данных (например, absolute_path ошибки jsonschema) """
+		context = self
+		for prop in path:
+			try:
+				context = context.get_property(prop)
+			except (NotImplementedError, ValueError, IndexError):
+				return None
+			if context is None:
+				return None
+		return context
+
+	def clear_errors(self):
+		self.error = None
+		for child in self.get_children():
+			child.clear_errors()
+
+	def has_errors(self) -> bool:
+		return self.error is not None or any(child.has_errors() for child in self.get_children())
+
+	def mark_errors(self, errors: list[tuple[list[str | int], str]]) -> int:
+		"""
+		Отметить ошибки валидации на контекстах (вызывать на корне).
+		:param errors: (path, message) - путь в данных и сообщение.
+		:return: Количество ошибок.
+		"""
+		self.clear_errors()
+		for path, message in errors:
+			context = self.find(path) or self
+			context.error = message if context.error is None else f'{context.error}; {message}'
+		return len(errors)
+
+	@property
+	def is_root(self) -> bool:
+		return self._parent is None
+
+	def get_root(self) -> 'BaseContext':
+		context = self
+		while context._parent is not None:
+			context = context._parent
+		return context
+
+	def child_key(self, child: 'BaseContext') -> str | int:
+		""" Ключ ребенка в схеме (для путей полей) """
+		raise NotImplementedError('No inner context')
+
+	def get_path(self) -> list[str | int]:
+		""" Путь от корня по схеме (одинаковый для всех элементов массива) """
+		if self._parent is None:
+			return []
+		return [*self._parent.get_path(), self._parent.child_key(self)]
+
+	def child_schema_path(self, child: 'BaseContext') -> tuple[str, ...]:
+		""" Путь к схеме ребенка в схеме этого контекста """
+		raise NotImplementedError('No inner context')
+
+	def get_schema_path(self) -> tuple[str, ...]:
+		""" Путь к схеме поля в схеме шаблона: ('properties', 'members', 'items', ...) """
+		if self._parent is None:
+			return ()
+		return (*self._parent.get_schema_path(), *self._parent.child_schema_path(self))
+
+	def iter_nodes(self):
+		""" Этот контекст и все внутренние """
+		yield self
+		for child in self.get_children():
+			yield from child.iter_nodes()
+
+	def count_nodes(self) -> int:
+		""" Количество контекстов в дереве (включая этот) """
+		return 1 + sum(child.count_nodes() for child in self.get_children())
+
 	def can_generate(self) -> bool:
 		""" Можно ли сгенерировать документ (все заполнено в главном контексте) """
 		return self._parent is None and self.filled_required()
@@ -104,8 +204,7 @@ class BaseContext(ABC):
 	def __getstate__(self):
 		""" Сериализация """
 		state = self.__dict__.copy()
-		# Исключаем атрибуты, которые не нужно или нельзя сериализовать
-		for attr in ['_abc_impl']:
+		for attr in self.NOT_PICKLED:
 			state.pop(attr, None)
 		return state
 
@@ -0,0 +1,35 @@
+from typing import Any
+
+from fluent.runtime import FluentLocalization
+
+from includes.images import get_target_size, image_exists
+from utils import escape_mdv2
+from .base_context import BaseContext
+from .primitive_context import PrimitiveContext
+
+
+class ImageContext(PrimitiveContext):
+	""" Photo or image file (format: image). The value is the name of the processed image """
+	TEXT_INPUT = False
+
+	def __init__(self, schema: dict[str, str], parent: 'BaseContext' = None, required: bool = False):
+		super().__init__(schema, parent, required)
+		if 'question' not in schema:
+			self.question = escape_mdv2(f'Отправьте {schema.get("description", "изображение")} фото или файлом:')
+
+		self.size = get_target_size(schema)  # Pixels of the image in the document
+
+	def parse(self, value: str) -> Any:
+		raise ValueError('image-expected')
+
+	def accepts(self, value: Any) -> bool:
+		""" Only images processed for this size (e.g. the signature from the previous document) """
+		return image_exists(value) and value.endswith((f'_{self.size[0]}x{self.size[1]}.jpg', f'_{self.size[0]}x{self.size[1]}.png'))
+
+	def render_view(self, l10n: FluentLocalization) -> str:
+		text = f'{self.description}: '
+		if self._value is not None:
+			text += l10n.format_value('image-attached')
+		if self.error is not None:
+			text += f'{self.ERROR_MARK} _{escape_mdv2(self.error)}_'
+		return text
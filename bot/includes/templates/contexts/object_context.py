@@ -3,10 +3,15 @@ from typing import Any
 from fluent.runtime import FluentLocalization
 
 from includes.templates import create_context
+from utils import escape_mdv2
 from .base_context import BaseContext
+from .primitive_context import PrimitiveContext
 
 
 class ObjectContext(BaseContext):
+	BULK_ACTION = 'bulk'
+	BULK_SKIP = '-'  # Leave the field as is in the ordered mode
+
 	def __init__(self, schema: dict, parent: BaseContext = None, required: bool = False):
 		super().__init__(schema, parent, required)
 		if self.btn_name is None:
@@ -25,6 +30,28 @@ class ObjectContext(BaseContext):
 		for child in self._children.values():
 			child.clear()
 
+	def get_children(self) -> list[BaseContext]:
+		return list(self._children.values())
+
+	def empty_copy(self, parent: BaseContext = None) -> 'ObjectContext':
+		new = super().empty_copy(parent)
+		new._children = {key: child.empty_copy(new) for key, child in self._children.items()}
+		return new
+
+	def detach_child(self, child: BaseContext) -> tuple[str, BaseContext]:
+		key = self.child_key(child)
+		replacement = self._children[key] = child.empty_copy(self)
+		return key, replacement
+
+	def attach_child(self, key: str, child: BaseContext):
+		self._children[key] = child
+
+	def child_key(self, child: BaseContext) -> str:
+		return next(key for key, c in self._children.items() if c is child)
+
+	def child_schema_path(self, child: BaseContext) -> tuple[str, str]:
+		return 'properties', self.child_key(child)
+
 	def get_property(self, prop: Any) -> BaseContext:
 		return self._children.get(prop)
 
@@ -36,6 +63,8 @@ class ObjectContext(BaseContext):
 
 	def render_view(self, l10n: FluentLocalization) -> str:
 		parts = [f'*{self.title}*\n_{self.description}_\n']
+		if self.error is not None:
+			parts.append(f'{self.ERROR_MARK} _{escape_mdv2(self.error)}_\n')
 		for key, child in self._children.items():
 			parts.append(fr'\-{r' \*' if child.required else ''} {child.render_view(l10n)}')
 		return '\n'.join(parts)
@@ -48,6 +77,72 @@ class ObjectContext(BaseContext):
 		""" Адаптер для кнопок для TemplateContext с type: object """
 		key, child = prop
 		text = child.btn_name
-		if child.filled_required() and child.get_value() is not None:
+		if child.has_errors():
+			text += child.ERROR_MARK
+		elif child.filled_required() and child.get_value() is not None:
 			text += ' ✅'
 		return text, key
+
+	def get_primitives(self) -> dict[str, PrimitiveContext]:
+		""" Direct children which can be filled from the text """
+		return {key: child for key, child in self._children.items() if isinstance(child, PrimitiveContext) and child.TEXT_INPUT}
+
+	def render_action_kb(self, l10n: FluentLocalization) -> list[tuple[str, str | int]]:
+		keyboard = super().render_action_kb(l10n)
+		if len(self.get_primitives()) > 1:
+			keyboard.insert(0, (l10n.format_value('bulk-input'), self.BULK_ACTION))
+		return keyboard
+
+	def render_bulk_hint(self) -> str:
+		""" Fields in order for the bulk input """
+		return '\n'.join(
+			fr'{i}\. {escape_mdv2(child.btn_name)}{r' \*' if child.required else ''}'
+			for i, child in enumerate(self.get_primitives().values(), 1)
+		)
+
+	def parse_bulk(self, text: str) -> tuple[dict[str, Any], list[tuple[str, ValueError]]]:
+		"""
+		Parse many fields at once. Each line is either `name: value` (name is a key or a button name)
+		or just a value for the next field in order (`-` to skip the field).
+		:return: Parsed values by key and all errors as (field name or line, error with l10n key).
+		"""
+		primitives = self.get_primitives()
+		names = {}
+		for key, child in primitives.items():
+			names[key.casefold()] = key
+			names[str(child.btn_name).casefold()] = key
+
+		values: dict[str, Any] = {}
+		errors: list[tuple[str, ValueError]] = []
+		ordered = iter(primitives)
+
+		for line in filter(None, map(str.strip, text.splitlines())):
+			name, sep, value = line.partition(':')
+			key = names.get(name.strip().casefold()) if sep else None
+			if key is None:
+				key = next((k for k in ordered if k not in values), None)
+				value = line
+				if key is None:
+					errors.append((line, ValueError('bulk-too-many-lines')))
+					continue
+
+			value = value.strip()
+			if value == self.BULK_SKIP:
+				continue
+
+			try:
+				values[key] = primitives[key].parse(value)
+			except ValueError as e:
+				errors.append((primitives[key].btn_name, e))
+
+		return values, errors
+
+	def set_bulk(self, values: dict[str, Any]):
+		""" Вызывать только с результатом из parse_bulk метода! """
+		for key, value in values.items():
+			self._children[key].set_value(value)
+
+	def do(self, action: str) -> BaseContext:
+		if action == self.BULK_ACTION:
+			return self  # Input is handled by the dialog
+		return super().do(action)
@@ -2,12 +2,23 @@ from typing import Any
 
 from fluent.runtime import FluentLocalization
 
-from includes.templates import get_validator, get_formatter
+from includes.templates import Choice, get_validator, get_formatter, get_choices, parse_choice, validate_value, validate_constraints
+from includes.templates.formatters import Formatter
+from includes.templates.validators import Validator
 from utils import escape_mdv2
 from .base_context import BaseContext
 
 
 class PrimitiveContext(BaseContext):
+	CURRENT_MARK = '✅ '
+	TEXT_INPUT = True  # The value is typed (not an image)
+	NOT_PICKLED = (*BaseContext.NOT_PICKLED, '_formatter', '_validator')  # Resolved again after loading
+
+	_constraints: dict | None = None  # Only in old pickles: the field's schema is taken from the template's one
+	_choices: list[Choice] | None = None  # Options for buttons
+	_formatter: Formatter | None = None
+	_validator: Validator | None = None
+
 	def __init__(self, schema: dict[str, str], parent: 'BaseContext' = None, required: bool = False):
 		super().__init__(schema, parent, required)
 
@@ -19,22 +30,61 @@ class PrimitiveContext(BaseContext):
 
 		self._value = schema.get('default')
 		self._format = schema.get('format')
+		self._choices = get_choices(schema)
+
+	@property
+	def formatter(self) -> Formatter:
+		if self._formatter is None:
+			self._formatter = get_formatter(self._type)
+		return self._formatter
+
+	@property
+	def validator(self) -> Validator:
+		if self._validator is None:
+			self._validator = get_validator(self._format)
+		return self._validator
+
+	@property
+	def has_choices(self) -> bool:
+		return self._choices is not None
 
 	def parse(self, value: str) -> Any:
-		# Форматер преобразует ввод (например, из строки в число)
-		formatter = get_formatter(self._type)
-		value: Any = formatter.format(value)
+		# Вариант можно и напечатать (кнопки дают значение без разбора)
+		if self._choices is not None and any(label is not None for label, _ in self._choices):
+			value: Any = parse_choice(self._choices, value)
+		else:
+			# Форматер преобразует ввод (например, из строки в число)
+			value: Any = self.formatter.format(value)
 
 		# Валидация правильности ввода (например, дата соответствует ДД.ММ.ГГГГ)
-		validator = get_validator(self._format)
-		if not validator.validate(value):
+		if not self.validator.validate(value):
 			raise ValueError('invalid-value')
 
+		# Валидация по схеме поля (enum, minimum, pattern...)
+		self.validate_schema(value)
+
 		return value
 
+	def validate_schema(self, value: Any):
+		""" By the field's schema within the template's one (not pickled: loaded by the root's template_name) """
+		template_name = self.get_root().template_name
+		if template_name is None:
+			validate_constraints({**(self._constraints or {}), 'type': self._type}, value)
+		else:
+			validate_value(template_name, self.get_schema_path(), value)
+
+	def accepts(self, value: Any) -> bool:
+		""" Is an already parsed value (e.g. from another template) valid for this field """
+		try:
+			self.validate_schema(value)
+			return bool(self.validator.validate(value))
+		except (ValueError, TypeError):  # E.g. strptime of a number from another template's field
+			return False
+
 	def set_value(self, parsed_value: Any):
 		""" Вызывать только с результатом из parse метода! """
 		self._value = parsed_value
+		self.error = None
 
 	def get_value(self) -> Any:
 		return self._value
@@ -42,6 +92,11 @@ class PrimitiveContext(BaseContext):
 	def clear(self):
 		self._value = None
 
+	def empty_copy(self, parent: BaseContext = None) -> 'PrimitiveContext':
+		new = super().empty_copy(parent)
+		new._value = None
+		return new
+
 	def get_property(self, prop: Any) -> 'BaseContext':
 		raise NotImplementedError('No inner context to view')
 
@@ -52,7 +107,25 @@ class PrimitiveContext(BaseContext):
 		text = f'{self.description}: '
 		if self._value is not None:
 			text += f'`{self._value}`'
+		if self.error is not None:
+			text += f'{self.ERROR_MARK} _{escape_mdv2(self.error)}_'
 		return text
 
 	def ask_question(self) -> str:
 		return self.question
+
+	def render_choice_kb(self, l10n: FluentLocalization) -> list[tuple[str, str | int]]:
+		""" Options as buttons, data is the index """
+		if self._choices is None:
+			return []
+
+		keyboard = []
+		for i, (label, value) in enumerate(self._choices):
+			if label is None:
+				label = l10n.format_value('choice-yes' if value else 'choice-no')
+			keyboard.append((f'{self.CURRENT_MARK}{label}' if value == self._value else label, i))
+		return keyboard
+
+	def get_choice(self, index: int) -> Any:
+		""" Value of the pressed option (already valid, no parsing) """
+		return self._choices[index][1]
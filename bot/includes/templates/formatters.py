@@ -1,6 +1,19 @@
 from abc import abstractmethod, ABC
 from typing import Any
 
+# Schema type -> formatter. Plugins add their own with @register_formatter
+FORMATTERS: dict[str, 'Formatter'] = {}
+
+
+def register_formatter(type_name: str):
+	""" Class decorator: use the formatter for fields of the type (replaces the registered one) """
+
+	def decorator(cls: type['Formatter']) -> type['Formatter']:
+		FORMATTERS[type_name] = cls()
+		return cls
+
+	return decorator
+
 
 class Formatter(ABC):
 	@abstractmethod
@@ -8,11 +21,13 @@ class Formatter(ABC):
 		pass
 
 
+@register_formatter('string')
 class StringFormatter(Formatter):
 	def format(self, value: str) -> str:
 		return str(value)  # Nothing to do
 
 
+@register_formatter('integer')
 class IntegerFormatter(Formatter):
 	def format(self, value: str) -> int:
 		try:
@@ -21,6 +36,7 @@ class IntegerFormatter(Formatter):
 			raise ValueError('invalid-integer-input')
 
 
+@register_formatter('number')
 class NumberFormatter(Formatter):
 	def format(self, value: str) -> float:
 		try:
@@ -29,11 +45,17 @@ class NumberFormatter(Formatter):
 			raise ValueError('invalid-number-input')
 
 
+@register_formatter('boolean')
 class BooleanFormatter(Formatter):
+	""" Typed answers (buttons give the value without parsing) """
+	TRUE = frozenset({'да', 'yes', 'true', '+'})
+	FALSE = frozenset({'нет', 'no', 'false', '-'})
+
 	def format(self, value: str) -> bool:
-		if value in ['Да', 'Yes']:
+		value = value.strip().casefold()
+		if value in self.TRUE:
 			return True
-		elif value in ['Нет', 'No']:
+		elif value in self.FALSE:
 			return False
 		else:
 			raise ValueError('invalid-boolean-input')
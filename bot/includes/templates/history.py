@@ -0,0 +1,122 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, TYPE_CHECKING
+
+from env import ProjectKeys
+
+if TYPE_CHECKING:
+	from .contexts import BaseContext, ObjectContext
+
+
+@dataclass(slots=True)
+class Change:
+	"""
+	One undoable step. Contexts are referenced, not copied: the history is pickled together
+	with the context tree, so removed subtrees are shared instead of being deep copies.
+	"""
+	kind: str  # set / detach / insert / many
+	node: Any  # Changed context or its parent (for detach / insert), list[Change] for many
+	key: Any = None
+	old: Any = None
+	new: Any = None
+
+
+class History:
+	""" Undo / redo of the draft's changes with bounded length """
+
+	SET = 'set'
+	DETACH = 'detach'
+	INSERT = 'insert'
+	MANY = 'many'
+
+	def __init__(self, max_length: int = ProjectKeys.HISTORY_LENGTH):
+		self._undo: deque[Change] = deque(maxlen=max_length)
+		self._redo: list[Change] = []
+
+	@property
+	def can_undo(self) -> bool:
+		return bool(self._undo)
+
+	@property
+	def can_redo(self) -> bool:
+		return bool(self._redo)
+
+	def _push(self, change: Change):
+		self._undo.append(change)
+		self._redo.clear()
+
+	def set_value(self, context: 'BaseContext', value: Any):
+		""" PrimitiveContext.set_value with history """
+		self._push(self._set(context, value))
+
+	@staticmethod
+	def _set(context: 'BaseContext', value: Any) -> Change:
+		change = Change(History.SET, context, old=context.get_value(), new=value)
+		context.set_value(value)
+		return change
+
+	def set_bulk(self, context: 'ObjectContext', values: dict[str, Any]):
+		""" ObjectContext.set_bulk with history (one step) """
+		if not values:
+			return
+		self._push(Change(History.MANY, [
+			self._set(context.get_property(key), value)
+			for key, value in values.items()
+		]))
+
+	def do(self, context: 'BaseContext', action: str) -> 'BaseContext':
+		""" BaseContext.do with history for deleting and adding items """
+		from .contexts import ArrayContext
+
+		if action == context.DELETE_ACTION and not context.is_root:
+			parent = context.do(context.BACK_ACTION)
+			key, replacement = parent.detach_child(context)
+			self._push(Change(History.DETACH, parent, key, old=context, new=replacement))
+			return parent
+
+		result = context.do(action)
+		if action == ArrayContext.ADD_ITEM and isinstance(context, ArrayContext):
+			self._push(Change(History.INSERT, context, len(context.get_children()) - 1, new=result))
+		return result
+
+	def undo(self) -> 'BaseContext | None':
+		"""
+		:return: Context to show after undo (None if nothing to undo).
+		"""
+		if not self._undo:
+			return None
+		change = self._undo.pop()
+		self._redo.append(change)
+		return self._apply(change, undo=True)
+
+	def redo(self) -> 'BaseContext | None':
+		if not self._redo:
+			return None
+		change = self._redo.pop()
+		self._undo.append(change)
+		return self._apply(change, undo=False)
+
+	def _apply(self, change: Change, undo: bool) -> 'BaseContext':
+		match change.kind:
+			case History.SET:
+				change.node.set_value(change.old if undo else change.new)
+				return change.node.do(change.node.BACK_ACTION) if not change.node.is_root else change.node
+			case History.MANY:
+				changes = reversed(change.node) if undo else change.node
+				return [self._apply(c, undo) for c in changes][-1]
+			case History.DETACH:
+				if undo:
+					change.node.attach_child(change.key, change.old)
+				elif change.new is not None:
+					change.node.attach_child(change.key, change.new)
+				else:
+					change.node.detach_child(change.old)
+				return change.node
+			case History.INSERT:
+				if undo:
+					change.node.detach_child(change.new)
+				else:
+					change.node.attach_child(change.key, change.new)
+				return change.node
+
+		raise ValueError(f'Unknown change: {change.kind}')
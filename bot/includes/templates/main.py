@@ -1,36 +1,101 @@
+import json
 from functools import lru_cache
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 # Import other classes locally to avoid circular import error
 if TYPE_CHECKING:
 	from .contexts import BaseContext
 	from .formatters import Formatter
 	from .validators import Validator
+	from jsonschema.protocols import Validator as SchemaValidator
+
+# Label (None - yes / no from l10n) and value of an option
+Choice = tuple[str | None, Any]
 
 
-@lru_cache
 def get_formatter(type_name: str) -> 'Formatter':
-	from .formatters import StringFormatter, IntegerFormatter, NumberFormatter, BooleanFormatter, DummyFormatter
-	mapping = {
-		'string': StringFormatter(),
-		'integer': IntegerFormatter(),
-		'number': NumberFormatter(),
-		'boolean': BooleanFormatter(),
-	}
-	return mapping.get(type_name, DummyFormatter())  # fallback
+	""" Resolve once per field (PrimitiveContext keeps it) """
+	from .formatters import FORMATTERS, DummyFormatter
+	return FORMATTERS.get(type_name) or DummyFormatter()  # fallback
 
 
-@lru_cache
 def get_validator(format_name: str) -> 'Validator':
-	from .validators import DateValidator, DummyValidator
-	mapping = {
-		'date': DateValidator(),
-	}
-	return mapping.get(format_name, DummyValidator())
+	from .validators import VALIDATORS, DummyValidator
+	return VALIDATORS.get(format_name) or DummyValidator()
+
+
+def get_choices(schema: dict) -> list[Choice] | None:
+	""" Options of a field which are chosen by buttons: boolean, enum and oneOf / anyOf of consts """
+	if schema.get('type') == 'boolean' and 'enum' not in schema:
+		return [(None, True), (None, False)]
+
+	if 'enum' in schema:
+		labels = schema.get('enumNames', [])  # Common extension of JSON schema
+		return [
+			(str(labels[i]) if i < len(labels) else str(value), value)
+			for i, value in enumerate(schema['enum'])
+		]
+
+	options = schema.get('oneOf') or schema.get('anyOf')
+	if options and all(isinstance(option, dict) and 'const' in option for option in options):
+		return [(str(option.get('title', option['const'])), option['const']) for option in options]
+
+	return None
+
+
+def parse_choice(choices: list[Choice], text: str) -> Any:
+	""" Typed option: its label or value (booleans without labels are parsed by the formatter) """
+	text = text.strip().casefold()
+	for label, value in choices:
+		if text == str(value).casefold() or (label is not None and text == label.casefold()):
+			return value
+	raise ValueError('invalid-choice')
+
+
+def validate_value(template_name: str, path: tuple[str, ...], value: Any):
+	"""
+	Validate a field's value by its sub-schema at path in the template's schema ($ref / $defs are resolved),
+	raise SchemaValidationError with all errors.
+	Not checked if the template or the field was removed: the document can't be created anyway.
+	"""
+	from includes.jsonschema import get_field_validator
+	from .validators import SchemaValidationError
+
+	try:
+		validator = get_field_validator(template_name, path)
+	except (FileNotFoundError, KeyError, IndexError, TypeError):
+		return
+
+	errors = [error.message for error in validator.iter_errors(value)]
+	if errors:
+		raise SchemaValidationError('; '.join(errors))
+
+
+def validate_constraints(constraints: dict | None, value: Any):
+	""" Contexts from old sessions keep the field's constraints without the rest of the schema """
+	if constraints is None:
+		return
+
+	from .validators import SchemaValidationError
+
+	errors = [error.message for error in _get_node_validator(json.dumps(constraints, sort_keys=True)).iter_errors(value)]
+	if errors:
+		raise SchemaValidationError('; '.join(errors))
+
+
+@lru_cache(maxsize=1024)
+def _get_node_validator(constraints_json: str) -> 'SchemaValidator':
+	from jsonschema.validators import validator_for
+
+	constraints = json.loads(constraints_json)
+	return validator_for(constraints)(constraints)
 
 
-def create_context(schema: dict, parent: 'BaseContext' = None, required: bool = False) -> 'BaseContext':
-	from includes.templates.contexts import ObjectContext, ArrayContext, PrimitiveContext
+def create_context(schema: dict, parent: 'BaseContext' = None, required: bool = False,
+                   template_name: str | None = None) -> 'BaseContext':
+	""" :param template_name: Of the root context: its fields are validated by the template's schema """
+	from includes.images import IMAGE_FORMAT
+	from includes.templates.contexts import ObjectContext, ArrayContext, PrimitiveContext, ImageContext
 	type_mapping = {
 		'object': ObjectContext,
 		'array': ArrayContext,
@@ -42,7 +107,12 @@ def create_context(schema: dict, parent: 'BaseContext' = None, required: bool =
 	}
 
 	context_class = type_mapping.get(schema.get('type'))
+	if context_class is PrimitiveContext and schema.get('format') == IMAGE_FORMAT:
+		context_class = ImageContext
 	if context_class:
-		return context_class(schema, parent, required=required)
+		context = context_class(schema, parent, required=required)
+		if template_name is not None:
+			context.template_name = template_name
+		return context
 
 	raise ValueError(f"Unknown type: {schema.get('type')}")
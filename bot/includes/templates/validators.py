@@ -3,12 +3,40 @@ from datetime import datetime
 from typing import Any
 
 
+class SchemaValidationError(ValueError):
+	""" Value does not match the JSON schema of the field. str() is the l10n key """
+
+	def __init__(self, message: str):
+		super().__init__('schema-error')
+		self.message = message
+
+	@property
+	def l10n_args(self) -> dict[str, str]:
+		from utils import escape_mdv2
+		return {'error': escape_mdv2(self.message)}
+
+
+# Schema format -> validator. Plugins add their own with @register_validator
+VALIDATORS: dict[str, 'Validator'] = {}
+
+
+def register_validator(format_name: str):
+	""" Class decorator: use the validator for fields with the format (replaces the registered one) """
+
+	def decorator(cls: type['Validator']) -> type['Validator']:
+		VALIDATORS[format_name] = cls()
+		return cls
+
+	return decorator
+
+
 class Validator(ABC):
 	@abstractmethod
 	def validate(self, value: Any) -> bool:
 		pass
 
 
+@register_validator('date')
 class DateValidator(Validator):
 	def validate(self, value: str) -> bool:
 		try:
@@ -0,0 +1,91 @@
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from env import ProjectKeys, TelegramKeys
+
+
+@dataclass(slots=True, frozen=True)
+class Tenant:
+	""" One bot (a chapter's copy) served by this process """
+	token: str
+	templates_dir: Path
+	president_id: int = 0
+	name: str = ''
+
+	@property
+	def bot_id(self) -> int:
+		return int(self.token.split(':', 1)[0])
+
+
+@lru_cache
+def get_tenants() -> tuple[Tenant, ...]:
+	"""
+	Bots from BOTS_CONFIG (JSON list of {"token", "templates_dir", "president_id", "name"})
+	or the only one from TG_API_TOKEN. Missing fields are taken from the environment.
+	"""
+	if not TelegramKeys.BOTS_CONFIG:
+		if not TelegramKeys.API_TOKEN:
+			raise ValueError('Set TG_API_TOKEN or BOTS_CONFIG')
+		return (Tenant(TelegramKeys.API_TOKEN, Path(ProjectKeys.TEMPLATES_DIR), TelegramKeys.PRESIDENT_ID),)
+
+	with open(TelegramKeys.BOTS_CONFIG, 'r', encoding='utf-8') as f:
+		config = json.load(f)
+
+	tenants = tuple(
+		Tenant(
+			token=bot['token'],
+			templates_dir=Path(bot.get('templates_dir', ProjectKeys.TEMPLATES_DIR)),
+			president_id=int(bot.get('president_id', TelegramKeys.PRESIDENT_ID)),
+			name=bot.get('name', ''),
+		)
+		for bot in config
+	)
+	if not tenants:
+		raise ValueError(f'No bots in {TelegramKeys.BOTS_CONFIG}')
+	return tenants
+
+
+def is_multi_tenant() -> bool:
+	return len(get_tenants()) > 1
+
+
+@lru_cache
+def get_tenants_by_bot_id() -> dict[int, Tenant]:
+	return {tenant.bot_id: tenant for tenant in get_tenants()}
+
+
+_current_tenant: ContextVar[Tenant | None] = ContextVar('current_tenant', default=None)
+
+
+def get_tenant() -> Tenant:
+	""" Tenant of the update being handled (the first one outside of handlers) """
+	return _current_tenant.get() or get_tenants()[0]
+
+
+def set_tenant(tenant: Tenant | None):
+	""" Set for the current task (copied into threads by asyncio.to_thread) """
+	_current_tenant.set(tenant)
+
+
+def get_templates_dir() -> Path:
+	return get_tenant().templates_dir
+
+
+def get_president_id() -> int:
+	return get_tenant().president_id
+
+
+def is_admin(user_id: int) -> bool:
+	""" ADMIN_IDS are admins of all bots, a president - of own bot """
+	president_id = get_president_id()
+	return user_id in TelegramKeys.ADMIN_IDS or (president_id != 0 and user_id == president_id)
+
+
+def tenant_key(key: str) -> str:
+	""" Redis key of the current bot (unchanged with one bot, so existing keys stay valid) """
+	if not is_multi_tenant():
+		return key
+	return f'{key}:{get_tenant().bot_id}'
@@ -0,0 +1,110 @@
+import asyncio
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, TYPE_CHECKING
+
+import structlog
+from structlog.typing import FilteringBoundLogger
+
+from env import TracingKeys
+
+# opentelemetry-sdk is optional, imported only when tracing is on
+if TYPE_CHECKING:
+	from opentelemetry.sdk.trace import TracerProvider
+	from opentelemetry.sdk.trace.export import SpanExporter
+	from opentelemetry.trace import Tracer
+
+_provider: 'TracerProvider | None' = None
+_tracer: 'Tracer | None' = None
+
+
+class NoopSpan:
+	""" Yielded by span() when tracing is off """
+
+	def set_attribute(self, key: str, value: Any):
+		pass
+
+	def set_attributes(self, attributes: dict[str, Any]):
+		pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def get_exporter() -> 'SpanExporter':
+	if TracingKeys.EXPORTER == 'otlp':
+		from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+		return OTLPSpanExporter(endpoint=TracingKeys.OTLP_ENDPOINT)
+
+	if TracingKeys.EXPORTER == 'json':
+		from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+		TracingKeys.JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
+		return ConsoleSpanExporter(
+			out=open(TracingKeys.JSON_PATH, 'a', encoding='utf-8'),
+			formatter=lambda span: span.to_json(indent=None) + '\n',  # One span per line
+		)
+
+	raise ValueError(f'Unknown TRACING_EXPORTER: {TracingKeys.EXPORTER}')
+
+
+def setup_tracing():
+	"""
+	Start exporting spans if TRACING_EXPORTER is set (call once per process).
+	Only SAMPLE_RATE of updates are traced, spans of the others are not recorded.
+	"""
+	global _provider, _tracer
+
+	if not TracingKeys.EXPORTER or _provider is not None:
+		return
+
+	logger: FilteringBoundLogger = structlog.get_logger()
+	try:
+		from opentelemetry import trace
+		from opentelemetry.sdk.resources import Resource
+		from opentelemetry.sdk.trace import TracerProvider
+		from opentelemetry.sdk.trace.export import BatchSpanProcessor
+		from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+	except ImportError:
+		logger.warning('tracing-not-installed', exporter=TracingKeys.EXPORTER)
+		return
+
+	_provider = TracerProvider(
+		resource=Resource.create({'service.name': TracingKeys.SERVICE_NAME}),
+		sampler=ParentBased(TraceIdRatioBased(TracingKeys.SAMPLE_RATE)),  # Child spans follow the update's decision
+	)
+	_provider.add_span_processor(BatchSpanProcessor(get_exporter()))  # Exported in a background thread
+	trace.set_tracer_provider(_provider)
+	_tracer = _provider.get_tracer('bot')
+	logger.info('tracing-started', exporter=TracingKeys.EXPORTER, sample_rate=TracingKeys.SAMPLE_RATE)
+
+
+async def shutdown_tracing():
+	""" Export the remaining spans """
+	if _provider is not None:
+		await asyncio.to_thread(_provider.shutdown)
+
+
+def is_tracing_enabled() -> bool:
+	return _tracer is not None
+
+
+def span(name: str, **attributes: Any) -> AbstractContextManager:
+	"""
+	Child of the current span (contextvars: works in tasks and in asyncio.to_thread).
+	Exceptions are recorded. None attributes are skipped.
+	"""
+	if _tracer is None:
+		return nullcontext(NOOP_SPAN)
+	return _tracer.start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None})
+
+
+def get_trace_id() -> str | None:
+	""" Id of the current trace if it is sampled (to find it by logs) """
+	if _tracer is None:
+		return None
+
+	from opentelemetry import trace
+
+	context = trace.get_current_span().get_span_context()
+	return f'{context.trace_id:032x}' if context.is_valid and context.trace_flags.sampled else None
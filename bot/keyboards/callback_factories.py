@@ -25,3 +25,7 @@ class AskDataFactory(CallbackData, prefix='ask_data'):
 
 class ActionDataFactory(CallbackData, prefix='action'):
 	action: str
+
+
+class HistoryFactory(CallbackData, prefix='history'):
+	entry_id: int
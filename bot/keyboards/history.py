@@ -0,0 +1,20 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from includes.archive import ArchiveEntry
+from keyboards.callback_factories import HistoryFactory
+
+
+def entry2ikb(entry: ArchiveEntry, show_user: bool = False) -> InlineKeyboardButton:
+	text = f'{entry.date} · {entry.filename}'
+	if show_user:
+		text += f' · {"@" + entry.username if entry.username else entry.user_id}'
+	return InlineKeyboardButton(text=text, callback_data=HistoryFactory(entry_id=entry.id).pack())
+
+
+def history_ikb(entries: list[ArchiveEntry], show_user: bool = False) -> InlineKeyboardMarkup:
+	""" A document per row, the newest first """
+	builder = InlineKeyboardBuilder()
+	for entry in entries:
+		builder.row(entry2ikb(entry, show_user))
+	return builder.as_markup()
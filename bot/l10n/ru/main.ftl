@@ -5,6 +5,8 @@ start-msg = Добро пожаловать в BEST sicret\! Чтобы выбр
 
 # template messages
 choose-template = Выберите приказ, который требуется создать
+search-hint = _Чтобы найти шаблон, отправьте часть его названия_
+search-reset = Сбросить поиск
 schema-not-found = Схема не найдена, попробуйте выбрать шаблон еще раз
 
 templates-link-text = Шаблоны на заполнение с/з
@@ -21,17 +23,77 @@ input-type-incorrect = Неверный тип данных, ожидается
 invalid-integer-input = Не является целым числом\!
 invalid-number-input = Не является числом с плавающей запятой\!
 invalid-boolean-input = Неверный формат логических значений \(введите Да или Нет\):
+invalid-choice = Такого варианта нет, выберите его кнопкой\!
+invalid-value = Значение в неверном формате\!
+image-expected = Отправьте изображение фото или файлом\!
+image-not-expected = Это поле заполняется текстом
+image-unsupported = Формат изображения не поддерживается, отправьте JPEG или PNG
+image-too-large = Изображение слишком большое\!
+image-failed = Не удалось обработать изображение, попробуйте еще раз
 
 # validate errors
 invalid-type = Неверный формат данных\!
+schema-error = Значение не подходит: { $error }
+validation-errors = Исправьте ошибки в отмеченных полях: { $count }
+
+# bulk input
+bulk-question = Отправьте значения полей одним сообщением, каждое с новой строки: по порядку или в виде `Поле: значение`\. Чтобы пропустить поле, отправьте `\-`\.
+bulk-too-many-lines = Лишняя строка, все поля уже заполнены\!
+
+# batch generation
+batch-question = Отправьте таблицу CSV или XLSX: первая строка \- названия столбцов, каждая следующая строка \- отдельный документ\. Доступные столбцы:
+batch-progress = Сгенерировано документов: { $done } из { $total }
+batch-errors = Строки с ошибками \(пропущены\): { $count }
+batch-file-too-large = Файл слишком большой\!
+batch-unknown-format = Поддерживаются только файлы CSV и XLSX\!
+batch-xlsx-not-supported = Файлы XLSX не поддерживаются, отправьте CSV\!
+batch-empty-table = В таблице нет строк с данными\!
+batch-too-many-rows = Слишком много строк в таблице\!
+batch-unknown-column = Нет такого поля в шаблоне
+batch-render-failed = Не удалось сгенерировать документ
 
 # actions
 back = Назад
+bulk-input = Заполнить несколько полей
 delete = Удалить
+undo = ↩️ Отменить
+redo = ↪️ Повторить
 add-item = Добавить элемент
+choice-yes = Да
+choice-no = Нет
+image-attached = 🖼 изображение
 
 generate-document = Сгенерировать документ
+batch-generate = Сгенерировать по таблице
+generate-pdf = Сгенерировать PDF
+pdf-not-available = Экспорт в PDF сейчас недоступен, попробуйте позже
+pdf-timeout = Документ конвертируется слишком долго, попробуйте позже
+pdf-failed = Не удалось сконвертировать документ в PDF
 telegram-network-error = Произошла ошибка при отправке документа
+generation-queued = Документ в очереди, место: { $position }\. Он придет сюда, как только будет готов\.
+generation-ready = Документ готов\!
+generation-queue-full = Сейчас слишком много запросов, попробуйте через минуту
+generation-already-queued = Ваш документ уже генерируется, подождите
+session-expired = Черновик устарел, начните заново: /create_document
+
+# history
+history-found = Найдено документов: { $count }\. Нажмите на документ, чтобы получить его снова
+history-empty = Документы не найдены\. Искать можно по шаблону, дате \(01\.02\.2025\) и значениям полей: `/history Иванов`
+history-disabled = Архив документов отключен
+history-not-found = Документ не найден
+history-file-missing = Файл документа не сохранился, создайте его заново
+
+# admin
+sessions-empty = Активных черновиков нет
+stats-empty = За { $days } дн\. статистики нет
+stats-header = За { $days } дн\.: уникальных пользователей { $users }
+stats-queue = Очередь генерации \(этого процесса, с запуска\): сейчас { $rendering }/{ $concurrency }, ждут { $waiting }; готово { $done }, отклонено { $rejected }; ожидание { $avg_wait_time } с \(макс\. { $max_wait_time }\), генерация { $avg_service_time } с \(макс\. { $max_service_time }\)
+profiling-usage = Использование: `/profile cpu|memory <обработчик или состояние> [секунды]` или `/profile stop`
+profiling-unknown-kind = Тип профилирования: `cpu` или `memory`
+profiling-busy = Профилирование уже запущено, дождитесь отчета или `/profile stop`
+profiling-not-running = Профилирование не запущено
+profiling-started = Профилирование { $kind } для `{ $target }` на { $seconds } с запущено
+profiling-done = Отчет профилирования сохранен: `{ $path }`
 
 template-chosen = Шаблон { $template_name } выбран @{ $by_username }
 document-generated = Документ для { $template_name } сгенерирован @{ $by_username }
@@ -1,4 +1,5 @@
 L10N_FORMAT_KEY = "l10n"
 LOGGING_KEY = "log"
+TENANT_KEY = "tenant"
 
 from .main import register_middlewares
@@ -1,23 +1,50 @@
+import logging
 import time
 import traceback
-import types
 from typing import Any, Awaitable, Callable, Dict, Optional
 
 from aiogram import BaseMiddleware
 from aiogram.dispatcher.middlewares.user_context import EVENT_FROM_USER_KEY
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
 from aiogram.types import TelegramObject, User
 from structlog import get_logger
 from structlog.typing import FilteringBoundLogger
 
 
+def install_fsm_logging(logger: FilteringBoundLogger):
+	"""
+	Log state changes of all FSMContexts: one hook on the class instead of wrapping
+	set_state of each context on each update. Installed once.
+	"""
+	original_set_state = FSMContext.set_state
+	if getattr(original_set_state, 'logs_state', False):
+		return
+
+	async def set_state(self: FSMContext, state: State | str | None = None) -> None:
+		state_value = "cleared" if state is None else str(getattr(state, 'state', state))
+		await logger.adebug("state-changed", state=state_value, user_id=self.key.user_id)
+		return await original_set_state(self, state)
+
+	set_state.logs_state = True
+	FSMContext.set_state = set_state
+
+
 class LoggingMw(BaseMiddleware):
-	"""Middleware for structured logging of handler calls and state changes."""
+	"""
+	Middleware for structured logging of handler calls and state changes.
+	Debug logs cost a thread hop each (structlog's async methods), so the level is checked once
+	on creation (after setup_logging) and without DEBUG only errors are logged.
+	"""
 
-	def __init__(self, middleware_key: str = 'log', *, patch_fsm: bool = True):
+	def __init__(self, middleware_key: str = 'log', *, patch_fsm: bool = True, debug: bool | None = None):
 		self.logger: FilteringBoundLogger = get_logger()
 		self.middleware_key = middleware_key
-		self.patch_fsm = patch_fsm
+		self.debug = logging.getLogger().isEnabledFor(logging.DEBUG) if debug is None else debug
+		self._handler_names: dict[int, str] = {}  # id of the HandlerObject -> name
+
+		if patch_fsm and self.debug:
+			install_fsm_logging(self.logger)
 
 	@staticmethod
 	def get_user_context(user: Optional[User]) -> dict:
@@ -31,19 +58,17 @@ class LoggingMw(BaseMiddleware):
 			})
 		return context
 
-	def patch_fsm_methods(self, fsm: FSMContext, log: FilteringBoundLogger):
-		"""Patch FSM methods to add logging capabilities."""
-		if not self.patch_fsm:
-			return
-
-		original_set_state = fsm.set_state
-
-		async def set_state_with_logging(_, state):
-			state_value = "cleared" if state is None else str(state.state)
-			await log.adebug("state-changed", state=state_value)
-			return await original_set_state(state)
+	def get_handler_name(self, handler: Callable, data: Dict[str, Any]) -> str:
+		""" Name of the handler's callback, resolved once per registered handler """
+		handler_obj = data.get("handler")
+		if handler_obj is None or not hasattr(handler_obj, "callback"):
+			return getattr(handler, "__name__", str(handler))
 
-		fsm.set_state = types.MethodType(set_state_with_logging, fsm)
+		# Handler objects live as long as the dispatcher, so their ids are stable
+		name = self._handler_names.get(id(handler_obj))
+		if name is None:
+			name = self._handler_names[id(handler_obj)] = getattr(handler_obj.callback, "__name__", str(handler_obj.callback))
+		return name
 
 	async def __call__(
 			self,
@@ -51,52 +76,41 @@ class LoggingMw(BaseMiddleware):
 			event: TelegramObject,
 			data: Dict[str, Any],
 	) -> Any:
-		telegram_user = data.get(EVENT_FROM_USER_KEY)
-		user_context = self.get_user_context(telegram_user)
+		if not self.debug:
+			data[self.middleware_key] = self.logger
+			try:
+				return await handler(event, data)
+			except Exception as e:
+				await self.log_error(e, self.logger.bind(**self.get_user_context(data.get(EVENT_FROM_USER_KEY))), handler, data)
+				raise
 
 		# Create child logger with user context
-		log = self.logger.bind(**user_context)
+		log = self.logger.bind(**self.get_user_context(data.get(EVENT_FROM_USER_KEY)))
 		data[self.middleware_key] = log
 
-		# Get handler name for logging
-		handler_obj = data.get("handler")
-		handler_name = (
-			getattr(handler_obj.callback, "__name__", str(handler_obj.callback))
-			if handler_obj and hasattr(handler_obj, "callback") else
-			getattr(handler, "__name__", str(handler))
-		)
-
-		# Log handler call
+		handler_name = self.get_handler_name(handler, data)
 		await log.adebug("handler-called", handler=handler_name)
 
-		# Add logging to FSM state changes
-		state: FSMContext = data.get("state")
-		if state and self.patch_fsm:
-			self.patch_fsm_methods(state, log)
-
 		try:
 			# Measure execution time
 			start = time.perf_counter()
 			result = await handler(event, data)
-			end = time.perf_counter()
-
-			execution_time = round(end - start, 3)
+			execution_time = round(time.perf_counter() - start, 3)
 
 			# Log successful completion
 			await log.adebug("handler-completed", handler=handler_name, execution_time=execution_time)
 			return result
 
 		except Exception as e:
-			# Get full exception traceback for error logs
-			tb = traceback.format_exc()
-
-			# Log error with detailed context
-			await log.aerror(
-				"handler-error",
-				handler=handler_name,
-				error_type=type(e).__name__,
-				error=str(e),
-				traceback=tb
-			)
-			# Re-raise to let error handlers deal with it
-			raise
+			await self.log_error(e, log, handler, data)
+			raise  # Re-raise to let error handlers deal with it
+
+	async def log_error(self, e: Exception, log: FilteringBoundLogger, handler: Callable, data: Dict[str, Any]):
+		""" Log error with detailed context and full traceback """
+		await log.aerror(
+			"handler-error",
+			handler=self.get_handler_name(handler, data),
+			error_type=type(e).__name__,
+			error=str(e),
+			traceback=traceback.format_exc()
+		)
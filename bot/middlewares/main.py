@@ -1,13 +1,24 @@
 from aiogram import Dispatcher
 
 from includes.fluent import get_fluent_localization
-from middlewares import L10N_FORMAT_KEY, LOGGING_KEY
+from includes.tracing import is_tracing_enabled
+from middlewares import L10N_FORMAT_KEY, LOGGING_KEY, TENANT_KEY
 from middlewares.drop_nothing import DropEmptyCallbackMiddleware
 from middlewares.localization import L10nMw
 from middlewares.logging import LoggingMw
+from middlewares.profiling import ProfilingMw
+from middlewares.tenant import TenantMw
+from middlewares.tracing import trace_updates
 
 
 def register_middlewares(dp: Dispatcher):
+	# Root span of the update, around aiogram's own outer middlewares (they already read the FSM state)
+	if is_tracing_enabled():
+		trace_updates(dp)
+
+	# Bot's templates and president for the update (before all other middlewares)
+	dp.update.outer_middleware(TenantMw(TENANT_KEY))
+
 	# Drop callback data with only space symbol
 	dp.callback_query.outer_middleware(DropEmptyCallbackMiddleware())
 
@@ -21,3 +32,8 @@ def register_middlewares(dp: Dispatcher):
 	logging_mw = LoggingMw(LOGGING_KEY)
 	dp.message.middleware(logging_mw)
 	dp.callback_query.middleware(logging_mw)
+
+	# Profiling by admin's /profile command
+	profiling_mw = ProfilingMw()
+	dp.message.middleware(profiling_mw)
+	dp.callback_query.middleware(profiling_mw)
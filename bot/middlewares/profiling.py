@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiogram_dialog.api.internal import CONTEXT_KEY
+
+from includes.profiling import PROFILER_KEY, Profiler
+
+
+class ProfilingMw(BaseMiddleware):
+	""" Measures calls of the handler (or dialog state) selected by /profile """
+
+	async def __call__(
+			self,
+			handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+			event: TelegramObject,
+			data: dict[str, Any]
+	) -> Any:
+		profiler: Profiler | None = data.get(PROFILER_KEY)
+		if profiler is None or profiler.session is None:
+			return await handler(event, data)
+
+		handler_obj = data.get('handler')
+		handler_name = getattr(getattr(handler_obj, 'callback', None), '__name__', None)
+		dialog_context = data.get(CONTEXT_KEY)  # Dialog handlers are profiled by state: CreateByTemplate:VIEW
+		dialog_state = dialog_context.state.state if dialog_context is not None else None
+		session = profiler.get_session(handler_name, dialog_state, data.get('raw_state'))
+		if session is None:
+			return await handler(event, data)
+
+		with profiler.measure(session):
+			return await handler(event, data)
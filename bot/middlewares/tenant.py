@@ -0,0 +1,25 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from includes.tenants import Tenant, get_tenants_by_bot_id, set_tenant
+
+
+class TenantMw(BaseMiddleware):
+	""" Selects the bot's templates and president for the update (see includes.tenants) """
+
+	def __init__(self, middleware_key: str = 'tenant'):
+		self.middleware_key = middleware_key
+		self.tenants = get_tenants_by_bot_id()
+
+	async def __call__(
+			self,
+			handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+			event: TelegramObject,
+			data: dict[str, Any]
+	) -> Any:
+		tenant: Tenant = self.tenants[data['bot'].id]
+		data[self.middleware_key] = tenant
+		set_tenant(tenant)  # Each update is handled in its own task, so it does not leak to others
+		return await handler(event, data)
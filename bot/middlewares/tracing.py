@@ -0,0 +1,42 @@
+from typing import Any
+
+import structlog
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Update
+
+from includes.tracing import get_trace_id, span
+
+
+def trace_updates(dp: Dispatcher):
+	"""
+	Root span of the update: everything done while handling it is traced under one trace.
+	Wraps feed_update (used by polling, webhooks and sharded workers), so aiogram's own outer
+	middlewares reading the FSM state are inside the span too.
+	"""
+	feed_update = dp.feed_update
+
+	async def traced_feed_update(bot: Bot, update: Update, **kwargs: Any) -> Any:
+		with span(f'update.{update.event_type}', update_id=update.update_id, bot_id=bot.id):
+			trace_id = get_trace_id()
+			if trace_id is not None:
+				# Each update is handled in its own task, so it does not leak to others
+				structlog.contextvars.bind_contextvars(trace_id=trace_id)
+			return await feed_update(bot, update, **kwargs)
+
+	dp.feed_update = traced_feed_update
+
+
+class BotApiTracingMw(BaseRequestMiddleware):
+	""" Span of each Bot API request (session middleware) """
+
+	async def __call__(
+			self,
+			make_request: NextRequestMiddlewareType[TelegramType],
+			bot: Bot,
+			method: TelegramMethod[TelegramType],
+	) -> Response[TelegramType]:
+		with span(f'bot.{method.__api_method__}', bot_id=bot.id):
+			return await make_request(bot, method)
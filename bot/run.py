@@ -1,53 +1,201 @@
+import time
+
+IMPORTS_STARTED_AT = time.perf_counter()  # Must be before other imports
+
 import asyncio
+from functools import partial
+from pathlib import Path
 
 import structlog
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
 from structlog.typing import FilteringBoundLogger
 
-from env import TelegramKeys, ProjectKeys
+from env import ImageKeys, ProjectKeys, RedisKeys, SessionKeys
 from handlers import register_handlers
 from includes import setup_logging, get_storage, PickleRedisStorage
+from includes.storage import READ_REDIS_KEY, get_read_redis
+from includes.archive import ARCHIVE_KEY, Archive
+from includes.autofill import AUTOFILL_KEY, Autofill
+from includes.batch import shutdown_render_pool
+from includes.cleanup import DAY, Cleanup, remove_old_files
+from includes.generation_queue import GENERATION_QUEUE_KEY, GenerationQueue
+from includes.images import IMAGES_KEY, ImageStore
+from includes.pdf import PDF_POOL_KEY, PdfPool
+from includes.profiling import PROFILER_KEY, Profiler
+from includes.stats import STATS_KEY, UsageStats
+from includes.sessions import SessionSweeper
+from includes.sharding import Workers, run_ingress
+from includes.startup import StartupTimer, prewarm
+from includes.tenants import Tenant, get_tenants, is_multi_tenant
+from includes.tracing import is_tracing_enabled, setup_tracing, shutdown_tracing
 from middlewares import register_middlewares
+from middlewares.tracing import BotApiTracingMw
 
 
-async def main():
-	# Init logging
+def setup_process():
+	""" Logging and tracing of this process (and of each worker) """
 	setup_logging()
+	setup_tracing()
+
+
+def setup_worker():
+	""" setup_process and warm caches of a sharded worker (before it takes updates) """
+	setup_process()
+	prewarm()
 
-	# Init bot
-	bot = Bot(
-		token=TelegramKeys.API_TOKEN,
+
+def create_session() -> AiohttpSession:
+	session = AiohttpSession()
+	if is_tracing_enabled():
+		session.middleware(BotApiTracingMw())
+	return session
+
+
+def create_bot(tenant: Tenant = None, session: AiohttpSession = None) -> Bot:
+	return Bot(
+		token=(tenant or get_tenants()[0]).token,
+		session=session or create_session(),
 		default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN_V2)
 	)
-	await bot.set_my_commands([
-		BotCommand(command='start', description='Запуск бота'),
-		BotCommand(command='create_document', description='Создать приказ')
-	])
+
+
+def create_bots() -> list[Bot]:
+	""" All bots from BOTS_CONFIG (or the only one) with one HTTP session """
+	session = create_session()
+	return [create_bot(tenant, session) for tenant in get_tenants()]
+
+
+def create_dispatcher() -> Dispatcher:
+	""" Dispatcher with all handlers and middlewares (one for all bots) """
 
 	# Get storage with proper configuration for dialogs
-	storage = get_storage(cls=PickleRedisStorage, with_destiny=True)
+	storage = get_storage(
+		cls=PickleRedisStorage,
+		with_destiny=True,
+		key_builder_with_bot_id=is_multi_tenant(),  # Users' drafts in different bots are different
+		state_ttl=SessionKeys.STATE_TTL or None,
+		data_ttl=SessionKeys.DATA_TTL or None,
+	)
 
 	# Init dispatcher
 	dp = Dispatcher(storage=storage)
+	dp[GENERATION_QUEUE_KEY] = GenerationQueue()  # Available in handlers' data
+	dp[PROFILER_KEY] = Profiler()
+	if RedisKeys.READ_FROM_REPLICAS:  # Replica for reports and caches
+		read_redis = get_read_redis()
+		dp.shutdown.register(read_redis.aclose)
+	else:  # The storage's client: no second pool to the master
+		read_redis = storage.redis
+	dp[READ_REDIS_KEY] = read_redis
+	dp[STATS_KEY] = UsageStats(storage.redis, read_redis)
+	dp[AUTOFILL_KEY] = Autofill(storage.redis, read_redis)
+	archive = dp[ARCHIVE_KEY] = Archive()  # On the media volume, shared by workers
+	dp.shutdown.register(archive.close)
+	images = dp[IMAGES_KEY] = ImageStore()  # Resize processes are started on the first image
+	dp.shutdown.register(images.close)
+	dp.shutdown.register(shutdown_render_pool)  # Batch render processes (started on the first batch)
+
+	# Converters are started with polling (or a worker) and stopped with it
+	pdf_pool = dp[PDF_POOL_KEY] = PdfPool()
+	dp.startup.register(pdf_pool.start)
+	dp.shutdown.register(pdf_pool.stop)
+	dp.shutdown.register(shutdown_tracing)
 
 	# Register handlers and middlewares
 	register_handlers(dp)
 	register_middlewares(dp)
 
+	return dp
+
+
+def create_cleanup(dp: Dispatcher) -> Cleanup:
+	""" Removing expired files kept for reuse """
+	cleanup = Cleanup()
+	cleanup.register('documents', partial(remove_old_files, Path(ProjectKeys.DOCUMENTS_DIR), ProjectKeys.DOCUMENTS_TTL_DAYS * DAY))
+	cleanup.register('archive', dp[ARCHIVE_KEY].purge)
+	cleanup.register('images', partial(remove_old_files, Path(ImageKeys.DIR), ImageKeys.TTL_DAYS * DAY))
+	return cleanup
+
+
+def create_app() -> tuple[Bot, Dispatcher]:
+	""" Create bot and dispatcher (for a single bot, e.g. in sharded workers) """
+	return create_bot(), create_dispatcher()
+
+
+async def main():
+	timer = StartupTimer()
+	timer.phases['imports'] = round(time.perf_counter() - IMPORTS_STARTED_AT, 3)
+
+	# Init logging and tracing
+	with timer.phase('logging'):
+		setup_process()
+
+	# Init bots
+	with timer.phase('app'):
+		bots = create_bots()
+		dp = create_dispatcher()
+
+	if ProjectKeys.WORKERS > 1 and len(bots) > 1:
+		raise ValueError('Sharding (WORKERS > 1) supports only one bot')
+
+	# Warm caches while waiting for Telegram
+	commands = [
+		BotCommand(command='start', description='Запуск бота'),
+		BotCommand(command='create_document', description='Создать приказ'),
+		BotCommand(command='history', description='Мои документы'),
+	]
+	with timer.phase('commands_and_prewarm'):
+		*_, prewarm_phases = await asyncio.gather(
+			*(bot.set_my_commands(commands) for bot in bots),
+			asyncio.to_thread(prewarm)
+		)
+	timer.phases.update(prewarm_phases)
+
 	# Start bot
 	logger: FilteringBoundLogger = structlog.get_logger()
-	await logger.ainfo(f"Starting the bot (id={bot.id})...")
+	await timer.report(logger)
+	await logger.ainfo(f"Starting the bots (ids={[bot.id for bot in bots]})...")
+
+	# Archive idle drafts and report sessions, remove expired files (only in this process even if sharded)
+	sweeper = SessionSweeper(dp.storage)
+	sweeper.start()
+	cleanup = create_cleanup(dp)
+	cleanup.start()
 
 	try:
-		await dp.start_polling(
-			bot,
-			skip_updates=ProjectKeys.DEBUG,  # skip updates if debug
-			allowed_updates=dp.resolve_used_update_types()  # Get only registered updates
-		)
+		if ProjectKeys.WORKERS > 1:
+			await run_sharded(bots[0], dp, logger)
+			return
+
+		try:
+			await dp.start_polling(
+				*bots,
+				skip_updates=ProjectKeys.DEBUG,  # skip updates if debug
+				allowed_updates=dp.resolve_used_update_types()  # Get only registered updates
+			)
+		finally:
+			await bots[0].session.close()  # Shared by all bots
+			await logger.ainfo("Bot stopped.")
+	finally:
+		await sweeper.stop()
+		await cleanup.stop()
+
+
+async def run_sharded(bot: Bot, dp: Dispatcher, logger: FilteringBoundLogger):
+	""" This process only polls updates, handlers run in worker processes """
+	workers = Workers(create_app, setup_worker, ProjectKeys.WORKERS)
+	workers.start()
+
+	try:
+		if ProjectKeys.DEBUG:  # skip updates if debug
+			await bot.delete_webhook(drop_pending_updates=True)
+		await run_ingress(bot, workers, dp.resolve_used_update_types())
 	finally:
+		await asyncio.to_thread(workers.stop)
 		await bot.session.close()
 		await logger.ainfo("Bot stopped.")
 
@@ -5,3 +5,5 @@ class CreateByTemplate(StatesGroup):
 	CHOOSE_TEMPLATE = State()  # User selects template
 	VIEW = State()  # User is viewing template
 	ADD = State()  # User adds or changes template's data
+	BULK = State()  # User fills many fields of an object by one message
+	BATCH = State()  # User uploads a table to generate many documents
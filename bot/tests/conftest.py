@@ -0,0 +1,4 @@
+import os
+
+# Compiled templates must not be written into the working tree (read by env.py on import)
+os.environ['JINJA_CACHE_DIR'] = ''
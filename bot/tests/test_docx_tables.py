@@ -0,0 +1,112 @@
+"""
+FastTableTemplate must render large table loops exactly like docxtpl.
+Run from the bot directory: python -m pytest
+"""
+import pytest
+from docx import Document
+from docxtpl import DocxTemplate, RichText
+from lxml import etree
+
+from includes.docx_tables import FastTableTemplate
+from includes.jinja2 import get_jinja_env
+
+ROWS = 5
+
+
+def make_template(path, cells: list[str], before: str = '', items: str = 'members'):
+	document = Document()
+	if before:
+		document.add_paragraph(before)
+	table = document.add_table(rows=3, cols=len(cells))
+	table.rows[0].cells[0].text = f'{{%tr for member in {items} %}}'
+	for cell, text in zip(table.rows[1].cells, cells):
+		cell.text = text
+	table.rows[2].cells[0].text = '{%tr endfor %}'
+	document.save(path)
+	return path
+
+
+def render_body(cls, path, context: dict, **kwargs) -> str:
+	doc = cls(path, **kwargs)
+	doc.render(context, get_jinja_env())
+	body = doc.docx.element.body
+	# docxtpl leaves newlines between paragraphs (they are not content)
+	for element in body.iter():
+		if element.tail is not None and not element.tail.strip():
+			element.tail = None
+	return etree.tostring(body, encoding='unicode')
+
+
+def members(**overrides) -> list[dict]:
+	return [
+		{'name': f'Участник {i}', 'position': f'должность {i}', **overrides}
+		for i in range(ROWS)
+	]
+
+
+def assert_same(tmp_path, cells: list[str], context: dict, before: str = '', fast: bool = True):
+	path = make_template(tmp_path / 'table.docx', cells, before)
+	expected = render_body(DocxTemplate, path, context)
+
+	rendered = {}
+	original_expand = FastTableTemplate._expand
+
+	def expand(self, *args):
+		original_expand(self, *args)
+		rendered['fast'] = True  # Not raised FallbackError
+
+	with pytest.MonkeyPatch.context() as mp:
+		mp.setattr(FastTableTemplate, '_expand', expand)
+		actual = render_body(FastTableTemplate, path, context, min_rows=1)
+
+	assert actual == expected
+	assert rendered.get('fast', False) == fast
+
+
+def test_plain_rows(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }}', '{{ member.position|upper }}'], {'members': members()})
+
+
+def test_loop_index(tmp_path):
+	assert_same(tmp_path, ['{{ loop.index }}', '{{ member.name }} ({{ loop.length }})'], {'members': members()})
+
+
+def test_listing_chars(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }}'], {'members': members(name='первая\nвторая\tтаб')})
+
+
+def test_quotes(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }}'], {'members': members(name='"Ромашка" и \'Лютик\'')})
+
+
+def test_markup_chars_fall_back(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }}'], {'members': members(name='A & B <C>')}, fast=False)
+
+
+def test_context_names(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }} {{ title }}'], {'members': members(), 'title': 'Приказ'})
+
+
+def test_set_in_template_falls_back(tmp_path):
+	# `title` is set by the template, the context has another value
+	assert_same(
+		tmp_path, ['{{ member.name }} {{ title }}'], {'members': members(), 'title': 'context'},
+		before='{% set title = "template" %}', fast=False,
+	)
+
+
+def test_unknown_name_falls_back(tmp_path):
+	assert_same(tmp_path, ['{{ member.name }} {{ missing }}'], {'members': members()}, fast=False)
+
+
+def test_rich_text_falls_back(tmp_path):
+	context = {'members': [{'name': RichText('жирный', bold=True)} for _ in range(ROWS)]}
+	path = make_template(tmp_path / 'table.docx', ['{{ member.name }}'])
+	assert render_body(FastTableTemplate, path, context, min_rows=1) == render_body(DocxTemplate, path, context)
+
+
+def test_small_table_is_not_expanded(tmp_path):
+	path = make_template(tmp_path / 'table.docx', ['{{ member.name }}'])
+	doc = FastTableTemplate(path, min_rows=ROWS + 1)
+	doc.render({'members': members()}, get_jinja_env())
+	assert doc.docx.element.body.xpath('count(.//w:tr)') == ROWS
@@ -0,0 +1,86 @@
+"""
+Fields are validated by their sub-schemas within the template's schema ($ref / $defs are resolved),
+the sub-schemas are not pickled into sessions.
+Run from the bot directory: python -m pytest
+"""
+import json
+import pickle
+
+import pytest
+
+from includes.jsonschema import load_schema
+from includes.templates import create_context
+from includes.templates.validators import VALIDATORS, Validator, register_validator
+from includes.tenants import Tenant, set_tenant
+
+SCHEMA = {
+	'$schema': 'https://json-schema.org/draft/2020-12/schema',
+	'type': 'object',
+	'$defs': {'inn': {'type': 'string', 'pattern': '^[0-9]{10}$'}},
+	'properties': {
+		'inn': {'type': 'string', 'allOf': [{'$ref': '#/$defs/inn'}]},
+		'age': {'type': 'integer', 'minimum': 18},
+		'code': {'type': 'string', 'format': 'test-code'},
+		'count': {'type': 'string', 'format': 'test-positive'},
+		'members': {
+			'type': 'array',
+			'items': {'type': 'object', 'properties': {'inn': {'type': 'string', '$ref': '#/$defs/inn'}}},
+		},
+	},
+}
+
+
+@pytest.fixture
+def root(tmp_path):
+	(tmp_path / 'test.json').write_text(json.dumps(SCHEMA), encoding='utf-8')
+	set_tenant(Tenant(token='1:x', templates_dir=tmp_path))
+	yield create_context(load_schema('test'), template_name='test')
+	set_tenant(None)
+
+
+def test_ref_is_resolved(root):
+	inn = root.get_property('inn')
+	assert inn.parse('1234567890') == '1234567890'
+	with pytest.raises(ValueError):
+		inn.parse('12')
+
+
+def test_array_item_ref_is_resolved(root):
+	members = root.get_property('members')
+	inn = members.do(members.ADD_ITEM).get_property('inn')
+	assert inn.get_schema_path() == ('properties', 'members', 'items', 'properties', 'inn')
+	assert inn.accepts('1234567890')
+	assert not inn.accepts('12')
+
+
+def test_constraints_are_not_pickled(root):
+	restored = pickle.loads(pickle.dumps(root))
+	age = restored.get_property('age')
+	assert '_constraints' not in age.__dict__
+	assert age.accepts(20)
+	assert not age.accepts(10)
+
+
+@pytest.fixture
+def plugin_validators():
+	""" Validators of a plugin: one returns False, another one fails on a value of another type """
+
+	@register_validator('test-code')
+	class CodeValidator(Validator):
+		def validate(self, value: str) -> bool:
+			return value.startswith('A')
+
+	@register_validator('test-positive')
+	class PositiveValidator(Validator):
+		def validate(self, value: int) -> bool:
+			return value > 0
+
+	yield
+	del VALIDATORS['test-code'], VALIDATORS['test-positive']
+
+
+def test_accepts_checks_format(root, plugin_validators):
+	code = root.get_property('code')
+	assert code.accepts('A1')
+	assert not code.accepts('B1')
+	assert not root.get_property('count').accepts('5')  # TypeError in the validator
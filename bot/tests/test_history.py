@@ -0,0 +1,125 @@
+"""
+Undo / redo rewire the context tree by identity: removed contexts are put back, not copies of them.
+Run from the bot directory: python -m pytest
+"""
+import pickle
+
+import pytest
+
+from includes.templates import create_context
+from includes.templates.history import History
+
+SCHEMA = {
+	'type': 'object',
+	'properties': {
+		'name': {'type': 'string'},
+		'city': {'type': 'string'},
+		'members': {
+			'type': 'array',
+			'items': {'type': 'object', 'properties': {'name': {'type': 'string'}}},
+		},
+	},
+}
+
+
+@pytest.fixture
+def root():
+	return create_context(SCHEMA)
+
+
+@pytest.fixture
+def history():
+	return History()
+
+
+def add_member(history: History, root, name: str):
+	members = root.get_property('members')
+	member = history.do(members, members.ADD_ITEM)
+	history.set_value(member.get_property('name'), name)
+	return member
+
+
+def test_delete_field_undo_redo(root, history):
+	name = root.get_property('name')
+	history.set_value(name, 'Иван')
+
+	assert history.do(name, name.DELETE_ACTION) is root
+	assert root.get_property('name') is not name
+	assert root.get_value()['name'] is None
+
+	assert history.undo() is root
+	assert root.get_property('name') is name
+	assert root.get_value()['name'] == 'Иван'
+
+	history.redo()
+	assert root.get_property('name') is not name
+	assert root.get_value()['name'] is None
+
+
+def test_delete_item_undo_redo(root, history):
+	members = root.get_property('members')
+	first, second = add_member(history, root, 'Иван'), add_member(history, root, 'Петр')
+
+	assert history.do(first, first.DELETE_ACTION) is members
+	assert members.get_children() == [second]
+
+	assert history.undo() is members
+	assert members.get_children() == [first, second]
+
+	history.redo()
+	assert members.get_children() == [second]
+
+
+def test_add_item_undo_redo(root, history):
+	members = root.get_property('members')
+	item = history.do(members, members.ADD_ITEM)
+
+	history.undo()
+	assert members.get_children() == []
+	assert not history.can_undo
+
+	history.redo()
+	assert members.get_children() == [item]
+
+
+def test_bulk_is_one_step(root, history):
+	history.set_value(root.get_property('name'), 'Иван')
+	history.set_bulk(root, {'name': 'Петр', 'city': 'Москва'})
+	assert root.get_value()['name'] == 'Петр'
+
+	history.undo()
+	assert (root.get_value()['name'], root.get_value()['city']) == ('Иван', None)
+
+	history.redo()
+	assert (root.get_value()['name'], root.get_value()['city']) == ('Петр', 'Москва')
+
+
+def test_new_change_clears_redo(root, history):
+	history.set_value(root.get_property('name'), 'Иван')
+	history.undo()
+	assert history.can_redo
+
+	history.set_value(root.get_property('city'), 'Москва')
+	assert not history.can_redo
+
+
+def test_undo_after_pickle(root, history):
+	""" The draft is stored in the session: history and tree are pickled together """
+	add_member(history, root, 'Иван')
+	name = root.get_property('name')
+	history.set_value(name, 'Петр')
+	history.do(name, name.DELETE_ACTION)
+
+	data = pickle.loads(pickle.dumps({'context': root, 'history': history}))
+	root, history = data['context'], data['history']
+
+	history.undo()
+	assert root.get_value()['name'] == 'Петр'
+	history.undo()  # The value of the restored field is set in the tree, not in a copy
+	assert root.get_value()['name'] is None
+
+	history.undo()
+	history.undo()  # Adding of the item
+	assert root.get_value()['members'] == []
+	history.redo()
+	assert root.get_value()['members'] == [{'name': None}]
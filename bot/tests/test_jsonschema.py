@@ -0,0 +1,52 @@
+"""
+Schemas are cached and shared by all users: changes of a loaded schema must not leak.
+Run from the bot directory: python -m pytest
+"""
+import json
+
+import pytest
+
+from includes.jsonschema import get_schema_validator, load_schema
+from includes.tenants import Tenant, set_tenant
+
+SCHEMA = {
+	'type': 'object',
+	'properties': {'name': {'type': 'string', 'title': 'Имя'}},
+	'required': ['name'],
+}
+
+
+@pytest.fixture(autouse=True)
+def templates_dir(tmp_path):
+	(tmp_path / 'test.json').write_text(json.dumps(SCHEMA), encoding='utf-8')
+	set_tenant(Tenant(token='1:x', templates_dir=tmp_path))
+	yield tmp_path
+	set_tenant(None)
+
+
+def test_mutated_schema_does_not_leak():
+	schema = load_schema('test')
+	schema['properties']['name']['title'] = 'Changed'
+	schema['required'].append('age')
+	del schema['type']
+
+	assert load_schema('test') == SCHEMA
+
+
+def test_copies_share_validator():
+	assert get_schema_validator(load_schema('test')) is get_schema_validator(load_schema('test'))
+
+
+def test_changed_copy_has_own_validator():
+	schema = load_schema('test')
+	schema['required'] = []
+
+	assert get_schema_validator(schema).is_valid({})
+	assert not get_schema_validator(load_schema('test')).is_valid({})
+
+
+def test_schema_is_serialized_once(monkeypatch):
+	schema = load_schema('test')
+	validator = get_schema_validator(schema)
+	monkeypatch.setattr(json, 'dumps', None)  # Not called for a known schema object
+	assert get_schema_validator(schema) is validator
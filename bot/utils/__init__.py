@@ -1,2 +1,2 @@
-from .dialogs import L10nFormat, Values
+from .dialogs import L10nFormat, Values, format_error
 from .escape import escape_mdv2
@@ -3,6 +3,7 @@ from typing import Any, Protocol
 from aiogram_dialog.api.protocols import DialogManager
 from aiogram_dialog.widgets.common import WhenCondition
 from aiogram_dialog.widgets.text import Text
+from fluent.runtime import FluentLocalization
 
 from middlewares import L10N_FORMAT_KEY
 
@@ -21,3 +22,8 @@ class L10nFormat(Text):
 	async def _render_text(self, data: dict, manager: DialogManager) -> str:
 		l10n = manager.middleware_data.get(L10N_FORMAT_KEY)
 		return l10n.format_value(self.key, args=self.args | data)
+
+
+def format_error(l10n: FluentLocalization, error: Exception) -> str:
+	""" Errors are raised with l10n key as a message and optional l10n_args """
+	return l10n.format_value(str(error), args=getattr(error, 'l10n_args', None))